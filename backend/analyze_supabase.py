@@ -9,7 +9,7 @@ import json
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import logging
-from supabase import create_client, Client
+from supabase_compartilhado import obter_supabase, registrar_estatisticas_conexoes
 import pandas as pd
 from dotenv import load_dotenv
 
@@ -30,19 +30,84 @@ logging.basicConfig(
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Linhas por requisição na leitura das tabelas grandes. O PostgREST pode
+# devolver menos (max-rows); a paginação continua pelo último id recebido.
+ANALISE_LOTE = int(os.getenv("ANALISE_LOTE", "1000"))
+AMOSTRA_REGISTROS = 10
+# Agregados calculados no banco (migração 20261017000700); sem as funções,
+# as tabelas são lidas em lotes e agregadas aqui
+ANALISE_NO_SERVIDOR = os.getenv("ANALISE_NO_SERVIDOR", "true").lower() == "true"
+
 def init_supabase():
-    """Inicializa o cliente Supabase"""
+    """Cliente Supabase compartilhado pelo processo (um único pool de conexões)"""
+    return obter_supabase()
+
+def ler_em_lotes(supabase, tabela, colunas, lote=ANALISE_LOTE):
+    """
+    Lê a tabela inteira em lotes, só com as colunas pedidas, paginando pelo id
+    (keyset). Produz um DataFrame por lote; a memória usada é a de um lote,
+    qualquer que seja o tamanho da tabela.
+    """
+    selecao = ",".join(["id", *colunas])
+    ultimo_id = None
+    while True:
+        consulta = supabase.table(tabela).select(selecao)
+        if ultimo_id is not None:
+            consulta = consulta.gt('id', ultimo_id)
+        linhas = consulta.order('id').limit(lote).execute().data
+        if not linhas:
+            return
+        ultimo_id = linhas[-1]['id']
+        yield pd.DataFrame(linhas, columns=["id", *colunas])
+
+def coluna_existe(supabase, tabela, coluna):
+    """Se a coluna existe na tabela (bancos sem as migrations mais novas podem não tê-la)"""
     try:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            logging.error("Variáveis SUPABASE_URL e SUPABASE_KEY devem estar configuradas")
-            return None
-        
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logging.info("Cliente Supabase inicializado com sucesso")
-        return supabase
+        supabase.table(tabela).select(coluna).limit(1).execute()
+        return True
     except Exception as e:
-        logging.error(f"Erro ao inicializar Supabase: {e}")
-        return None
+        if getattr(e, 'code', None) != '42703':
+            raise
+        return False
+
+def amostra_registros(supabase, tabela):
+    """Primeiros registros completos da tabela, para o relatório"""
+    return supabase.table(tabela).select('*').order('id').limit(AMOSTRA_REGISTROS).execute().data
+
+def atualizar_extremos(acumulado, datas):
+    """Mantém em `acumulado` a menor e a maior data vistas até agora"""
+    datas = datas.dropna()
+    if datas.empty:
+        return
+    menor, maior = datas.min(), datas.max()
+    acumulado['primeira'] = menor if acumulado['primeira'] is None else min(acumulado['primeira'], menor)
+    acumulado['ultima'] = maior if acumulado['ultima'] is None else max(acumulado['ultima'], maior)
+
+def somar_contagens(contagens, serie):
+    """Soma as contagens de valores do lote em `contagens` (dict)"""
+    for valor, total in serie.value_counts().items():
+        contagens[valor] = contagens.get(valor, 0) + int(total)
+
+def isoformat_ou_none(data):
+    return data.isoformat() if data is not None else None
+
+def data_ou_none(valor):
+    return pd.Timestamp(valor) if valor is not None else None
+
+def agregar(supabase, no_servidor, em_lotes, *args):
+    """
+    Agregados de uma tabela calculados no servidor. Se as funções de
+    agregação não existirem no banco (PGRST202) ou ANALISE_NO_SERVIDOR=false,
+    lê a tabela em lotes e agrega aqui.
+    """
+    if ANALISE_NO_SERVIDOR:
+        try:
+            return no_servidor(supabase, *args)
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            logging.warning(f"Função de agregação ausente no banco ({e}). Lendo a tabela em lotes.")
+    return em_lotes(supabase, *args)
 
 def analisar_tabela_clientes(supabase):
     """Analisa a tabela de clientes"""
@@ -105,15 +170,72 @@ def analisar_tabela_clientes(supabase):
         logging.error(f"Erro ao analisar tabela clientes: {e}")
         return None
 
+def agregar_lojas_dados(supabase, data_limite):
+    """Agregados de lojas_dados no servidor (resumo_lojas_dados e situacao_clientes)"""
+    resumo = supabase.rpc('resumo_lojas_dados', {'p_limite_antigos': data_limite.isoformat()}).execute().data
+    situacao = supabase.rpc('situacao_clientes', {'p_limite_desatualizado': data_limite.isoformat()}).execute().data
+    return {
+        'total': resumo['total'],
+        'clientes_unicos': resumo['clientes_unicos'],
+        'lojas_unicas': resumo['lojas_unicas'],
+        'primeira': data_ou_none(resumo['primeira']),
+        'ultima': data_ou_none(resumo['ultima']),
+        'sincronizadas': resumo['sincronizadas'],
+        'antigos': resumo['antigos'],
+        'ultima_coleta_por_cliente': {
+            c['cliente_nome']: pd.Timestamp(c['ultima_coleta'])
+            for c in situacao if c['ultima_coleta']
+        },
+    }
+
+def agregar_lojas_dados_em_lotes(supabase, data_limite):
+    """Agregados de lojas_dados calculados lote a lote (memória de um lote)"""
+    acumulado = {'primeira': None, 'ultima': None}
+    total = 0
+    sincronizadas = 0
+    antigos = 0
+    lojas = set()
+    ultima_coleta_por_cliente = {}
+    colunas = ['cliente_nome', 'loja_nome', 'sincronizada', 'data_coleta']
+    # Marcadores de loja removida (execuções delta) não são lojas coletadas
+    com_removida = coluna_existe(supabase, 'lojas_dados', 'removida')
+    if com_removida:
+        colunas.append('removida')
+    
+    for lote in ler_em_lotes(supabase, 'lojas_dados', colunas):
+        if com_removida:
+            lote = lote[~lote['removida'].fillna(False).astype(bool)].copy()
+        lote['data_coleta'] = pd.to_datetime(lote['data_coleta'], utc=True, format='ISO8601')
+        total += len(lote)
+        sincronizadas += int(lote['sincronizada'].fillna(False).astype(bool).sum())
+        antigos += int((lote['data_coleta'] < data_limite).sum())
+        lojas.update(lote['loja_nome'].dropna().unique())
+        atualizar_extremos(acumulado, lote['data_coleta'])
+        for cliente, ultima in lote.groupby('cliente_nome')['data_coleta'].max().items():
+            anterior = ultima_coleta_por_cliente.get(cliente)
+            ultima_coleta_por_cliente[cliente] = ultima if anterior is None else max(anterior, ultima)
+    
+    return {
+        'total': total,
+        'clientes_unicos': len(ultima_coleta_por_cliente),
+        'lojas_unicas': len(lojas),
+        'primeira': acumulado['primeira'],
+        'ultima': acumulado['ultima'],
+        'sincronizadas': sincronizadas,
+        'antigos': antigos,
+        'ultima_coleta_por_cliente': ultima_coleta_por_cliente,
+    }
+
 def analisar_tabela_lojas_dados(supabase):
     """Analisa a tabela de dados das lojas"""
     try:
         logging.info("🔍 Analisando tabela 'lojas_dados'...")
         
-        # Buscar dados das lojas
-        response = supabase.table('lojas_dados').select('*').execute()
+        data_limite = datetime.now(ZoneInfo("America/Sao_Paulo")) - timedelta(days=7)
+        agregado = agregar(supabase, agregar_lojas_dados, agregar_lojas_dados_em_lotes, data_limite)
+        total = agregado['total']
         
-        if not response.data:
+        if total == 0:
             logging.warning("Tabela 'lojas_dados' está vazia")
             return {
                 'total': 0,
@@ -122,34 +244,18 @@ def analisar_tabela_lojas_dados(supabase):
                 'sugestoes': ['Executar script de coleta']
             }
         
-        lojas = response.data
-        logging.info(f"✅ Encontrados {len(lojas)} registros de lojas")
-        
-        # Análise temporal
-        df = pd.DataFrame(lojas)
-        df['data_coleta'] = pd.to_datetime(df['data_coleta'])
-        
-        # Última coleta
-        ultima_coleta = df['data_coleta'].max()
-        primeira_coleta = df['data_coleta'].min()
-        
-        # Análise por cliente
-        clientes_unicos = df['cliente_nome'].nunique()
-        lojas_unicas = df['loja_nome'].nunique()
-        
-        # Análise de sincronização
-        sincronizadas = df['sincronizada'].sum()
-        atrasadas = len(df) - sincronizadas
+        logging.info(f"✅ Encontrados {total} registros de lojas")
         
+        sincronizadas = agregado['sincronizadas']
         estrutura = {
-            'total_registros': len(lojas),
-            'clientes_unicos': clientes_unicos,
-            'lojas_unicas': lojas_unicas,
-            'primeira_coleta': primeira_coleta.isoformat(),
-            'ultima_coleta': ultima_coleta.isoformat(),
-            'sincronizadas': int(sincronizadas),
-            'atrasadas': int(atrasadas),
-            'percentual_sincronizadas': round((sincronizadas / len(df)) * 100, 2) if len(df) > 0 else 0
+            'total_registros': total,
+            'clientes_unicos': agregado['clientes_unicos'],
+            'lojas_unicas': agregado['lojas_unicas'],
+            'primeira_coleta': isoformat_ou_none(agregado['primeira']),
+            'ultima_coleta': isoformat_ou_none(agregado['ultima']),
+            'sincronizadas': sincronizadas,
+            'atrasadas': total - sincronizadas,
+            'percentual_sincronizadas': round((sincronizadas / total) * 100, 2)
         }
         
         # Identificar problemas
@@ -157,40 +263,80 @@ def analisar_tabela_lojas_dados(supabase):
         sugestoes = []
         
         # Verificar dados muito antigos
-        data_limite = datetime.now(ZoneInfo("America/Sao_Paulo")) - timedelta(days=7)
-        dados_antigos = df[df['data_coleta'] < data_limite]
-        if len(dados_antigos) > 0:
-            problemas.append(f"{len(dados_antigos)} registros com mais de 7 dias")
+        if agregado['antigos'] > 0:
+            problemas.append(f"{agregado['antigos']} registros com mais de 7 dias")
             sugestoes.append("Executar coleta de dados")
         
         # Verificar clientes sem dados recentes
-        for cliente in df['cliente_nome'].unique():
-            dados_cliente = df[df['cliente_nome'] == cliente]
-            ultima_coleta_cliente = dados_cliente['data_coleta'].max()
+        for cliente, ultima_coleta_cliente in agregado['ultima_coleta_por_cliente'].items():
             if ultima_coleta_cliente < data_limite:
                 sugestoes.append(f"Verificar coleta para cliente: {cliente}")
         
         return {
-            'total': len(lojas),
+            'total': total,
             'estrutura': estrutura,
             'problemas': problemas,
             'sugestoes': sugestoes,
-            'dados': lojas[:10]  # Primeiros 10 registros para análise
+            'dados': amostra_registros(supabase, 'lojas_dados')
         }
         
     except Exception as e:
         logging.error(f"Erro ao analisar tabela lojas_dados: {e}")
         return None
 
+def agregar_execucoes(supabase, data_limite):
+    """Agregados de execucoes no servidor (distribuicao_execucoes)"""
+    grupos = supabase.rpc('distribuicao_execucoes', {'p_limite_antigas': data_limite.isoformat()}).execute().data
+    status_counts = {}
+    origem_counts = {}
+    for grupo in grupos:
+        status_counts[grupo['status']] = status_counts.get(grupo['status'], 0) + grupo['total']
+        if grupo['origem'] is not None:
+            origem_counts[grupo['origem']] = origem_counts.get(grupo['origem'], 0) + grupo['total']
+    return {
+        'total': sum(grupo['total'] for grupo in grupos),
+        'primeira': min((pd.Timestamp(g['primeira']) for g in grupos), default=None),
+        'ultima': max((pd.Timestamp(g['ultima']) for g in grupos), default=None),
+        'status_counts': status_counts,
+        'origem_counts': origem_counts,
+        'antigas': sum(grupo['antigas'] for grupo in grupos),
+    }
+
+def agregar_execucoes_em_lotes(supabase, data_limite):
+    """Agregados de execucoes calculados lote a lote (memória de um lote)"""
+    acumulado = {'primeira': None, 'ultima': None}
+    total = 0
+    status_counts = {}
+    origem_counts = {}
+    antigas = 0
+    
+    for lote in ler_em_lotes(supabase, 'execucoes', ['executado_em', 'status', 'origem']):
+        lote['executado_em'] = pd.to_datetime(lote['executado_em'], utc=True, format='ISO8601')
+        total += len(lote)
+        somar_contagens(status_counts, lote['status'])
+        somar_contagens(origem_counts, lote['origem'])
+        antigas += int((lote['executado_em'] < data_limite).sum())
+        atualizar_extremos(acumulado, lote['executado_em'])
+    
+    return {
+        'total': total,
+        'primeira': acumulado['primeira'],
+        'ultima': acumulado['ultima'],
+        'status_counts': status_counts,
+        'origem_counts': origem_counts,
+        'antigas': antigas,
+    }
+
 def analisar_tabela_execucoes(supabase):
     """Analisa a tabela de execuções"""
     try:
         logging.info("🔍 Analisando tabela 'execucoes'...")
         
-        # Buscar execuções
-        response = supabase.table('execucoes').select('*').execute()
+        data_limite = datetime.now(ZoneInfo("America/Sao_Paulo")) - timedelta(hours=6)
+        agregado = agregar(supabase, agregar_execucoes, agregar_execucoes_em_lotes, data_limite)
+        total = agregado['total']
         
-        if not response.data:
+        if total == 0:
             logging.warning("Tabela 'execucoes' está vazia")
             return {
                 'total': 0,
@@ -199,29 +345,15 @@ def analisar_tabela_execucoes(supabase):
                 'sugestoes': ['Executar script de monitoramento']
             }
         
-        execucoes = response.data
-        logging.info(f"✅ Encontradas {len(execucoes)} execuções")
-        
-        # Análise temporal
-        df = pd.DataFrame(execucoes)
-        df['executado_em'] = pd.to_datetime(df['executado_em'])
-        
-        # Última execução
-        ultima_execucao = df['executado_em'].max()
-        primeira_execucao = df['executado_em'].min()
-        
-        # Análise por status
-        status_counts = df['status'].value_counts()
-        
-        # Análise por origem
-        origem_counts = df['origem'].value_counts()
+        logging.info(f"✅ Encontradas {total} execuções")
         
+        status_counts = agregado['status_counts']
         estrutura = {
-            'total_execucoes': len(execucoes),
-            'primeira_execucao': primeira_execucao.isoformat(),
-            'ultima_execucao': ultima_execucao.isoformat(),
-            'status_distribuicao': status_counts.to_dict(),
-            'origem_distribuicao': origem_counts.to_dict()
+            'total_execucoes': total,
+            'primeira_execucao': isoformat_ou_none(agregado['primeira']),
+            'ultima_execucao': isoformat_ou_none(agregado['ultima']),
+            'status_distribuicao': dict(sorted(status_counts.items(), key=lambda item: -item[1])),
+            'origem_distribuicao': dict(sorted(agregado['origem_counts'].items(), key=lambda item: -item[1]))
         }
         
         # Identificar problemas
@@ -229,38 +361,64 @@ def analisar_tabela_execucoes(supabase):
         sugestoes = []
         
         # Verificar execuções com erro
-        erros = df[df['status'] == 'erro']
-        if len(erros) > 0:
-            problemas.append(f"{len(erros)} execuções com erro")
+        erros = status_counts.get('erro', 0)
+        if erros > 0:
+            problemas.append(f"{erros} execuções com erro")
             sugestoes.append("Verificar logs de erro")
         
         # Verificar execuções antigas
-        data_limite = datetime.now(ZoneInfo("America/Sao_Paulo")) - timedelta(hours=6)
-        execucoes_antigas = df[df['executado_em'] < data_limite]
-        if len(execucoes_antigas) > 0:
+        if agregado['antigas'] > 0:
             sugestoes.append("Verificar se o workflow está funcionando")
         
         return {
-            'total': len(execucoes),
+            'total': total,
             'estrutura': estrutura,
             'problemas': problemas,
             'sugestoes': sugestoes,
-            'dados': execucoes[:10]
+            'dados': amostra_registros(supabase, 'execucoes')
         }
         
     except Exception as e:
         logging.error(f"Erro ao analisar tabela execucoes: {e}")
         return None
 
+def agregar_metricas_periodicas(supabase):
+    """Agregados de metricas_periodicas no servidor (resumo_metricas_periodicas)"""
+    grupos = supabase.rpc('resumo_metricas_periodicas', {}).execute().data
+    return {
+        'total': sum(grupo['total'] for grupo in grupos),
+        'primeira': min((pd.Timestamp(g['primeira']) for g in grupos), default=None),
+        'ultima': max((pd.Timestamp(g['ultima']) for g in grupos), default=None),
+        'periodo_counts': {grupo['periodo']: grupo['total'] for grupo in grupos if grupo['periodo'] is not None},
+    }
+
+def agregar_metricas_periodicas_em_lotes(supabase):
+    """Agregados de metricas_periodicas calculados lote a lote (memória de um lote)"""
+    acumulado = {'primeira': None, 'ultima': None}
+    total = 0
+    periodo_counts = {}
+    
+    for lote in ler_em_lotes(supabase, 'metricas_periodicas', ['data_referencia', 'periodo']):
+        total += len(lote)
+        somar_contagens(periodo_counts, lote['periodo'])
+        atualizar_extremos(acumulado, pd.to_datetime(lote['data_referencia']))
+    
+    return {
+        'total': total,
+        'primeira': acumulado['primeira'],
+        'ultima': acumulado['ultima'],
+        'periodo_counts': periodo_counts,
+    }
+
 def analisar_tabela_metricas_periodicas(supabase):
     """Analisa a tabela de métricas periódicas"""
     try:
         logging.info("🔍 Analisando tabela 'metricas_periodicas'...")
         
-        # Buscar métricas
-        response = supabase.table('metricas_periodicas').select('*').execute()
+        agregado = agregar(supabase, agregar_metricas_periodicas, agregar_metricas_periodicas_em_lotes)
+        total = agregado['total']
         
-        if not response.data:
+        if total == 0:
             logging.warning("Tabela 'metricas_periodicas' está vazia")
             return {
                 'total': 0,
@@ -269,33 +427,21 @@ def analisar_tabela_metricas_periodicas(supabase):
                 'sugestoes': ['Gerar métricas a partir dos dados existentes']
             }
         
-        metricas = response.data
-        logging.info(f"✅ Encontradas {len(metricas)} métricas")
-        
-        # Análise por período
-        df = pd.DataFrame(metricas)
-        df['data_referencia'] = pd.to_datetime(df['data_referencia'])
-        
-        # Última métrica
-        ultima_metrica = df['data_referencia'].max()
-        primeira_metrica = df['data_referencia'].min()
-        
-        # Análise por tipo de período
-        periodo_counts = df['periodo'].value_counts()
+        logging.info(f"✅ Encontradas {total} métricas")
         
         estrutura = {
-            'total_metricas': len(metricas),
-            'primeira_metrica': primeira_metrica.isoformat(),
-            'ultima_metrica': ultima_metrica.isoformat(),
-            'periodo_distribuicao': periodo_counts.to_dict()
+            'total_metricas': total,
+            'primeira_metrica': isoformat_ou_none(agregado['primeira']),
+            'ultima_metrica': isoformat_ou_none(agregado['ultima']),
+            'periodo_distribuicao': dict(sorted(agregado['periodo_counts'].items(), key=lambda item: -item[1]))
         }
         
         return {
-            'total': len(metricas),
+            'total': total,
             'estrutura': estrutura,
             'problemas': [],
             'sugestoes': ['Métricas estão sendo geradas corretamente'],
-            'dados': metricas[:10]
+            'dados': amostra_registros(supabase, 'metricas_periodicas')
         }
         
     except Exception as e:
@@ -377,6 +523,7 @@ def main():
     
     try:
         relatorio = gerar_relatorio_completo()
+        registrar_estatisticas_conexoes()
         if relatorio:
             logging.info("✅ Análise concluída com sucesso!")
         else:
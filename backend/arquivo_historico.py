@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Arquivo histórico em Parquet
+Antes da limpeza (cleanup_database.py), as linhas que vão expirar de
+`lojas_dados`, `execucoes` e `metricas_periodicas` são exportadas para
+arquivos Parquet comprimidos (zstd), com tipos compactos e particionados por
+cliente e mês (cliente=<nome>/mes=AAAA-MM). Os arquivos ficam em
+ARQUIVO_HISTORICO_DIR e, com ARQUIVO_HISTORICO_BUCKET, também no Supabase
+Storage, de onde podem ser sincronizados para análises offline.
+
+Uso:
+    df = ler_historico("Cliente X", "2026-01-01", "2026-12-31",
+                       colunas=["data_coleta", "sincronizada"])
+
+    python arquivo_historico.py --sincronizar
+    python arquivo_historico.py "Cliente X" --inicio 2026-01-01 --colunas data_coleta sincronizada
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime
+from urllib.parse import quote, unquote
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+# Diretório local e bucket do Supabase Storage são lidos a cada chamada
+# (os scripts carregam o .env depois de importar este módulo)
+ARQUIVO_HISTORICO_DIR_PADRAO = "arquivo_historico"
+ARQUIVO_LOTE_LEITURA = 1000
+# Linhas acumuladas antes de gravar os arquivos de cada partição
+ARQUIVO_LINHAS_POR_ARQUIVO = int(os.getenv("ARQUIVO_LINHAS_POR_ARQUIVO", "200000"))
+FUSO = ZoneInfo("America/Sao_Paulo")
+
+TEXTO = pa.string()
+CATEGORIA = pa.dictionary(pa.int32(), pa.string())
+MOMENTO = pa.timestamp("us", tz="UTC")
+
+# Colunas arquivadas de cada tabela (cliente_nome vira a partição `cliente`)
+ESQUEMAS = {
+    "lojas_dados": {
+        "campo_data": "data_coleta",
+        "esquema": pa.schema(
+            [
+                ("id", TEXTO),
+                ("execucao_id", CATEGORIA),
+                ("cliente_id", pa.int32()),
+                ("loja_nome", CATEGORIA),
+                ("identificador", CATEGORIA),
+                ("atualizado_em", MOMENTO),
+                ("sincronizada", pa.bool_()),
+                ("tempo_atraso_horas", pa.float32()),
+                ("tempo_atraso_dias", pa.int16()),
+                ("hash_loja", CATEGORIA),
+                ("removida", pa.bool_()),
+                ("data_coleta", MOMENTO),
+            ]
+        ),
+    },
+    "execucoes": {
+        "campo_data": "executado_em",
+        "esquema": pa.schema(
+            [
+                ("id", TEXTO),
+                ("cliente_id", pa.int32()),
+                ("total_lojas", pa.int32()),
+                ("lojas_sincronizadas", pa.int32()),
+                ("lojas_atrasadas", pa.int32()),
+                ("percentual_sincronizadas", pa.float32()),
+                ("percentual_atrasadas", pa.float32()),
+                ("status", CATEGORIA),
+                ("erro_detalhes", TEXTO),
+                ("origem", CATEGORIA),
+                ("modo_gravacao", CATEGORIA),
+                ("execucao_base_id", TEXTO),
+                ("estatisticas", TEXTO),  # JSON
+                ("executado_em", MOMENTO),
+            ]
+        ),
+    },
+    "metricas_periodicas": {
+        "campo_data": "data_referencia",
+        "esquema": pa.schema(
+            [
+                ("id", TEXTO),
+                ("cliente_id", pa.int32()),
+                ("periodo", CATEGORIA),
+                ("total_lojas", pa.int32()),
+                ("lojas_sincronizadas", pa.int32()),
+                ("lojas_atrasadas", pa.int32()),
+                ("percentual_sincronizadas", pa.float32()),
+                ("tempo_medio_atraso_horas", pa.float32()),
+                ("maior_atraso_horas", pa.float32()),
+                ("execucoes_periodo", pa.int32()),
+                ("data_referencia", pa.date32()),
+            ]
+        ),
+    },
+}
+
+
+def diretorio_historico():
+    return os.getenv("ARQUIVO_HISTORICO_DIR", ARQUIVO_HISTORICO_DIR_PADRAO)
+
+
+def bucket_historico():
+    return os.getenv("ARQUIVO_HISTORICO_BUCKET")
+
+
+PARTICOES = ds.partitioning(
+    pa.schema([("cliente", TEXTO), ("mes", TEXTO)]), flavor="hive"
+)
+
+
+# ======================================
+# 📦 EXPORTAÇÃO
+# ======================================
+
+
+def para_tabela_arrow(df, esquema):
+    """Converte as linhas lidas do Supabase para os tipos compactos do esquema"""
+    colunas = {}
+    for campo in esquema:
+        if campo.name in df:
+            serie = df[campo.name]
+        else:
+            serie = pd.Series([None] * len(df), dtype="object")
+
+        if pa.types.is_timestamp(campo.type):
+            serie = pd.to_datetime(serie, utc=True, format="ISO8601")
+        elif pa.types.is_date32(campo.type):
+            serie = pd.to_datetime(serie, format="ISO8601").dt.date
+        elif campo.name == "estatisticas":
+            serie = serie.map(
+                lambda valor: None if valor is None else json.dumps(valor, default=str)
+            )
+
+        valores = pa.array(serie, from_pandas=True)
+        if pa.types.is_dictionary(campo.type):
+            valores = valores.cast(TEXTO).dictionary_encode()
+        else:
+            valores = valores.cast(campo.type)
+        colunas[campo.name] = valores
+
+    return pa.table(colunas, schema=esquema)
+
+
+def _meses(datas, tipo):
+    """Mês (AAAA-MM, horário de São Paulo) de cada linha, para a partição"""
+    if pa.types.is_date32(tipo):
+        return pd.to_datetime(datas, format="ISO8601").dt.strftime("%Y-%m")
+    datas = pd.to_datetime(datas, utc=True, format="ISO8601")
+    return datas.dt.tz_convert(FUSO).dt.strftime("%Y-%m")
+
+
+def _enviar_bucket(supabase, caminho_local, caminho_relativo):
+    supabase.storage.from_(bucket_historico()).upload(
+        caminho_relativo,
+        caminho_local,
+        {"content-type": "application/vnd.apache.parquet"},
+    )
+
+
+def gravar_particoes(linhas, tabela, supabase=None, diretorio=None):
+    """
+    Grava as linhas em um arquivo Parquet por partição (cliente, mês).
+    Cada gravação cria arquivos novos (nunca sobrescreve); ler_historico
+    descarta linhas repetidas pelo id. Devolve os caminhos gravados.
+    """
+    config = ESQUEMAS[tabela]
+    diretorio = diretorio or diretorio_historico()
+    campo_data = config["campo_data"]
+    df = pd.DataFrame(linhas)
+    df["_mes"] = _meses(df[campo_data], config["esquema"].field(campo_data).type)
+    sufixo = f"{datetime.now(FUSO):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    arquivos = []
+
+    for (cliente, mes), grupo in df.groupby(["cliente_nome", "_mes"], sort=False):
+        relativo = f"{tabela}/cliente={quote(cliente, safe='')}/mes={mes}/parte-{sufixo}.parquet"
+        caminho = os.path.join(diretorio, *relativo.split("/"))
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        temporario = caminho + ".tmp"
+        pq.write_table(
+            para_tabela_arrow(grupo, config["esquema"]),
+            temporario,
+            compression="zstd",
+        )
+        os.replace(temporario, caminho)
+        if supabase is not None and bucket_historico():
+            _enviar_bucket(supabase, caminho, relativo)
+        arquivos.append(caminho)
+
+    return arquivos
+
+
+def _ler_lotes(supabase, tabela, aplicar_filtros, selecao="*"):
+    """Lê as linhas filtradas em lotes, paginando pelo id (keyset)"""
+    ultimo_id = None
+    while True:
+        consulta = aplicar_filtros(supabase.table(tabela).select(selecao))
+        if ultimo_id is not None:
+            consulta = consulta.gt("id", ultimo_id)
+        linhas = consulta.order("id").limit(ARQUIVO_LOTE_LEITURA).execute().data
+        if not linhas:
+            return
+        ultimo_id = linhas[-1]["id"]
+        yield linhas
+
+
+def _consultas_exportacao(tabela, data_limite):
+    """
+    Filtros das linhas que a limpeza vai remover, sem repetir linhas entre as
+    consultas. As lojas saem por data de coleta (limpar_retencao) e também em
+    cascata com a execução, então são arquivadas as das execuções antigas e as
+    coletadas antes do limite, inclusive as de execuções mais novas (ingestão
+    tardia) e as sem execução.
+    """
+    limite = data_limite.isoformat()
+    if tabela == "lojas_dados":
+        return [
+            (
+                "*, execucoes!inner(executado_em)",
+                lambda consulta: consulta.lt("execucoes.executado_em", limite),
+            ),
+            (
+                "*, execucoes!inner(executado_em)",
+                lambda consulta: consulta.gte("execucoes.executado_em", limite).lt(
+                    "data_coleta", limite
+                ),
+            ),
+            (
+                "*",
+                lambda consulta: consulta.is_("execucao_id", "null").lt(
+                    "data_coleta", limite
+                ),
+            ),
+        ]
+    campo = ESQUEMAS[tabela]["campo_data"]
+    if tabela == "metricas_periodicas":
+        limite = data_limite.date().isoformat()
+    return [("*", lambda consulta: consulta.lt(campo, limite))]
+
+
+def exportar_historico(supabase, tabela, data_limite, diretorio=None):
+    """
+    Exporta para Parquet as linhas de `tabela` anteriores a `data_limite`.
+    Devolve {"linhas", "arquivos", "bytes", "duracao_s"} ou None se a exportação
+    falhar (nesse caso a limpeza da tabela não deve acontecer).
+    """
+    inicio = time.time()
+    total_linhas = 0
+    arquivos = []
+    pendentes = []
+
+    try:
+        for selecao, aplicar_filtros in _consultas_exportacao(tabela, data_limite):
+            for linhas in _ler_lotes(supabase, tabela, aplicar_filtros, selecao):
+                for linha in linhas:
+                    linha.pop("execucoes", None)
+                pendentes.extend(linhas)
+                total_linhas += len(linhas)
+                if len(pendentes) >= ARQUIVO_LINHAS_POR_ARQUIVO:
+                    arquivos += gravar_particoes(pendentes, tabela, supabase, diretorio)
+                    pendentes = []
+        if pendentes:
+            arquivos += gravar_particoes(pendentes, tabela, supabase, diretorio)
+    except Exception as e:
+        logging.error(f"❌ Falha ao arquivar {tabela}: {e}")
+        return None
+
+    resultado = {
+        "linhas": total_linhas,
+        "arquivos": len(arquivos),
+        "bytes": sum(os.path.getsize(arquivo) for arquivo in arquivos),
+        "duracao_s": round(time.time() - inicio, 2),
+    }
+    logging.info(
+        f"📦 {total_linhas} linhas de {tabela} arquivadas em {len(arquivos)} arquivos "
+        f"Parquet ({resultado['bytes'] / 1024:.0f} KB) em {resultado['duracao_s']}s"
+    )
+    return resultado
+
+
+def sincronizar_arquivo_historico(supabase, diretorio=None):
+    """Baixa do bucket os arquivos que ainda não existem em `diretorio`"""
+    diretorio = diretorio or diretorio_historico()
+    bucket = supabase.storage.from_(bucket_historico())
+    baixados = 0
+    pastas = list(ESQUEMAS)
+
+    while pastas:
+        pasta = pastas.pop()
+        for item in bucket.list(pasta, {"limit": 1000}):
+            relativo = f"{pasta}/{item['name']}"
+            if item.get("id") is None:  # subpasta
+                pastas.append(relativo)
+                continue
+            caminho = os.path.join(diretorio, *relativo.split("/"))
+            if os.path.exists(caminho):
+                continue
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, "wb") as f:
+                f.write(bucket.download(relativo))
+            baixados += 1
+
+    logging.info(f"⬇️ {baixados} arquivos do histórico baixados para {diretorio}")
+    return baixados
+
+
+# ======================================
+# 🔎 LEITURA
+# ======================================
+
+
+def _data(valor):
+    if valor is None or isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def ler_historico(
+    cliente_nome,
+    inicio=None,
+    fim=None,
+    tabela="lojas_dados",
+    colunas=None,
+    diretorio=None,
+):
+    """
+    Histórico arquivado de um cliente entre as datas `inicio` e `fim`
+    (inclusivas, date ou 'AAAA-MM-DD'), como DataFrame com colunas categóricas.
+    Só são abertos os arquivos do cliente e dos meses do intervalo (partições)
+    e só as `colunas` pedidas são lidas de cada arquivo.
+    """
+    config = ESQUEMAS[tabela]
+    campo_data = config["campo_data"]
+    inicio, fim = _data(inicio), _data(fim)
+    pasta = os.path.join(diretorio or diretorio_historico(), tabela)
+    if not os.path.isdir(pasta):
+        return pd.DataFrame(columns=colunas or config["esquema"].names)
+
+    dataset = ds.dataset(
+        pasta,
+        format="parquet",
+        partitioning=PARTICOES,
+        schema=pa.unify_schemas([config["esquema"], PARTICOES.schema]),
+    )
+
+    filtro = ds.field("cliente") == cliente_nome
+    if inicio:
+        filtro &= ds.field("mes") >= f"{inicio:%Y-%m}"
+    if fim:
+        filtro &= ds.field("mes") <= f"{fim:%Y-%m}"
+    # Dentro dos meses, o corte exato usa as estatísticas dos row groups
+    if pa.types.is_date32(config["esquema"].field(campo_data).type):
+        if inicio:
+            filtro &= ds.field(campo_data) >= pa.scalar(inicio, pa.date32())
+        if fim:
+            filtro &= ds.field(campo_data) <= pa.scalar(fim, pa.date32())
+    else:
+        if inicio:
+            filtro &= ds.field(campo_data) >= pa.scalar(
+                datetime.combine(inicio, datetime.min.time(), FUSO), MOMENTO
+            )
+        if fim:
+            filtro &= ds.field(campo_data) <= pa.scalar(
+                datetime.combine(fim, datetime.max.time(), FUSO), MOMENTO
+            )
+
+    leitura = list(colunas) if colunas else config["esquema"].names
+    # O id é lido para descartar linhas arquivadas mais de uma vez
+    projecao = list(dict.fromkeys(["id", *leitura]))
+    tabela_arrow = dataset.to_table(columns=projecao, filter=filtro)
+
+    df = tabela_arrow.to_pandas()
+    df = df.drop_duplicates("id")
+    if "id" not in leitura:
+        df = df.drop(columns="id")
+    return df.sort_values(campo_data).reset_index(drop=True) if campo_data in df else df
+
+
+def clientes_arquivados(tabela="lojas_dados", diretorio=None):
+    """Clientes com histórico arquivado (nomes das partições)"""
+    pasta = os.path.join(diretorio or diretorio_historico(), tabela)
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(
+        unquote(nome.split("=", 1)[1])
+        for nome in os.listdir(pasta)
+        if nome.startswith("cliente=")
+    )
+
+
+# ======================================
+# 🧠 LINHA DE COMANDO
+# ======================================
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Histórico arquivado em Parquet")
+    parser.add_argument("cliente", nargs="?", help="Cliente a consultar")
+    parser.add_argument("--inicio", help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", help="Data final (AAAA-MM-DD)")
+    parser.add_argument("--tabela", default="lojas_dados", choices=list(ESQUEMAS))
+    parser.add_argument("--colunas", nargs="+", help="Colunas a ler")
+    parser.add_argument(
+        "--sincronizar",
+        action="store_true",
+        help="Baixa do bucket (ARQUIVO_HISTORICO_BUCKET) os arquivos que faltam",
+    )
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.sincronizar:
+        from supabase_compartilhado import obter_supabase
+
+        sincronizar_arquivo_historico(obter_supabase())
+
+    if not args.cliente:
+        for cliente in clientes_arquivados(args.tabela):
+            print(cliente)
+        return
+
+    inicio = time.time()
+    df = ler_historico(args.cliente, args.inicio, args.fim, args.tabela, args.colunas)
+    print(df)
+    print(
+        f"\n{len(df)} linhas, {df.memory_usage(deep=True).sum() / 1024:.0f} KB "
+        f"em memória, lidas em {time.time() - inicio:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
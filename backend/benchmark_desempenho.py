@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks do pipeline de coleta (client_monitor_supabase.py)
+Mede as etapas críticas com dados sintéticos, sem acessar o site nem o Supabase.
+
+Uso:
+    python benchmark_desempenho.py extracao-dom --linhas 30 3000
+    python benchmark_desempenho.py payload-lojas --lojas 1000 10000 100000
+    python benchmark_desempenho.py analise-sincronizacao --lojas 1000 100000
+    python benchmark_desempenho.py memoria-lojas --lojas 1000 100000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from client_monitor_supabase import (
+    analisar_sincronizacao,
+    datas_lojas,
+    gerar_hash_loja,
+    ler_pagina_logs,
+    linhas_para_registros,
+    montar_df_lojas,
+    montar_registros_lojas,
+)
+
+
+def gerar_html_tabela(total_linhas):
+    """Gera uma página com a mesma estrutura da tabela de logs do sistema"""
+    linhas = "".join(
+        f"<tr><td>{i}</td><td>Loja {i}</td><td>ID-{i:06d}</td>"
+        f"<td>{(i % 28) + 1:02d}/10/2026 {(i % 24):02d}:{(i % 60):02d}:00</td></tr>"
+        for i in range(total_linhas)
+    )
+    return (
+        '<html><body><table class="table table-striped">'
+        "<thead><tr><th>#</th><th>Loja</th><th>Identificador</th>"
+        f"<th>Atualizado em</th></tr></thead><tbody>{linhas}</tbody></table>"
+        "</body></html>"
+    )
+
+
+def extrair_linhas_por_celula(page, page_count):
+    """Implementação anterior: um inner_text() (round trip) por célula"""
+    linhas = []
+    for row in page.locator("table.table-striped tbody tr").all():
+        cols = row.locator("td").all()
+        if len(cols) >= 4:
+            linhas.append([""] + [col.inner_text() for col in cols[1:4]])
+        else:
+            linhas.append([None] * len(cols))
+    return linhas_para_registros(linhas, page_count)
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa a função N vezes e devolve (resultado, mediana em segundos)"""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tempos)
+
+
+def benchmark_extracao_dom(args):
+    """Compara a extração por célula com a leitura em um único page.evaluate"""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=True)
+        page = browser.new_page()
+
+        print(f"{'linhas':>8} | {'por célula':>12} | {'evaluate':>12} | {'ganho':>7}")
+        for total_linhas in args.linhas:
+            page.set_content(gerar_html_tabela(total_linhas))
+
+            antigo, t_antigo = cronometrar(
+                lambda: extrair_linhas_por_celula(page, 1), args.repeticoes
+            )
+            novo, t_novo = cronometrar(
+                lambda: linhas_para_registros(ler_pagina_logs(page)[0], 1),
+                args.repeticoes,
+            )
+
+            if antigo != novo:
+                raise SystemExit(f"Resultados divergentes para {total_linhas} linhas")
+
+            print(
+                f"{total_linhas:>8} | {t_antigo * 1000:>10.1f}ms | "
+                f"{t_novo * 1000:>10.1f}ms | {t_antigo / t_novo:>6.1f}x"
+            )
+
+        browser.close()
+
+
+def gerar_datas_atualizacao(total_lojas):
+    """Textos de "Atualizado em": metade sincronizada hoje, metade atrasada"""
+    agora = datetime.now(ZoneInfo("America/Sao_Paulo")).replace(
+        hour=12, minute=0, second=0, microsecond=0
+    )
+    return [
+        (agora - timedelta(days=(i % 2) * (i % 40), minutes=i % 600)).strftime(
+            "%d/%m/%Y %H:%M:%S"
+        )
+        for i in range(total_lojas)
+    ]
+
+
+def gerar_df_lojas(total_lojas):
+    """DataFrame analisado, no formato compacto usado pelas gravações"""
+    return analisar_sincronizacao(
+        df_atualizacoes(gerar_datas_atualizacao(total_lojas))
+    )[0]
+
+
+def atrasos_lojas(df):
+    """Coluna "Tempo Atraso" (segundos) como timedelta"""
+    return pd.to_timedelta(df["Tempo Atraso"], unit="s")
+
+
+def expandir_df_lojas(df):
+    """Colunas no formato anterior (datas com fuso e timedeltas) para as referências"""
+    df = df.copy()
+    df["Data Atualizacao"] = datas_lojas(df)
+    df["Tempo Atraso"] = atrasos_lojas(df)
+    return df
+
+
+def montar_registros_lojas_iterrows(execucao_id, df, cliente_info):
+    """Implementação anterior: iterrows com now(), md5 e isoformat por linha"""
+    dados_lojas = []
+    for _, row in df.iterrows():
+        tempo_atraso_horas = 0
+        tempo_atraso_dias = 0
+        if row["Tempo Atraso"] != timedelta(0):
+            tempo_atraso_horas = float(
+                round(row["Tempo Atraso"].total_seconds() / 3600, 2)
+            )
+            tempo_atraso_dias = int(row["Tempo Atraso"].days)
+
+        dados_lojas.append(
+            {
+                "execucao_id": execucao_id,
+                "cliente_id": cliente_info.get("id"),
+                "cliente_nome": cliente_info.get("nome"),
+                "loja_nome": row["Loja"],
+                "identificador": row["Identificador"],
+                "atualizado_em": (
+                    row["Data Atualizacao"].isoformat()
+                    if pd.notna(row["Data Atualizacao"])
+                    else None
+                ),
+                "sincronizada": bool(row["Sincronizada"]),
+                "tempo_atraso_horas": tempo_atraso_horas,
+                "tempo_atraso_dias": tempo_atraso_dias,
+                "hash_loja": gerar_hash_loja(
+                    cliente_info.get("nome"), row["Loja"], row["Identificador"]
+                ),
+                "data_coleta": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
+            }
+        )
+    return dados_lojas
+
+
+def sem_data_coleta(registros):
+    return [{k: v for k, v in r.items() if k != "data_coleta"} for r in registros]
+
+
+def benchmark_payload_lojas(args):
+    """Compara a montagem do payload de lojas_dados por iterrows e por colunas"""
+    cliente_info = {"id": 1, "nome": "Cliente Benchmark"}
+
+    print(f"{'lojas':>8} | {'iterrows':>12} | {'colunar':>12} | {'ganho':>7}")
+    for total_lojas in args.lojas:
+        df = gerar_df_lojas(total_lojas)
+        df_expandido = expandir_df_lojas(df)
+
+        antigo, t_antigo = cronometrar(
+            lambda: montar_registros_lojas_iterrows("exec", df_expandido, cliente_info),
+            args.repeticoes,
+        )
+        novo, t_novo = cronometrar(
+            lambda: montar_registros_lojas("exec", df, cliente_info), args.repeticoes
+        )
+
+        if sem_data_coleta(antigo) != sem_data_coleta(novo):
+            raise SystemExit(f"Resultados divergentes para {total_lojas} lojas")
+
+        print(
+            f"{total_lojas:>8} | {t_antigo * 1000:>10.1f}ms | "
+            f"{t_novo * 1000:>10.1f}ms | {t_antigo / t_novo:>6.1f}x"
+        )
+
+
+def analisar_sincronizacao_apply(df, agora):
+    """Implementação anterior: dayfirst inferido por valor e apply por linha"""
+    tz_sp = ZoneInfo("America/Sao_Paulo")
+    df["Data Atualizacao"] = pd.to_datetime(
+        df["Atualizado em"], dayfirst=True
+    ).dt.tz_localize(tz_sp, ambiguous="NaT", nonexistent="shift_forward")
+
+    dt_inicio = datetime.combine(agora.date(), dt_time.min).replace(tzinfo=tz_sp)
+    dt_fim = datetime.combine(agora.date(), dt_time.max).replace(tzinfo=tz_sp)
+
+    df["Sincronizada"] = df["Data Atualizacao"].between(dt_inicio, dt_fim)
+    df["Tempo Atraso"] = df.apply(
+        lambda row: (
+            dt_inicio - row["Data Atualizacao"]
+            if not row["Sincronizada"]
+            else timedelta(0)
+        ),
+        axis=1,
+    )
+
+    total_lojas = int(len(df))
+    sincronizadas = int(df["Sincronizada"].sum())
+    percentual_sincronizadas = float(
+        (sincronizadas / total_lojas * 100) if total_lojas else 0
+    )
+    return df, {
+        "total": total_lojas,
+        "sincronizadas": sincronizadas,
+        "atrasadas": int(total_lojas - sincronizadas),
+        "percentual_sincronizadas": percentual_sincronizadas,
+        "percentual_atrasadas": float(100 - percentual_sincronizadas),
+    }
+
+
+def df_atualizacoes(datas):
+    """DataFrame como sai da extração (montar_df_lojas)"""
+    return montar_df_lojas(
+        [
+            {
+                "Loja": f"Loja {i % 5000}",
+                "Identificador": f"ID-{i:06d}",
+                "Atualizado em": data,
+            }
+            for i, data in enumerate(datas)
+        ]
+    )
+
+
+def comparar_analises(datas, agora):
+    """Confere colunas e resumo da versão por colunas contra a anterior"""
+    antigo_df, antigo = analisar_sincronizacao_apply(df_atualizacoes(datas), agora)
+    novo_df, novo = analisar_sincronizacao(df_atualizacoes(datas), agora)
+
+    if antigo != novo:
+        raise SystemExit(f"Resumos divergentes: {antigo} x {novo}")
+    antigo_df["Tempo Atraso"] = pd.to_timedelta(antigo_df["Tempo Atraso"])
+    novo_df = expandir_df_lojas(novo_df)
+    for coluna in ("Data Atualizacao", "Sincronizada", "Tempo Atraso"):
+        antiga, nova = antigo_df[coluna], novo_df[coluna]
+        if coluna != "Sincronizada":
+            # Só os valores: a resolução (ns/us/s) varia com a versão do pandas
+            antiga, nova = antiga.dt.as_unit("us"), nova.dt.as_unit("us")
+        try:
+            pd.testing.assert_series_equal(antiga, nova, check_names=False)
+        except AssertionError as e:
+            raise SystemExit(f"Coluna {coluna!r} divergente: {e}")
+
+
+def conferir_analise_sincronizacao():
+    """
+    Regressão da análise por colunas: mesmo resultado da implementação
+    anterior em dados sintéticos e nos casos de borda (limites do dia,
+    formato sem segundos, horário inexistente do início do horário de verão,
+    lista vazia). Ficam de fora os horários ambíguos (antes viravam NaT, agora
+    contam como a primeira ocorrência) e listas com os dois formatos
+    misturados, que a versão anterior não convertia.
+    """
+    agora = datetime(2026, 10, 17, 15, 30, tzinfo=ZoneInfo("America/Sao_Paulo"))
+    comparar_analises(gerar_datas_atualizacao(5000), agora)
+    comparar_analises(
+        [
+            "17/10/2026 00:00:00",
+            "16/10/2026 23:59:59",
+            "17/10/2026 23:59:59",
+            "18/10/2026 00:00:00",
+            "01/02/2026 10:00:00",
+            "04/11/2018 00:30:00",
+            "17/10/2026 00:00:00",
+        ],
+        agora,
+    )
+    comparar_analises(["17/10/2026 08:15", "12/10/2026 23:59"], agora)
+    comparar_analises([], agora)
+
+    _, resumo = analisar_sincronizacao(df_atualizacoes(["17/02/2018 23:30:00"]), agora)
+    if resumo["atrasadas"] != 1:
+        raise SystemExit("Horário ambíguo não foi tratado como atraso")
+
+
+def benchmark_analise_sincronizacao(args):
+    """Compara a análise com apply por linha e a versão por colunas"""
+    conferir_analise_sincronizacao()
+    agora = datetime.now(ZoneInfo("America/Sao_Paulo"))
+
+    print(f"{'lojas':>8} | {'apply':>12} | {'colunar':>12} | {'ganho':>7}")
+    for total_lojas in args.lojas:
+        datas = gerar_datas_atualizacao(total_lojas)
+        # Cada versão recebe o DataFrame no formato da sua extração
+        extraido = df_atualizacoes(datas)
+        extraido_anterior = extraido.astype(object)
+
+        _, t_antigo = cronometrar(
+            lambda: analisar_sincronizacao_apply(extraido_anterior.copy(), agora),
+            args.repeticoes,
+        )
+        _, t_novo = cronometrar(
+            lambda: analisar_sincronizacao(extraido.copy(), agora),
+            args.repeticoes,
+        )
+        comparar_analises(datas, agora)
+
+        print(
+            f"{total_lojas:>8} | {t_antigo * 1000:>10.1f}ms | "
+            f"{t_novo * 1000:>10.1f}ms | {t_antigo / t_novo:>6.1f}x"
+        )
+
+
+def benchmark_memoria_lojas(args):
+    """Memória do DataFrame analisado: formato anterior x formato compacto"""
+    agora = datetime.now(ZoneInfo("America/Sao_Paulo"))
+
+    print(f"{'lojas':>8} | {'anterior':>12} | {'compacto':>12} | {'redução':>7}")
+    for total_lojas in args.lojas:
+        compacto = df_atualizacoes(gerar_datas_atualizacao(total_lojas))
+        # Formato anterior: colunas de texto (object) vindas de pd.DataFrame(registros)
+        anterior = compacto.astype(object)
+        anterior, _ = analisar_sincronizacao_apply(anterior, agora)
+        compacto, _ = analisar_sincronizacao(compacto, agora)
+        bytes_anterior = anterior.memory_usage(deep=True).sum()
+        bytes_compacto = compacto.memory_usage(deep=True).sum()
+
+        print(
+            f"{total_lojas:>8} | {bytes_anterior / 1024:>10.0f}KB | "
+            f"{bytes_compacto / 1024:>10.0f}KB | {bytes_anterior / bytes_compacto:>6.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    extracao = subparsers.add_parser(
+        "extracao-dom", help="inner_text por célula x page.evaluate único"
+    )
+    extracao.add_argument("--linhas", type=int, nargs="+", default=[30, 300, 3000])
+    extracao.add_argument("--repeticoes", type=int, default=5)
+    extracao.set_defaults(executar=benchmark_extracao_dom)
+
+    payload = subparsers.add_parser(
+        "payload-lojas", help="iterrows x montagem colunar do payload de lojas_dados"
+    )
+    payload.add_argument("--lojas", type=int, nargs="+", default=[1000, 10000, 100000])
+    payload.add_argument("--repeticoes", type=int, default=3)
+    payload.set_defaults(executar=benchmark_payload_lojas)
+
+    analise = subparsers.add_parser(
+        "analise-sincronizacao",
+        help="apply por linha x análise por colunas (confere os resultados)",
+    )
+    analise.add_argument("--lojas", type=int, nargs="+", default=[1000, 10000, 100000])
+    analise.add_argument("--repeticoes", type=int, default=3)
+    analise.set_defaults(executar=benchmark_analise_sincronizacao)
+
+    memoria = subparsers.add_parser(
+        "memoria-lojas", help="memória do DataFrame de lojas: anterior x compacto"
+    )
+    memoria.add_argument("--lojas", type=int, nargs="+", default=[1000, 10000, 100000])
+    memoria.set_defaults(executar=benchmark_memoria_lojas)
+
+    args = parser.parse_args()
+    args.executar(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ import traceback
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 AUTHORIZED_CHAT_ID = os.getenv("AUTHORIZED_CHAT_ID")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Optional: URL of a running monitor_daemon.py (e.g. http://monitor:8765).
+# When set, /mdonline goes to the daemon's warm browsers instead of GitHub Actions.
+DAEMON_URL = os.getenv("DAEMON_URL")
+DAEMON_TOKEN = os.getenv("DAEMON_TOKEN")
 REPO_OWNER = "RodrigoMD2025"
 REPO_NAME = "store-analytics-dashboard"
 
@@ -44,6 +48,30 @@ def trigger_github_action():
         sys.stderr.flush()
         return error_message
 
+def trigger_daemon():
+    """Queues an on-demand run for all clients on the monitor daemon."""
+    print("INFO: Queueing on-demand run on the monitor daemon...")
+    sys.stdout.flush()
+    headers = {"Authorization": f"Bearer {DAEMON_TOKEN}"} if DAEMON_TOKEN else {}
+
+    try:
+        r = requests.post(f"{DAEMON_URL.rstrip('/')}/executar", headers=headers, json={}, timeout=10)
+        if r.status_code == 202:
+            total = len(r.json().get("enfileirados", []))
+            print(f"INFO: Daemon accepted {total} clients.")
+            sys.stdout.flush()
+            return f"✅ {total} clientes na fila do monitor! O relatório chega em instantes 📊"
+        else:
+            error_message = f"❌ Falha ao enfileirar no daemon. Código: {r.status_code}. Resposta: {r.text}"
+            print(f"ERROR: {error_message}", file=sys.stderr)
+            sys.stderr.flush()
+            return error_message
+    except Exception as e:
+        error_message = f"❌ Exceção ao acionar o daemon: {e}"
+        print(f"ERROR: {error_message}", file=sys.stderr)
+        sys.stderr.flush()
+        return error_message
+
 def send_telegram_message(text):
     """Sends a message back to the admin chat on Telegram."""
     print(f"INFO: Sending message to Telegram: {text}")
@@ -67,7 +95,9 @@ def main():
     sys.stdout.flush()
     
     # Check for required environment variables
-    required_vars = ["TELEGRAM_BOT_TOKEN", "AUTHORIZED_CHAT_ID", "GITHUB_TOKEN"]
+    required_vars = ["TELEGRAM_BOT_TOKEN", "AUTHORIZED_CHAT_ID"]
+    if not DAEMON_URL:
+        required_vars.append("GITHUB_TOKEN")
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     if missing_vars:
         error_msg = f"FATAL: Missing environment variables: {', '.join(missing_vars)}. Exiting."
@@ -116,8 +146,12 @@ def main():
                             sys.stderr.flush()
                             print("INFO: /mdonline command received from authorized user.")
                             sys.stdout.flush()
-                            send_telegram_message("🚀 Solicitando relatório antecipado no GitHub Actions...")
-                            response_message = trigger_github_action()
+                            if DAEMON_URL:
+                                send_telegram_message("🚀 Solicitando relatório antecipado ao monitor...")
+                                response_message = trigger_daemon()
+                            else:
+                                send_telegram_message("🚀 Solicitando relatório antecipado no GitHub Actions...")
+                                response_message = trigger_github_action()
                             send_telegram_message(response_message)
 
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Cache das estatísticas de sincronização lidas do Supabase
+obter_estatisticas_supabase(cliente_nome, dias) agrega as execuções do
+período, que só mudam quando uma execução é finalizada (a cada ~3h por
+cliente). O resultado fica em memória por CACHE_ESTATISTICAS_TTL_S, com
+descarte LRU acima de CACHE_ESTATISTICAS_MAX entradas e, opcionalmente, num
+arquivo SQLite compartilhado entre os processos da máquina (daemon, bot,
+execuções avulsas). Finalizar ou ingerir uma execução invalida as entradas
+do cliente e as agregadas de todos os clientes, inclusive nos outros
+processos que usam o mesmo arquivo.
+
+Uso:
+    cache = obter_cache_estatisticas()
+    inicio = time.time()
+    valor = cache.obter(("Cliente", 30))
+    if valor is None:
+        valor = consultar(...)
+        cache.guardar(("Cliente", 30), valor, calculado_em=inicio)
+    ...
+    invalidar_estatisticas("Cliente")
+"""
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+CACHE_ESTATISTICAS = os.getenv("CACHE_ESTATISTICAS", "true").lower() == "true"
+CACHE_ESTATISTICAS_TTL_S = float(os.getenv("CACHE_ESTATISTICAS_TTL_S", "600"))
+CACHE_ESTATISTICAS_MAX = int(os.getenv("CACHE_ESTATISTICAS_MAX", "256"))
+# Vazio: só em memória, por processo
+CACHE_ESTATISTICAS_ARQUIVO = os.getenv("CACHE_ESTATISTICAS_ARQUIVO", "")
+
+# Invalidação de todos os clientes (finalização sem cliente conhecido)
+TODOS_CLIENTES = "*"
+
+_lock = threading.Lock()
+_cache = None
+
+
+def _codificar(valor):
+    """JSON das estatísticas, com datas marcadas para voltarem como date/datetime"""
+
+    def padrao(objeto):
+        if isinstance(objeto, datetime):
+            return {"__datahora__": objeto.isoformat()}
+        if isinstance(objeto, date):
+            return {"__data__": objeto.isoformat()}
+        if hasattr(objeto, "item"):  # escalares do numpy
+            return objeto.item()
+        raise TypeError(f"{type(objeto).__name__} não serializável")
+
+    return json.dumps(valor, default=padrao, ensure_ascii=False)
+
+
+def _decodificar(conteudo):
+    def objeto(dicionario):
+        if "__datahora__" in dicionario:
+            return datetime.fromisoformat(dicionario["__datahora__"])
+        if "__data__" in dicionario:
+            return date.fromisoformat(dicionario["__data__"])
+        return dicionario
+
+    return json.loads(conteudo, object_hook=objeto)
+
+
+class CacheEstatisticas:
+    """
+    Cache TTL + LRU com chaves (cliente_nome, ...) e, se houver `arquivo`,
+    uma segunda camada em SQLite. Os valores são devolvidos como cópias, para
+    que o chamador possa alterá-los sem afetar o cache. Seguro entre threads.
+    """
+
+    def __init__(
+        self,
+        ttl=CACHE_ESTATISTICAS_TTL_S,
+        maximo=CACHE_ESTATISTICAS_MAX,
+        arquivo=CACHE_ESTATISTICAS_ARQUIVO,
+    ):
+        self.ttl = ttl
+        self.maximo = maximo
+        self.arquivo = arquivo or None
+        self._lock = threading.Lock()
+        # chave -> (expira_em, calculado_em, valor)
+        self._entradas = OrderedDict()
+        # cliente_nome (ou TODOS_CLIENTES) -> instante da última invalidação
+        self._invalidacoes = {}
+        self.contadores = {
+            "acertos": 0,
+            "acertos_disco": 0,
+            "faltas": 0,
+            "expiradas": 0,
+            "descartadas_lru": 0,
+            "invalidacoes": 0,
+        }
+        self._conexao = None
+        if self.arquivo:
+            self._conexao = self._abrir_arquivo()
+
+    def _abrir_arquivo(self):
+        try:
+            diretorio = os.path.dirname(self.arquivo)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            conexao = sqlite3.connect(
+                self.arquivo, check_same_thread=False, isolation_level=None, timeout=5
+            )
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("""
+                CREATE TABLE IF NOT EXISTS estatisticas (
+                    chave TEXT PRIMARY KEY,
+                    cliente_nome TEXT,
+                    expira_em REAL NOT NULL,
+                    calculado_em REAL NOT NULL,
+                    valor TEXT NOT NULL
+                )
+                """)
+            conexao.execute("""
+                CREATE TABLE IF NOT EXISTS invalidacoes (
+                    cliente_nome TEXT PRIMARY KEY,
+                    em REAL NOT NULL
+                )
+                """)
+            return conexao
+        except Exception as e:
+            logging.warning(
+                f"Cache de estatísticas em disco indisponível ({self.arquivo}), "
+                f"usando só a memória: {e}"
+            )
+            return None
+
+    def _ultima_invalidacao(self, cliente_nome):
+        """
+        Última invalidação que afeta as entradas de `cliente_nome` (None são
+        os agregados de todos os clientes, afetados por qualquer cliente),
+        vista por este processo ou registrada no arquivo por outro.
+        """
+        if cliente_nome is None:
+            locais = self._invalidacoes.values()
+        else:
+            locais = [
+                self._invalidacoes.get(cliente_nome, 0),
+                self._invalidacoes.get(TODOS_CLIENTES, 0),
+            ]
+        ultima = max(locais, default=0)
+
+        if self._conexao is not None:
+            try:
+                if cliente_nome is None:
+                    linha = self._conexao.execute(
+                        "SELECT MAX(em) FROM invalidacoes"
+                    ).fetchone()
+                else:
+                    linha = self._conexao.execute(
+                        "SELECT MAX(em) FROM invalidacoes WHERE cliente_nome IN (?, ?)",
+                        (cliente_nome, TODOS_CLIENTES),
+                    ).fetchone()
+                ultima = max(ultima, linha[0] or 0)
+            except sqlite3.Error as e:
+                logging.warning(
+                    f"Erro ao ler invalidações do cache de estatísticas: {e}"
+                )
+        return ultima
+
+    def _ler_arquivo(self, chave_texto, agora):
+        if self._conexao is None:
+            return None
+        try:
+            return self._conexao.execute(
+                "SELECT expira_em, calculado_em, valor FROM estatisticas "
+                "WHERE chave = ? AND expira_em > ?",
+                (chave_texto, agora),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Erro ao ler o cache de estatísticas em disco: {e}")
+            return None
+
+    def _guardar_em_memoria(self, chave, entrada):
+        self._entradas[chave] = entrada
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.maximo:
+            self._entradas.popitem(last=False)
+            self.contadores["descartadas_lru"] += 1
+
+    def obter(self, chave):
+        """Valor em cache para a chave, ou None (ausente, expirado ou invalidado)"""
+        agora = time.time()
+        chave_texto = json.dumps(list(chave), ensure_ascii=False)
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                expira_em, calculado_em, valor = entrada
+                if expira_em <= agora:
+                    del self._entradas[chave]
+                    self.contadores["expiradas"] += 1
+                elif calculado_em < self._ultima_invalidacao(chave[0]):
+                    del self._entradas[chave]
+                else:
+                    self._entradas.move_to_end(chave)
+                    self.contadores["acertos"] += 1
+                    return copy.deepcopy(valor)
+
+            linha = self._ler_arquivo(chave_texto, agora)
+            if linha is not None:
+                expira_em, calculado_em, conteudo = linha
+                valor = _decodificar(conteudo)
+                self._guardar_em_memoria(chave, (expira_em, calculado_em, valor))
+                self.contadores["acertos"] += 1
+                self.contadores["acertos_disco"] += 1
+                return copy.deepcopy(valor)
+
+            self.contadores["faltas"] += 1
+            return None
+
+    def guardar(self, chave, valor, calculado_em=None):
+        """
+        Guarda o valor calculado a partir de uma consulta iniciada em
+        `calculado_em`. Se o cliente foi invalidado depois disso (execução
+        finalizada durante a consulta), o valor já nasce velho e é descartado.
+        """
+        calculado_em = calculado_em or time.time()
+        expira_em = calculado_em + self.ttl
+        chave_texto = json.dumps(list(chave), ensure_ascii=False)
+
+        with self._lock:
+            if calculado_em < self._ultima_invalidacao(chave[0]):
+                return False
+            self._guardar_em_memoria(
+                chave, (expira_em, calculado_em, copy.deepcopy(valor))
+            )
+            if self._conexao is not None:
+                try:
+                    self._conexao.execute(
+                        "DELETE FROM estatisticas WHERE expira_em <= ?", (time.time(),)
+                    )
+                    self._conexao.execute(
+                        "INSERT OR REPLACE INTO estatisticas "
+                        "(chave, cliente_nome, expira_em, calculado_em, valor) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (
+                            chave_texto,
+                            chave[0],
+                            expira_em,
+                            calculado_em,
+                            _codificar(valor),
+                        ),
+                    )
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logging.warning(
+                        f"Erro ao gravar o cache de estatísticas em disco: {e}"
+                    )
+        return True
+
+    def invalidar(self, cliente_nome=None):
+        """
+        Descarta as entradas do cliente e as agregadas de todos os clientes
+        (sem cliente: descarta tudo), aqui e no arquivo compartilhado.
+        """
+        agora = time.time()
+        alvo = cliente_nome or TODOS_CLIENTES
+
+        with self._lock:
+            self._invalidacoes[alvo] = agora
+            for chave in list(self._entradas):
+                if cliente_nome is None or chave[0] in (cliente_nome, None):
+                    del self._entradas[chave]
+            self.contadores["invalidacoes"] += 1
+
+            if self._conexao is not None:
+                try:
+                    self._conexao.execute(
+                        "INSERT OR REPLACE INTO invalidacoes (cliente_nome, em) VALUES (?, ?)",
+                        (alvo, agora),
+                    )
+                    if cliente_nome is None:
+                        self._conexao.execute("DELETE FROM estatisticas")
+                    else:
+                        self._conexao.execute(
+                            "DELETE FROM estatisticas "
+                            "WHERE cliente_nome = ? OR cliente_nome IS NULL",
+                            (cliente_nome,),
+                        )
+                except sqlite3.Error as e:
+                    logging.warning(
+                        f"Erro ao invalidar o cache de estatísticas em disco: {e}"
+                    )
+
+    def estatisticas(self):
+        """Contadores de acertos/faltas e ocupação do cache"""
+        with self._lock:
+            consultas = self.contadores["acertos"] + self.contadores["faltas"]
+            return {
+                **self.contadores,
+                "entradas": len(self._entradas),
+                "taxa_acerto": (
+                    round(self.contadores["acertos"] / consultas * 100, 1)
+                    if consultas
+                    else 0
+                ),
+                "disco": self._conexao is not None,
+            }
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+
+def obter_cache_estatisticas():
+    """
+    Cache do processo, criado na primeira chamada.
+    Devolve None se estiver desativado (CACHE_ESTATISTICAS=false).
+    """
+    global _cache
+
+    if not CACHE_ESTATISTICAS:
+        return None
+    if _cache is not None:
+        return _cache
+
+    with _lock:
+        if _cache is None:
+            _cache = CacheEstatisticas()
+    return _cache
+
+
+def invalidar_estatisticas(cliente_nome=None):
+    """Invalida as estatísticas em cache depois de gravar uma execução do cliente"""
+    cache = obter_cache_estatisticas()
+    if cache is not None:
+        cache.invalidar(cliente_nome)
+
+
+def registrar_estatisticas_cache():
+    """Loga acertos e faltas do cache (chamado no fim dos scripts); None se desativado"""
+    cache = obter_cache_estatisticas()
+    if cache is None:
+        return None
+    estatisticas = cache.estatisticas()
+    if estatisticas["acertos"] or estatisticas["faltas"]:
+        logging.info(
+            f"📊 Cache de estatísticas: {estatisticas['acertos']} acertos "
+            f"({estatisticas['acertos_disco']} do disco), {estatisticas['faltas']} faltas "
+            f"({estatisticas['taxa_acerto']}%), {estatisticas['invalidacoes']} invalidações"
+        )
+    return estatisticas
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Script de Limpeza do Banco de Dados Supabase (Versão Final)
-Executa remoções em lotes para evitar timeout e envia resumo via Telegram.
+Arquiva o histórico que vai expirar, remove por faixa de datas no servidor
+(em lotes, tabelas independentes em paralelo) e envia resumo via Telegram.
 """
 
 import os
@@ -10,10 +11,13 @@ import time
 import json
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
+from supabase_compartilhado import obter_supabase, registrar_estatisticas_conexoes
+from arquivo_historico import exportar_historico
 
 # ======================================
 # 🔧 CONFIGURAÇÕES INICIAIS
@@ -37,7 +41,16 @@ ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
 
 BATCH_SIZE = 500
 SLEEP_SECONDS = 1
+# Remoção no servidor (limpar_retencao, migração 20261017000600): linhas por
+# DELETE e tempo máximo de cada chamada; falhas seguidas antes de desistir
+LIMPEZA_RPC = os.getenv("LIMPEZA_RPC", "true").lower() == "true"
+LIMPEZA_LOTE = int(os.getenv("LIMPEZA_LOTE", "20000"))
+LIMPEZA_SEGUNDOS_POR_CHAMADA = float(os.getenv("LIMPEZA_SEGUNDOS_POR_CHAMADA", "5"))
+LIMPEZA_TENTATIVAS = int(os.getenv("LIMPEZA_TENTATIVAS", "5"))
 FUSO = ZoneInfo("America/Sao_Paulo")
+# Exporta para Parquet (arquivo_historico.py) as linhas que vão expirar
+ARQUIVAR_HISTORICO = os.getenv("ARQUIVAR_HISTORICO", "true").lower() == "true"
+RETENCAO_DIAS = 30
 
 # ======================================
 # 🔌 FUNÇÕES AUXILIARES
@@ -66,65 +79,172 @@ def enviar_mensagem_telegram(mensagem: str):
 
 
 def init_supabase() -> Client:
-    """Inicializa o cliente Supabase"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        logging.error("Variáveis SUPABASE_URL e SUPABASE_KEY não configuradas.")
-        return None
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logging.info("Cliente Supabase inicializado com sucesso.")
-        return supabase
-    except Exception as e:
-        logging.error(f"Erro ao inicializar cliente Supabase: {e}")
-        return None
+    """Cliente Supabase compartilhado pelo processo (um único pool de conexões)"""
+    return obter_supabase()
 
 
-def limpar_em_lotes(supabase, tabela, campo_data, dias, nome_tabela_amigavel):
-    """Executa a limpeza da tabela em lotes"""
-    try:
-        data_limite = datetime.now(FUSO) - timedelta(days=dias)
-        logging.info(f"🧹 Limpando {nome_tabela_amigavel} anteriores a {data_limite.strftime('%d/%m/%Y')}")
-
-        total_removidos = 0
-        while True:
-            try:
-                registros = supabase.table(tabela).select("id").lt(campo_data, data_limite.isoformat()).limit(BATCH_SIZE).execute()
-                if not registros.data:
-                    break
-
-                ids = [r["id"] for r in registros.data]
-                supabase.table(tabela).delete().in_("id", ids).execute()
-                total_removidos += len(ids)
-
-                logging.info(f"🗑️ {len(ids)} removidos (total: {total_removidos}) de {tabela}")
-                time.sleep(SLEEP_SECONDS)
-            except Exception as e:
-                logging.warning(f"⚠️ Erro ao limpar lote de {tabela}: {e}")
-                break
-
-        if total_removidos == 0:
-            logging.info(f"✅ Nenhum registro antigo encontrado em {tabela}.")
-        else:
-            logging.info(f"✅ {total_removidos} registros removidos de {tabela}.")
-        return total_removidos
+def limite_retencao(dias):
+    """
+    Início do dia mais antigo mantido. Corte em dias inteiros: as execuções em
+    modo delta dependem do checkpoint completo gravado no início do mesmo dia
+    """
+    return (datetime.now(FUSO) - timedelta(days=dias)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
 
-    except Exception as e:
-        logging.error(f"❌ Falha ao limpar {tabela}: {e}")
-        return 0
+
+def resultado_limpeza(tabela, removidos, inicio, concluida, erro=None):
+    """Resumo da limpeza de uma tabela, com a vazão em linhas por segundo"""
+    duracao = round(time.time() - inicio, 2)
+    return {
+        "tabela": tabela,
+        "removidos": removidos,
+        "duracao_s": duracao,
+        "linhas_por_s": round(removidos / duracao, 1) if duracao > 0 else 0,
+        "concluida": concluida,
+        "erro": erro,
+    }
 
 
-def gerar_relatorio_limpeza(estatisticas):
+def limpar_em_lotes(supabase, tabela, campo_data, data_limite, nome_tabela_amigavel):
+    """
+    Limpeza pelo cliente (sem a função limpar_retencao): seleciona os ids e
+    remove em lotes. Um lote que falha é repetido, até LIMPEZA_TENTATIVAS
+    falhas seguidas.
+    """
+    inicio = time.time()
+    total_removidos = 0
+    falhas = 0
+    logging.info(f"🧹 Limpando {nome_tabela_amigavel} anteriores a {data_limite.strftime('%d/%m/%Y')} (lotes pelo cliente)")
+
+    while True:
+        try:
+            registros = supabase.table(tabela).select("id").lt(campo_data, data_limite.isoformat()).limit(BATCH_SIZE).execute()
+            if not registros.data:
+                return resultado_limpeza(tabela, total_removidos, inicio, True)
+
+            ids = [r["id"] for r in registros.data]
+            supabase.table(tabela).delete().in_("id", ids).execute()
+            total_removidos += len(ids)
+            falhas = 0
+
+            logging.info(f"🗑️ {len(ids)} removidos (total: {total_removidos}) de {tabela}")
+            time.sleep(SLEEP_SECONDS)
+        except Exception as e:
+            falhas += 1
+            logging.warning(f"⚠️ Erro ao limpar lote de {tabela} ({falhas}/{LIMPEZA_TENTATIVAS}): {e}")
+            if falhas >= LIMPEZA_TENTATIVAS:
+                return resultado_limpeza(tabela, total_removidos, inicio, False, str(e))
+            time.sleep(SLEEP_SECONDS * 2 ** falhas)
+
+
+def limpar_no_servidor(supabase, tabela, campo_data, data_limite, nome_tabela_amigavel):
+    """
+    Remove no servidor as linhas anteriores a data_limite, chamando
+    limpar_retencao até a tabela ficar em dia. Cada chamada confirma o que
+    removeu, então uma falha só refaz a chamada atual: o lote cai pela metade
+    e a limpeza continua de onde parou. Sem a função no banco, usa a limpeza
+    pelo cliente.
+    """
+    if not LIMPEZA_RPC:
+        return limpar_em_lotes(supabase, tabela, campo_data, data_limite, nome_tabela_amigavel)
+
+    inicio = time.time()
+    total_removidos = 0
+    falhas = 0
+    lote = LIMPEZA_LOTE
+    logging.info(f"🧹 Limpando {nome_tabela_amigavel} anteriores a {data_limite.strftime('%d/%m/%Y')} (no servidor)")
+
+    while True:
+        try:
+            resposta = supabase.rpc("limpar_retencao", {
+                "p_tabela": tabela,
+                "p_limite": data_limite.isoformat(),
+                "p_lote": lote,
+                "p_segundos": LIMPEZA_SEGUNDOS_POR_CHAMADA,
+            }).execute()
+        except Exception as e:
+            if getattr(e, "code", None) == "PGRST202":
+                logging.warning("⚠️ Função limpar_retencao ausente no banco. Usando limpeza pelo cliente.")
+                resultado = limpar_em_lotes(supabase, tabela, campo_data, data_limite, nome_tabela_amigavel)
+                resultado["removidos"] += total_removidos
+                return resultado
+
+            falhas += 1
+            lote = max(BATCH_SIZE, lote // 2)
+            logging.warning(f"⚠️ Erro ao limpar {tabela} ({falhas}/{LIMPEZA_TENTATIVAS}), lote reduzido para {lote}: {e}")
+            if falhas >= LIMPEZA_TENTATIVAS:
+                logging.error(f"❌ Limpeza de {tabela} interrompida após {total_removidos} registros; continua na próxima execução.")
+                return resultado_limpeza(tabela, total_removidos, inicio, False, str(e))
+            time.sleep(SLEEP_SECONDS * 2 ** falhas)
+            continue
+
+        falhas = 0
+        total_removidos += resposta.data["removidos"]
+        if resposta.data["concluida"]:
+            break
+        logging.info(f"🗑️ {total_removidos} removidos até agora de {tabela}")
+
+    resultado = resultado_limpeza(tabela, total_removidos, inicio, True)
+    if total_removidos == 0:
+        logging.info(f"✅ Nenhum registro antigo encontrado em {tabela}.")
+    else:
+        logging.info(f"✅ {total_removidos} registros removidos de {tabela} ({resultado['linhas_por_s']} linhas/s).")
+    return resultado
+
+
+def executar_retencao(supabase, grupos):
+    """
+    Executa os grupos de limpeza em paralelo. Cada grupo é uma lista de
+    (chave, tabela, campo_data, data_limite, nome) limpa em ordem: tabelas
+    ligadas por chave estrangeira ficam no mesmo grupo (lojas antes das
+    execuções, para a cascata não ter nada a apagar). Devolve {chave: resultado}.
+    """
+    def limpar_grupo(grupo):
+        return [
+            (chave, limpar_no_servidor(supabase, tabela, campo_data, data_limite, nome))
+            for chave, tabela, campo_data, data_limite, nome in grupo
+        ]
+
+    with ThreadPoolExecutor(max_workers=max(1, len(grupos))) as executor:
+        return {
+            chave: resultado
+            for resultados in executor.map(limpar_grupo, grupos)
+            for chave, resultado in resultados
+        }
+
+
+def arquivar_antes_da_limpeza(supabase, data_limite):
+    """
+    Exporta para Parquet as lojas, execuções e métricas anteriores a data_limite.
+    Devolve {tabela: resultado} ou None se alguma exportação falhar (a limpeza
+    dessas tabelas deve ser adiada, já que as lojas saem em cascata com as
+    execuções).
+    """
+    arquivados = {}
+    for tabela in ("lojas_dados", "execucoes", "metricas_periodicas"):
+        resultado = exportar_historico(supabase, tabela, data_limite)
+        if resultado is None:
+            return None
+        arquivados[tabela] = resultado
+    return arquivados
+
+
+def gerar_relatorio_limpeza(estatisticas, arquivados=None):
     """Gera e salva o relatório da limpeza"""
     try:
+        removidos = {chave: r["removidos"] for chave, r in estatisticas.items()}
         relatorio = {
             "data_limpeza": datetime.now(FUSO).isoformat(),
+            "arquivo_historico": arquivados,
             "resumo": {
-                "total_registros_removidos": sum(estatisticas.values()),
-                "execucoes_removidas": estatisticas.get("execucoes", 0),
-                "lojas_removidas": estatisticas.get("lojas", 0),
-                "metricas_removidas": estatisticas.get("metricas", 0),
-                "logs_removidos": estatisticas.get("logs", 0),
-            }
+                "total_registros_removidos": sum(removidos.values()),
+                "execucoes_removidas": removidos.get("execucoes", 0),
+                "lojas_removidas": removidos.get("lojas", 0),
+                "metricas_removidas": removidos.get("metricas", 0),
+                "logs_removidos": removidos.get("logs", 0),
+            },
+            "tabelas": estatisticas,
         }
 
         with open("relatorio_limpeza_banco.json", "w", encoding="utf-8") as f:
@@ -137,6 +257,13 @@ def gerar_relatorio_limpeza(estatisticas):
         return None
 
 
+def formatar_resultado(resultado):
+    """'1234 (567.8/s)' para o resumo do Telegram"""
+    if not resultado["removidos"]:
+        return "0"
+    return f"{resultado['removidos']} ({resultado['linhas_por_s']}/s)"
+
+
 # ======================================
 # 🧠 FUNÇÃO PRINCIPAL
 # ======================================
@@ -151,15 +278,37 @@ def main():
         sys.exit(1)
 
     houve_falha = False
+    data_limite = limite_retencao(RETENCAO_DIAS)
+
+    # Histórico que vai expirar vai antes para o arquivo Parquet
+    arquivados = None
+    limpar_historico = True
+    if ARQUIVAR_HISTORICO:
+        arquivados = arquivar_antes_da_limpeza(supabase, data_limite)
+        if arquivados is None:
+            limpar_historico = False
+            houve_falha = True
+            logging.error("❌ Arquivamento falhou — limpeza do histórico adiada.")
+
+    grupos = [[("logs", "logs_execucao", "executado_em", limite_retencao(7), "logs do sistema")]]
+    if limpar_historico:
+        grupos += [
+            [
+                ("lojas", "lojas_dados", "data_coleta", data_limite, "dados de lojas"),
+                ("execucoes", "execucoes", "executado_em", data_limite, "execuções"),
+            ],
+            [("metricas", "metricas_periodicas", "data_referencia", data_limite, "métricas")],
+        ]
+    estatisticas = executar_retencao(supabase, grupos)
+    for chave in ("execucoes", "lojas", "metricas"):
+        estatisticas.setdefault(chave, resultado_limpeza(chave, 0, time.time(), False))
+
+    incompletas = [r["tabela"] for r in estatisticas.values() if r["erro"]]
+    if incompletas:
+        houve_falha = True
 
-    estatisticas = {
-        "execucoes": limpar_em_lotes(supabase, "execucoes", "executado_em", 30, "execuções"),
-        "lojas": limpar_em_lotes(supabase, "lojas_dados", "data_coleta", 30, "dados de lojas"),
-        "metricas": limpar_em_lotes(supabase, "metricas_periodicas", "data_referencia", 30, "métricas"),
-        "logs": limpar_em_lotes(supabase, "logs_execucao", "executado_em", 7, "logs do sistema"),
-    }
-
-    relatorio = gerar_relatorio_limpeza(estatisticas)
+    relatorio = gerar_relatorio_limpeza(estatisticas, arquivados)
+    registrar_estatisticas_conexoes()
     duracao = round(time.time() - inicio, 2)
 
     # ------------------------------------------
@@ -167,15 +316,37 @@ def main():
     # ------------------------------------------
     if relatorio:
         total = relatorio["resumo"]["total_registros_removidos"]
+        if not limpar_historico:
+            titulo = "⚠️ *Limpeza de Banco de Dados - Histórico Não Limpo*"
+        elif incompletas:
+            titulo = "⚠️ *Limpeza de Banco de Dados - Concluída Parcialmente*"
+        else:
+            titulo = "🧹 *Limpeza de Banco de Dados - Concluída com Sucesso*"
         mensagem = (
-            f"🧹 *Limpeza de Banco de Dados - Concluída com Sucesso*\n\n"
+            f"{titulo}\n\n"
             f"📅 *Data:* {datetime.now(FUSO).strftime('%d/%m/%Y %H:%M:%S')}\n"
             f"🗑️ *Total removido:* {total} registros\n"
-            f"📊 Execuções: {estatisticas['execucoes']}\n"
-            f"🏪 Lojas: {estatisticas['lojas']}\n"
-            f"📈 Métricas: {estatisticas['metricas']}\n"
-            f"📝 Logs: {estatisticas['logs']}\n"
-            f"⏱️ *Duração:* {duracao} segundos"
+            f"📊 Execuções: {formatar_resultado(estatisticas['execucoes'])}\n"
+            f"🏪 Lojas: {formatar_resultado(estatisticas['lojas'])}\n"
+            f"📈 Métricas: {formatar_resultado(estatisticas['metricas'])}\n"
+            f"📝 Logs: {formatar_resultado(estatisticas['logs'])}\n"
+            + (
+                f"📦 *Arquivado em Parquet:* {sum(r['linhas'] for r in arquivados.values())} linhas "
+                f"({sum(r['bytes'] for r in arquivados.values()) / 1024:.0f} KB)\n"
+                if arquivados
+                else ""
+            )
+            + (
+                "⚠️ *Arquivamento falhou — histórico mantido até a próxima limpeza*\n"
+                if not limpar_historico
+                else ""
+            )
+            + (
+                f"⚠️ *Limpeza incompleta (continua na próxima):* {', '.join(incompletas)}\n"
+                if incompletas
+                else ""
+            )
+            + f"⏱️ *Duração:* {duracao} segundos"
         )
         enviar_mensagem_telegram(mensagem)
         logging.info("🏁 Limpeza concluída e notificada.")
@@ -2,25 +2,45 @@ import hashlib
 import io
 import json
 import logging
+import math
 import os
+import queue
+import re
+import threading
 import time as time_module
-from datetime import datetime, time, timedelta
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urlparse
 
 # =====================================
 # 🔕 Controle de envio diário (1x/dia)
 # =====================================
 from zoneinfo import ZoneInfo
 
+import matplotlib
+
+matplotlib.use("Agg")  # gráficos só são salvos em arquivo (também em threads de worker)
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import requests
+from cryptography.fernet import Fernet, InvalidToken
 from dotenv import load_dotenv
 from openpyxl import Workbook
 from openpyxl.drawing.image import Image as Img
 from openpyxl.styles import Alignment, Font
 from playwright.sync_api import sync_playwright
 
-from supabase import Client, create_client
+from cache_estatisticas import (
+    invalidar_estatisticas,
+    obter_cache_estatisticas,
+    registrar_estatisticas_cache,
+)
+from gravador_lotes import GravadorLotes
+from spool_gravacoes import obter_spool
+from supabase_compartilhado import obter_supabase, registrar_estatisticas_conexoes
 
 
 def deve_enviar_telegram():
@@ -58,13 +78,25 @@ class LoginEstruturaAlterada(Exception):
     pass
 
 
+class EstruturaTabelaInesperada(Exception):
+    """Página de logs obtida por HTTP não tem a tabela esperada (volta ao Playwright)"""
+
+    pass
+
+
+class ExtracaoIncompleta(Exception):
+    """Uma página de logs após a primeira falhou — a listagem lida não está completa"""
+
+    pass
+
+
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
 # Configuração do log
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+    format="%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s",
     handlers=[
         logging.StreamHandler(),
         logging.FileHandler("log_extracao.log", encoding="utf-8"),
@@ -79,22 +111,28 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
 
+# Quantidade de clientes processados em paralelo (1 = sequencial).
+# Cada worker mantém seu próprio navegador, já que a API síncrona do
+# Playwright não pode ser compartilhada entre threads.
+MAX_CLIENTES_PARALELOS = max(1, int(os.getenv("MAX_CLIENTES_PARALELOS", "1")))
 
-def init_supabase():
-    """Inicializa o cliente Supabase"""
-    try:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            logging.error(
-                "Variáveis SUPABASE_URL e SUPABASE_KEY devem estar configuradas"
-            )
-            return None
+# Pipeline entre clientes: enquanto um cliente é gravado no Supabase e tem o
+# relatório gerado, os navegadores já coletam os próximos (ver PipelineClientes).
+# Desligado por padrão: com ele, até PIPELINE_GRAVADORES clientes gravam ao mesmo tempo
+PIPELINE_ETAPAS = os.getenv("PIPELINE_ETAPAS", "false").lower() == "true"
+# Coletas/relatórios aguardando a próxima etapa; com a fila cheia a etapa
+# anterior espera (limita DataFrames em memória)
+PIPELINE_FILA = max(1, int(os.getenv("PIPELINE_FILA", "2")))
+PIPELINE_GRAVADORES = max(1, int(os.getenv("PIPELINE_GRAVADORES", "2")))
+PIPELINE_RELATORIOS = max(1, int(os.getenv("PIPELINE_RELATORIOS", "1")))
 
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logging.info("Cliente Supabase inicializado com sucesso")
-        return supabase
-    except Exception as e:
-        logging.error(f"Erro ao inicializar Supabase: {e}")
-        return None
+# pyplot usa estado global e não é thread-safe
+_matplotlib_lock = threading.Lock()
+
+
+def init_supabase():
+    """Cliente Supabase compartilhado pelo processo (um único pool de conexões)"""
+    return obter_supabase()
 
 
 def criar_tabelas_supabase():
@@ -116,6 +154,7 @@ def criar_tabelas_supabase():
         erro_detalhes TEXT,
         executado_em TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
         origem TEXT DEFAULT 'local', -- local, github_actions
+        estatisticas JSONB, -- métricas de desempenho da coleta (motor, vazão...)
         created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
     );
 
@@ -170,6 +209,16 @@ def gerar_hash_loja(cliente_nome, loja_nome, identificador):
     return hashlib.md5(data.encode("utf-8")).hexdigest()
 
 
+def gerar_hashes_lojas(cliente_nome, lojas, identificadores):
+    """gerar_hash_loja para colunas inteiras (mesmo resultado, sem overhead por linha)"""
+    md5 = hashlib.md5
+    prefixo = f"{cliente_nome}_"
+    return [
+        md5(f"{prefixo}{loja}_{identificador}".encode("utf-8")).hexdigest()
+        for loja, identificador in zip(lojas, identificadores)
+    ]
+
+
 def carregar_base_clientes():
     """Carrega a base de clientes do Supabase"""
     try:
@@ -218,17 +267,22 @@ def carregar_base_clientes_local():
         return []
 
 
-def criar_execucao(supabase, cliente_info):
-    """Cria um registro de execução no Supabase"""
-    try:
-        execucao_data = {
-            "cliente_id": cliente_info.get("id"),
-            "cliente_nome": cliente_info.get("nome"),
-            "status": "processando",
-            "executado_em": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
-            "origem": "github_actions" if os.getenv("GITHUB_ACTIONS") else "local",
-        }
+def criar_execucao(supabase, cliente_info, spool=None):
+    """
+    Cria um registro de execução no Supabase.
+    O id é gerado aqui, então, se o Supabase não responder e houver `spool`,
+    a execução é guardada no spool local e a coleta continua com o mesmo id.
+    """
+    execucao_data = {
+        "id": str(uuid.uuid4()),
+        "cliente_id": cliente_info.get("id"),
+        "cliente_nome": cliente_info.get("nome"),
+        "status": "processando",
+        "executado_em": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
+        "origem": "github_actions" if os.getenv("GITHUB_ACTIONS") else "local",
+    }
 
+    try:
         response = supabase.table("execucoes").insert(execucao_data).execute()
 
         if response.data:
@@ -237,30 +291,55 @@ def criar_execucao(supabase, cliente_info):
             return execucao_id
         else:
             logging.error("Erro ao criar execução")
-            return None
 
     except Exception as e:
         logging.error(f"Erro ao criar execução: {e}")
-        return None
+
+    if spool is not None and spool.guardar(
+        "execucao", execucao_data, execucao_data["id"]
+    ):
+        return execucao_data["id"]
+    return None
+
+
+def dados_finalizacao(resumo, status="sucesso", erro_detalhes="", estatisticas=None):
+    """Campos gravados em `execucoes` ao finalizar uma execução"""
+    update_data = {
+        "total_lojas": resumo.get("total", 0),
+        "lojas_sincronizadas": resumo.get("sincronizadas", 0),
+        "lojas_atrasadas": resumo.get("atrasadas", 0),
+        "percentual_sincronizadas": round(resumo.get("percentual_sincronizadas", 0), 2),
+        "percentual_atrasadas": round(resumo.get("percentual_atrasadas", 0), 2),
+        "status": status,
+        "erro_detalhes": erro_detalhes,
+    }
+    if estatisticas:
+        update_data["estatisticas"] = estatisticas
+    return update_data
 
 
 def finalizar_execucao(
-    supabase, execucao_id, resumo, status="sucesso", erro_detalhes=""
+    supabase,
+    execucao_id,
+    resumo,
+    status="sucesso",
+    erro_detalhes="",
+    estatisticas=None,
+    spool=None,
+    cliente_nome=None,
 ):
-    """Finaliza uma execução com os dados coletados"""
-    try:
-        update_data = {
-            "total_lojas": resumo.get("total", 0),
-            "lojas_sincronizadas": resumo.get("sincronizadas", 0),
-            "lojas_atrasadas": resumo.get("atrasadas", 0),
-            "percentual_sincronizadas": round(
-                resumo.get("percentual_sincronizadas", 0), 2
-            ),
-            "percentual_atrasadas": round(resumo.get("percentual_atrasadas", 0), 2),
-            "status": status,
-            "erro_detalhes": erro_detalhes,
-        }
+    """
+    Finaliza uma execução com os dados coletados.
+    Com `spool`, a finalização que não puder ser gravada agora (ou de uma
+    execução que já tem gravações no spool) fica guardada para reenvio.
+    A gravação invalida as estatísticas em cache do cliente (`cliente_nome`;
+    sem ele, as de todos os clientes).
+    """
+    update_data = dados_finalizacao(resumo, status, erro_detalhes, estatisticas)
+    if spool is not None and spool.tem_pendencias(execucao_id):
+        return spool.guardar("finalizacao", update_data, execucao_id)
 
+    try:
         response = (
             supabase.table("execucoes")
             .update(update_data)
@@ -270,176 +349,693 @@ def finalizar_execucao(
 
         if response.data:
             logging.info(f"Execução {execucao_id} finalizada com status: {status}")
+            invalidar_estatisticas(cliente_nome)
             return True
         else:
             logging.error(f"Erro ao finalizar execução {execucao_id}")
-            return False
 
     except Exception as e:
         logging.error(f"Erro ao finalizar execução {execucao_id}: {e}")
-        return False
+
+    if spool is not None:
+        return spool.guardar("finalizacao", update_data, execucao_id)
+    return False
+
+
+# DataFrame de lojas entre a extração e as gravações (formato compacto):
+#   Loja, Identificador  category
+#   Atualizado em        Int64, segundos desde a época (UTC); texto só até a análise
+#   Atualizado em Texto  category, texto original do site (relatório Excel)
+#   Sincronizada         bool
+#   Tempo Atraso         Int32, segundos até o início do dia (0 se sincronizada)
+# Datas com fuso e textos só são montados nas bordas (payload do Supabase e
+# Excel); datas_lojas converte os segundos de volta em datas.
+
+
+def montar_df_lojas(registros):
+    """DataFrame compacto com as lojas extraídas (listas de registros das páginas)"""
+    colunas = ("Loja", "Identificador", "Atualizado em")
+    df = pd.DataFrame(
+        {coluna: [registro[coluna] for registro in registros] for coluna in colunas}
+    )
+    return df.astype({"Loja": "category", "Identificador": "category"})
+
+
+def inteiros_com_nulos(valores, nulos, dtype):
+    """Array inteiro com nulos (Int64/Int32) a partir de datetime64/timedelta64"""
+    inteiros = valores.view("int64").astype(dtype)
+    inteiros[nulos] = 0
+    return pd.arrays.IntegerArray(inteiros, nulos)
+
+
+def datas_lojas(df):
+    """Coluna "Atualizado em" (segundos) como datas no fuso de São Paulo"""
+    return pd.to_datetime(df["Atualizado em"], unit="s", utc=True).dt.tz_convert(
+        ZoneInfo("America/Sao_Paulo")
+    )
 
 
-def salvar_dados_lojas_supabase(supabase, execucao_id, df, cliente_info):
-    """Salva dados detalhados das lojas no Supabase"""
+def memoria_processo_mb():
+    """
+    RSS atual e pico de RSS (MB) deste processo, sem os navegadores.
+    Vazio fora do Linux.
+    """
+    memoria = {}
     try:
-        if df.empty:
-            logging.info("DataFrame vazio, nada para salvar")
-            return True
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith(("VmRSS:", "VmHWM:")):
+                    chave = "rss_mb" if linha.startswith("VmRSS") else "pico_rss_mb"
+                    memoria[chave] = round(int(linha.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memoria
+
+
+def registrar_memoria(estatisticas, df):
+    """Tamanho do DataFrame de lojas e memória do processo nas estatísticas"""
+    if estatisticas is None:
+        return
+    estatisticas["memoria"] = {
+        "dataframe_kb": round(float(df.memory_usage(deep=True).sum()) / 1024, 1),
+        **memoria_processo_mb(),
+    }
+    logging.info(
+        f"🧠 Memória: DataFrame de lojas com {estatisticas['memoria']['dataframe_kb']} KB"
+        + (
+            f", pico do processo {estatisticas['memoria']['pico_rss_mb']} MB"
+            if "pico_rss_mb" in estatisticas["memoria"]
+            else ""
+        )
+    )
 
-        dados_lojas = []
 
-        for _, row in df.iterrows():
-            # Calcular tempo de atraso em horas
-            tempo_atraso_horas = 0
-            tempo_atraso_dias = 0
+def isoformat_coluna(datas):
+    """
+    Equivalente vetorizado de Timestamp.isoformat() para uma coluna com fuso
+    (precisão de segundos, como as datas da tabela de logs); NaT vira None.
+    """
+    locais = datas.dt.tz_localize(None)
+    textos = np.datetime_as_string(locais.to_numpy(dtype="datetime64[s]"), unit="s")
+    offsets_min = (
+        locais - datas.dt.tz_convert("UTC").dt.tz_localize(None)
+    ).dt.total_seconds() // 60
+    # Poucos offsets distintos (horário de verão): formata cada um uma vez
+    sufixos = {
+        minutos: f"{'-' if minutos < 0 else '+'}{abs(int(minutos)) // 60:02d}:"
+        f"{abs(int(minutos)) % 60:02d}"
+        for minutos in offsets_min.dropna().unique()
+    }
+    return [
+        f"{texto}{sufixos[minutos]}" if minutos == minutos else None
+        for texto, minutos in zip(textos.tolist(), offsets_min.tolist())
+    ]
+
 
-            if row["Tempo Atraso"] != timedelta(0):
-                tempo_atraso_horas = float(
-                    round(row["Tempo Atraso"].total_seconds() / 3600, 2)
-                )
-                tempo_atraso_dias = int(row["Tempo Atraso"].days)
-
-            loja_data = {
-                "execucao_id": execucao_id,
-                "cliente_id": cliente_info.get("id"),
-                "cliente_nome": cliente_info.get("nome"),
-                "loja_nome": row["Loja"],
-                "identificador": row["Identificador"],
-                "atualizado_em": row["Data Atualizacao"].isoformat()
-                if pd.notna(row["Data Atualizacao"])
-                else None,
-                "sincronizada": bool(row["Sincronizada"]),
-                "tempo_atraso_horas": tempo_atraso_horas,
-                "tempo_atraso_dias": tempo_atraso_dias,
-                "hash_loja": gerar_hash_loja(
-                    cliente_info.get("nome"), row["Loja"], row["Identificador"]
-                ),
-                "data_coleta": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
-            }
+def montar_registros_lojas(execucao_id, df, cliente_info):
+    """
+    Monta as linhas de `lojas_dados` a partir do DataFrame analisado.
+    Atrasos, datas e hashes são calculados por coluna e o horário de coleta
+    é um só para a execução inteira.
+    """
+    if df.empty:
+        return []
+
+    cliente_nome = cliente_info.get("nome")
+    segundos = pd.Series(
+        df["Tempo Atraso"].to_numpy(dtype="float64", na_value=np.nan), index=df.index
+    )
+    # Data de atualização ilegível (nulo) vira NULL em vez de NaN
+    horas = (segundos / 3600).round(2)
+    horas = horas.astype(object).where(horas.notna(), None).tolist()
+    dias = (segundos // 86400).astype(object).where(segundos.notna(), None)
+    dias = [None if d is None else int(d) for d in dias.tolist()]
+
+    colunas = {
+        "loja_nome": df["Loja"].tolist(),
+        "identificador": df["Identificador"].tolist(),
+        "atualizado_em": isoformat_coluna(datas_lojas(df)),
+        "sincronizada": df["Sincronizada"].astype(bool).tolist(),
+        "tempo_atraso_horas": horas,
+        "tempo_atraso_dias": dias,
+        "hash_loja": gerar_hashes_lojas(cliente_nome, df["Loja"], df["Identificador"]),
+    }
+    fixos = {
+        "execucao_id": execucao_id,
+        "cliente_id": cliente_info.get("id"),
+        "cliente_nome": cliente_nome,
+        "data_coleta": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
+    }
 
-            dados_lojas.append(loja_data)
+    chaves = list(colunas)
+    return [
+        {**fixos, **dict(zip(chaves, valores))} for valores in zip(*colunas.values())
+    ]
 
-        # Inserir dados em lotes para melhor performance
-        batch_size = 50
-        total_inseridos = 0
 
-        for i in range(0, len(dados_lojas), batch_size):
-            batch = dados_lojas[i : i + batch_size]
+def com_ids(linhas):
+    """
+    Dá a cada linha de lojas_dados um id próprio, para que novas tentativas
+    de um lote e o reenvio pelo spool sejam upserts idempotentes (ver
+    GravadorLotes, `conflito`)
+    """
+    for linha in linhas:
+        linha.setdefault("id", str(uuid.uuid4()))
+    return linhas
 
-            response = supabase.table("lojas_dados").insert(batch).execute()
 
-            if response.data:
-                total_inseridos += len(response.data)
-            else:
-                logging.error(f"Erro ao inserir lote {i // batch_size + 1}")
+def salvar_dados_lojas_supabase(
+    supabase, execucao_id, df, cliente_info, estatisticas=None, spool=None
+):
+    """
+    Salva dados detalhados das lojas no Supabase (lotes adaptativos e paralelos,
+    ver GravadorLotes). Linhas que falharem ficam no spool para reenvio ou,
+    sem ele, são enviadas mais uma vez. Devolve (sucesso, linhas_com_falha)
+    com as que ainda assim não foram gravadas.
+    """
+    try:
+        if df.empty:
+            logging.info("DataFrame vazio, nada para salvar")
+            return True, []
+
+        # Ids definidos aqui: um lote repetido após timeout ou 5xx (que o
+        # servidor pode ter gravado) não duplica as lojas
+        dados_lojas = com_ids(montar_registros_lojas(execucao_id, df, cliente_info))
+        if spool is not None and spool.tem_pendencias(execucao_id):
+            return spool.guardar("lojas", dados_lojas, execucao_id), []
+
+        gravador = GravadorLotes(supabase, "lojas_dados", conflito="id")
+        total_inseridos, falhas = gravador.gravar(dados_lojas)
+        if estatisticas is not None:
+            estatisticas["gravacao_lojas"] = gravador.estatisticas
 
         logging.info(
             f"Total de {total_inseridos} registros de lojas inseridos no Supabase"
         )
-        return True
+        if falhas and spool is not None:
+            if spool.guardar("lojas", falhas, execucao_id):
+                return True, []
+        if falhas:
+            # Ids próprios: repetir as linhas não duplica as que chegaram a gravar
+            logging.warning(
+                f"Tentando gravar de novo {len(falhas)} linhas de lojas com falha"
+            )
+            _, falhas = gravador.gravar(falhas)
+        return not falhas, falhas
 
     except Exception as e:
         logging.error(f"Erro ao salvar dados das lojas no Supabase: {e}")
-        return False
+        return False, []
+
+
+def calcular_atrasos(df):
+    """
+    Tempo médio e maior atraso (horas) das lojas atrasadas, calculados por
+    coluna a partir do DataFrame analisado. Devolve {"medio": h, "maior": h}.
+    """
+    if df.empty:
+        return {"medio": 0.0, "maior": 0.0}
+
+    atraso = df["Tempo Atraso"][~df["Sincronizada"]].dropna()
+    horas = (atraso.astype("int64") / 3600).clip(lower=0)
+    if horas.empty:
+        return {"medio": 0.0, "maior": 0.0}
+    return {
+        "medio": round(float(horas.mean()), 2),
+        "maior": round(float(horas.max()), 2),
+    }
+
+
+def montar_metrica_diaria(cliente_info, resumo, atrasos=None):
+    """
+    Monta a linha de `metricas_periodicas` do dia para o resumo da execução.
+    `atrasos` vem de calcular_atrasos(df).
+    """
+    hoje = datetime.now(ZoneInfo("America/Sao_Paulo")).date()
+    atrasos = atrasos or {}
+
+    return {
+        "cliente_id": cliente_info.get("id"),
+        "cliente_nome": cliente_info.get("nome"),
+        "data_referencia": hoje.isoformat(),
+        "periodo": "diario",
+        "total_lojas": resumo.get("total", 0),
+        "lojas_sincronizadas": resumo.get("sincronizadas", 0),
+        "lojas_atrasadas": resumo.get("atrasadas", 0),
+        "percentual_sincronizadas": round(resumo.get("percentual_sincronizadas", 0), 2),
+        "tempo_medio_atraso_horas": atrasos.get("medio", 0),
+        "maior_atraso_horas": atrasos.get("maior", 0),
+        "execucoes_periodo": 1,
+        "updated_at": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
+    }
+
 
+def gravar_metrica_diaria(supabase, metrica_data):
+    """
+    Grava a linha de métricas do dia com um único upsert atômico
+    (RPC upsert_metrica_periodica, que incrementa execucoes_periodo no servidor).
+    Só sem a função no banco (PGRST202) usa select + update/insert: depois de
+    um timeout ou 5xx a RPC pode já ter gravado, e repetir pelo caminho antigo
+    contaria a execução duas vezes. Erros de gravação são propagados para o
+    chamador (que guarda a métrica no spool).
+    """
+    cliente_nome = metrica_data["cliente_nome"]
 
-def atualizar_metricas_periodicas(supabase, cliente_info, resumo):
-    """Atualiza métricas agregadas por período"""
     try:
-        hoje = datetime.now(ZoneInfo("America/Sao_Paulo")).date()
-        cliente_nome = cliente_info.get("nome")
-
-        # Calcular tempo médio de atraso (seria necessário dados mais detalhados)
-        tempo_medio_atraso = 0  # Simplificado por agora
-        maior_atraso = 0  # Simplificado por agora
-
-        # Dados das métricas diárias
-        metrica_data = {
-            "cliente_id": cliente_info.get("id"),
-            "cliente_nome": cliente_nome,
-            "data_referencia": hoje.isoformat(),
-            "periodo": "diario",
-            "total_lojas": resumo.get("total", 0),
-            "lojas_sincronizadas": resumo.get("sincronizadas", 0),
-            "lojas_atrasadas": resumo.get("atrasadas", 0),
-            "percentual_sincronizadas": round(
-                resumo.get("percentual_sincronizadas", 0), 2
-            ),
-            "tempo_medio_atraso_horas": tempo_medio_atraso,
-            "maior_atraso_horas": maior_atraso,
-            "execucoes_periodo": 1,
-            "updated_at": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
-        }
+        supabase.rpc("upsert_metrica_periodica", {"metrica": metrica_data}).execute()
+        logging.info(f"Métricas periódicas atualizadas para {cliente_nome}")
+        return True
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logging.warning(
+            f"Upsert de métricas indisponível ({e}). Usando select + update/insert."
+        )
+
+    hoje = metrica_data["data_referencia"]
+    metrica_data = dict(metrica_data)
+
+    # Tentar atualizar registro existente ou inserir novo
+    existing = (
+        supabase.table("metricas_periodicas")
+        .select("id, execucoes_periodo")
+        .eq("cliente_nome", cliente_nome)
+        .eq("data_referencia", hoje)
+        .eq("periodo", "diario")
+        .execute()
+    )
+
+    if existing.data:
+        # Atualizar registro existente
+        current_data = existing.data[0]
+        metrica_data["execucoes_periodo"] = current_data.get("execucoes_periodo", 0) + 1
 
-        # Tentar atualizar registro existente ou inserir novo
-        existing = (
+        response = (
             supabase.table("metricas_periodicas")
-            .select("*")
-            .eq("cliente_nome", cliente_nome)
-            .eq("data_referencia", hoje.isoformat())
-            .eq("periodo", "diario")
+            .update(metrica_data)
+            .eq("id", current_data["id"])
             .execute()
         )
+    else:
+        # Inserir novo registro
+        response = supabase.table("metricas_periodicas").insert(metrica_data).execute()
 
-        if existing.data:
-            # Atualizar registro existente
-            current_data = existing.data[0]
-            metrica_data["execucoes_periodo"] = (
-                current_data.get("execucoes_periodo", 0) + 1
-            )
+    if response.data:
+        logging.info(f"Métricas periódicas atualizadas para {cliente_nome}")
+        return True
+    else:
+        logging.error(f"Erro ao atualizar métricas periódicas para {cliente_nome}")
+        return False
 
-            response = (
-                supabase.table("metricas_periodicas")
-                .update(metrica_data)
-                .eq("id", current_data["id"])
-                .execute()
-            )
-        else:
-            # Inserir novo registro
-            response = (
-                supabase.table("metricas_periodicas").insert(metrica_data).execute()
-            )
 
-        if response.data:
-            logging.info(f"Métricas periódicas atualizadas para {cliente_nome}")
-            return True
-        else:
-            logging.error(f"Erro ao atualizar métricas periódicas para {cliente_nome}")
-            return False
+def atualizar_metricas_periodicas(
+    supabase, cliente_info, resumo, atrasos=None, spool=None, execucao_id=None
+):
+    """
+    Atualiza métricas agregadas por período (ver gravar_metrica_diaria).
+    Com `spool`, a métrica que não puder ser gravada (ou de uma execução que
+    já tem gravações no spool) fica guardada para reenvio junto com as
+    gravações da execução, na ordem delas.
+    """
+    # Dados das métricas diárias
+    metrica_data = montar_metrica_diaria(cliente_info, resumo, atrasos)
+    if spool is not None and execucao_id and spool.tem_pendencias(execucao_id):
+        return spool.guardar("metrica", metrica_data, execucao_id)
 
+    try:
+        if gravar_metrica_diaria(supabase, metrica_data):
+            return True
     except Exception as e:
         logging.error(f"Erro ao atualizar métricas periódicas: {e}")
-        return False
 
+    if spool is not None:
+        return spool.guardar("metrica", metrica_data, execucao_id)
+    return False
+
+
+def montar_log_execucao(cliente_nome, status, detalhes="", total_lojas=0):
+    """
+    Monta a linha de `logs_execucao`, com `id_envio` gerado aqui para que o
+    reenvio pelo spool não duplique um log já gravado (ver gravar_log)
+    """
+    return {
+        "id_envio": str(uuid.uuid4()),
+        "cliente_nome": cliente_nome,
+        "status": status,
+        "detalhes": detalhes,
+        "total_lojas": total_lojas,
+        "executado_em": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
+        "origem": "github_actions" if os.getenv("GITHUB_ACTIONS") else "local",
+    }
+
+
+def gravar_log(supabase, log_data):
+    """Grava uma linha de `logs_execucao`; repetir o mesmo `id_envio` não duplica"""
+    supabase.table("logs_execucao").upsert(
+        log_data, on_conflict="id_envio", ignore_duplicates=True
+    ).execute()
 
-def log_execucao(cliente_nome, status, detalhes="", total_lojas=0):
-    """Mantém compatibilidade com logs existentes"""
+
+def log_execucao(cliente_nome, status, detalhes="", total_lojas=0, spool=None):
+    """
+    Mantém compatibilidade com logs existentes.
+    Com `spool`, o log que não puder ser gravado fica guardado para reenvio.
+    """
+    log_data = montar_log_execucao(cliente_nome, status, detalhes, total_lojas)
     try:
         supabase = init_supabase()
         if not supabase:
             return
 
-        log_data = {
-            "cliente_nome": cliente_nome,
-            "status": status,
-            "detalhes": detalhes,
-            "total_lojas": total_lojas,
-            "executado_em": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
-            "origem": "github_actions" if os.getenv("GITHUB_ACTIONS") else "local",
-        }
-
-        response = supabase.table("logs_execucao").insert(log_data).execute()
+        gravar_log(supabase, log_data)
         logging.info(f"Log registrado para {cliente_nome}: {status}")
 
     except Exception as e:
         logging.error(f"Erro ao registrar log no Supabase: {e}")
+        if spool is not None:
+            spool.guardar("log", log_data)
+
+
+# Grava lojas, finalização, métrica diária e log numa única transação no
+# servidor (função ingerir_execucao, ver supabase/migrations)
+INGESTAO_RPC = os.getenv("INGESTAO_RPC", "true").lower() == "true"
+# 'delta' grava em lojas_dados só as lojas que mudaram desde a execução anterior
+# (o servidor volta para 'completo' na primeira execução de cada dia)
+MODO_GRAVACAO_LOJAS = os.getenv("MODO_GRAVACAO_LOJAS", "completo").lower()
+
+
+def execucao_finalizada(supabase, execucao_id):
+    """Indica se a execução já saiu do status 'processando'"""
+    try:
+        response = (
+            supabase.table("execucoes").select("status").eq("id", execucao_id).execute()
+        )
+        return bool(response.data) and response.data[0]["status"] != "processando"
+    except Exception as e:
+        logging.error(f"Erro ao consultar execução {execucao_id}: {e}")
+        return False
+
+
+def supabase_acessivel(supabase):
+    """Consulta mínima para distinguir Supabase fora do ar de erro na gravação"""
+    try:
+        supabase.table("execucoes").select("id").limit(1).execute()
+        return True
+    except Exception:
+        return False
+
+
+def listagem_parcial(estatisticas):
+    """Se a extração não leu a listagem inteira (truncada ou interrompida)"""
+    return bool(
+        estatisticas
+        and (
+            estatisticas.get("extracao_truncada")
+            or estatisticas.get("extracao_incompleta")
+        )
+    )
+
+
+def montar_payload_ingestao(
+    execucao_id,
+    df,
+    resumo,
+    cliente_info,
+    estatisticas=None,
+    detalhes_log="",
+    atrasos=None,
+):
+    """
+    Payload da RPC ingerir_execucao (ver supabase/migrations).
+    Uma listagem truncada ou interrompida não tem todas as lojas: vai completa
+    e marcada como parcial, para que as lojas não lidas não sejam dadas como
+    removidas.
+    """
+    cliente_nome = cliente_info.get("nome")
+    parcial = listagem_parcial(estatisticas)
+    return {
+        "execucao_id": execucao_id,
+        "modo_gravacao": "completo" if parcial else MODO_GRAVACAO_LOJAS,
+        "listagem_parcial": parcial,
+        "execucao": dados_finalizacao(resumo, "sucesso", "", estatisticas),
+        "lojas": montar_registros_lojas(execucao_id, df, cliente_info),
+        "metrica": montar_metrica_diaria(cliente_info, resumo, atrasos),
+        "log": montar_log_execucao(
+            cliente_nome, "sucesso", detalhes_log, resumo["total"]
+        ),
+    }
+
+
+def guardar_ingestao(spool, payload):
+    """Guarda a ingestão inteira no spool (lojas com id, para reenvio idempotente)"""
+    com_ids(payload["lojas"])
+    return spool.guardar("ingestao", payload, payload["execucao_id"])
+
+
+def ingerir_execucao(
+    supabase,
+    execucao_id,
+    df,
+    resumo,
+    cliente_info,
+    estatisticas=None,
+    detalhes_log="",
+    atrasos=None,
+    spool=None,
+):
+    """
+    Grava o resultado de uma execução em um único round trip (RPC ingerir_execucao):
+    lojas, finalização da execução, métrica diária e log, tudo ou nada.
+    Com MODO_GRAVACAO_LOJAS=delta o servidor grava apenas as lojas alteradas.
+    Devolve True se a execução foi gravada (ou guardada no `spool`, quando o
+    Supabase está fora do ar ou a execução já tem gravações pendentes); False
+    indica que o chamador deve usar a gravação em várias chamadas (função
+    ausente, RPC desativada ou erro).
+    """
+    pendente = spool is not None and spool.tem_pendencias(execucao_id)
+    if not INGESTAO_RPC and not pendente:
+        return False
+
+    payload = montar_payload_ingestao(
+        execucao_id, df, resumo, cliente_info, estatisticas, detalhes_log, atrasos
+    )
+    if pendente:
+        return guardar_ingestao(spool, payload)
+
+    try:
+        response = supabase.rpc("ingerir_execucao", {"payload": payload}).execute()
+        resultado = response.data
+        logging.info(
+            f"Execução {execucao_id} gravada em uma chamada "
+            f"({resultado.get('modo_gravacao', 'completo')}): "
+            f"{resultado['lojas_inseridas']} de {resumo['total']} lojas gravadas"
+            + (
+                f", {resultado['lojas_removidas']} removidas"
+                if resultado.get("lojas_removidas")
+                else ""
+            )
+        )
+        invalidar_estatisticas(cliente_info.get("nome"))
+        return True
+    except Exception as e:
+        # A transação é desfeita no servidor; só não refaz se a resposta se perdeu
+        # depois do commit, para não duplicar as lojas
+        if execucao_finalizada(supabase, execucao_id):
+            logging.warning(f"Resposta da ingestão perdida, mas execução gravada: {e}")
+            invalidar_estatisticas(cliente_info.get("nome"))
+            return True
+        if spool is not None and not supabase_acessivel(supabase):
+            logging.warning(f"Supabase indisponível na ingestão: {e}")
+            return guardar_ingestao(spool, payload)
+        logging.warning(
+            f"Ingestão em uma chamada indisponível ({e}). Usando gravação em várias chamadas."
+        )
+        return False
+
+
+# =====================================
+# 💾 Reenvio do spool local
+# =====================================
+
+SPOOL_LOTE_PENDENCIAS = 50
+_reprocessamento_lock = threading.Lock()
+
+
+def gravar_ingestao_em_partes(supabase, payload):
+    """
+    Reenvio de uma ingestão sem a RPC: lojas (upsert por id), métrica, log e,
+    por último, a finalização, que marca a execução como gravada.
+    """
+    execucao_id = payload["execucao_id"]
+    _, falhas = GravadorLotes(supabase, "lojas_dados", conflito="id").gravar(
+        payload["lojas"]
+    )
+    if falhas:
+        raise RuntimeError(f"{len(falhas)} lojas não gravadas")
+    gravar_metrica_diaria(supabase, payload["metrica"])
+    gravar_log(supabase, payload["log"])
+    supabase.table("execucoes").update(payload["execucao"]).eq(
+        "id", execucao_id
+    ).execute()
+
+
+def gravar_pendencia(supabase, pendencia):
+    """Regrava uma pendência do spool; erros são propagados"""
+    tipo = pendencia["tipo"]
+    payload = pendencia["payload"]
+    execucao_id = pendencia["execucao_id"]
+
+    if tipo == "execucao":
+        supabase.table("execucoes").upsert(
+            payload, on_conflict="id", ignore_duplicates=True
+        ).execute()
+    elif tipo == "ingestao":
+        # Idempotente: uma execução já finalizada não é gravada de novo
+        status = (
+            supabase.table("execucoes").select("status").eq("id", execucao_id).execute()
+        )
+        if status.data and status.data[0]["status"] != "processando":
+            return
+        if INGESTAO_RPC:
+            try:
+                supabase.rpc("ingerir_execucao", {"payload": payload}).execute()
+                return
+            except Exception as e:
+                if not supabase_acessivel(supabase):
+                    raise
+                logging.warning(
+                    f"Ingestão em uma chamada indisponível no reenvio ({e}). "
+                    "Usando gravação em várias chamadas."
+                )
+        gravar_ingestao_em_partes(supabase, payload)
+    elif tipo == "lojas":
+        _, falhas = GravadorLotes(supabase, "lojas_dados", conflito="id").gravar(
+            payload
+        )
+        if falhas:
+            raise RuntimeError(f"{len(falhas)} lojas não gravadas")
+    elif tipo == "finalizacao":
+        supabase.table("execucoes").update(payload).eq("id", execucao_id).execute()
+    elif tipo == "metrica":
+        if not gravar_metrica_diaria(supabase, payload):
+            raise RuntimeError("métrica não gravada")
+    elif tipo == "log":
+        gravar_log(supabase, payload)
+    else:
+        raise ValueError(f"Tipo de pendência desconhecido: {tipo}")
+
+
+def reprocessar_spool(supabase=None, spool=None):
+    """
+    Reenvia as pendências do spool local, na ordem em que foram guardadas.
+    Para na primeira falha com o Supabase inacessível (o restante fica para a
+    próxima vez); falhas com o Supabase no ar contam uma tentativa e as
+    pendências seguintes da mesma execução esperam. Devolve as estatísticas
+    do reenvio, ou None se não houver o que fazer.
+    """
+    spool = spool or obter_spool()
+    supabase = supabase or init_supabase()
+    if spool is None or supabase is None:
+        return None
+    if not _reprocessamento_lock.acquire(blocking=False):
+        return None  # outro reenvio em andamento
+
+    try:
+        profundidade = spool.profundidade()
+        if not profundidade["pendencias"]:
+            return None
+        logging.info(
+            f"♻️ Spool local: {profundidade['pendencias']} pendências "
+            f"({profundidade['linhas']} linhas, {profundidade['bytes'] / 1024:.0f} KB, "
+            f"mais antiga há {profundidade['idade_s'] / 60:.0f} min). Reenviando..."
+        )
+
+        inicio = time_module.time()
+        reenviadas = linhas = falhas = 0
+        execucoes_bloqueadas = set()
+        ultimo_id = 0
+        interrompido = False
+
+        while not interrompido:
+            lote = spool.pendentes(SPOOL_LOTE_PENDENCIAS, depois_de=ultimo_id)
+            if not lote:
+                break
+            for pendencia in lote:
+                ultimo_id = pendencia["id"]
+                if pendencia["execucao_id"] in execucoes_bloqueadas:
+                    continue
+                try:
+                    gravar_pendencia(supabase, pendencia)
+                except Exception as e:
+                    if not supabase_acessivel(supabase):
+                        logging.warning(
+                            f"Supabase ainda indisponível ({e}). Reenvio interrompido."
+                        )
+                        interrompido = True
+                        break
+                    logging.error(
+                        f"Falha ao reenviar {pendencia['tipo']} "
+                        f"(pendência {pendencia['id']}): {e}"
+                    )
+                    spool.registrar_falha(pendencia["id"], e)
+                    falhas += 1
+                    if pendencia["execucao_id"]:
+                        execucoes_bloqueadas.add(pendencia["execucao_id"])
+                    continue
+
+                spool.concluir(pendencia["id"])
+                if pendencia["tipo"] in ("finalizacao", "ingestao"):
+                    invalidar_estatisticas()
+                reenviadas += 1
+                linhas += pendencia["linhas"]
+
+        duracao = time_module.time() - inicio
+        estatisticas = {
+            "reenviadas": reenviadas,
+            "linhas": linhas,
+            "falhas": falhas,
+            "duracao_s": round(duracao, 2),
+            "linhas_por_segundo": round(linhas / duracao if duracao else 0, 1),
+            "restantes": spool.profundidade(),
+        }
+        logging.info(
+            f"♻️ Spool local: {reenviadas} pendências reenviadas ({linhas} linhas) "
+            f"em {duracao:.1f}s ({estatisticas['linhas_por_segundo']} linhas/s); "
+            f"{estatisticas['restantes']['pendencias']} restantes"
+        )
+        return estatisticas
+    finally:
+        _reprocessamento_lock.release()
+
+
+def iniciar_reprocessamento_spool():
+    """Reenvia o spool em segundo plano, em paralelo com a coleta"""
+    thread = threading.Thread(target=reprocessar_spool, name="spool", daemon=True)
+    thread.start()
+    return thread
 
 
-def setup_browser(headless: bool = True):
-    """Configura o navegador Playwright"""
+# Timeouts por etapa (ms). As esperas terminam assim que o elemento-alvo
+# aparece; os valores abaixo são apenas o teto de cada etapa.
+TIMEOUTS_MS = {
+    "login_pagina": 30000,
+    "login_submit": 30000,
+    "painel": 30000,
+    "nome_cliente": 5000,
+    "logs_navegacao": 60000,
+    "logs_tabela": 30000,
+}
+
+
+def setup_browser(headless: bool = True, playwright=None):
+    """
+    Configura o navegador Playwright.
+    Se `playwright` for informado, reutiliza a instância (uso em workers);
+    caso contrário inicia uma nova.
+    """
     try:
-        playwright = sync_playwright().start()
+        if playwright is None:
+            playwright = sync_playwright().start()
 
         launch_options = {
             "headless": headless,
@@ -456,172 +1052,1186 @@ def setup_browser(headless: bool = True):
             else [],
         }
 
-        browser = playwright.chromium.launch(**launch_options)
-        logging.info("Navegador configurado com sucesso")
-        return browser
-    except Exception as e:
-        logging.error(f"Erro ao iniciar o browser: {e}")
-        return None
+        browser = playwright.chromium.launch(**launch_options)
+        logging.info("Navegador configurado com sucesso")
+        return browser
+    except Exception as e:
+        logging.error(f"Erro ao iniciar o browser: {e}")
+        return None
+
+
+# =====================================
+# 🚫 Bloqueio de recursos desnecessários
+# =====================================
+
+# Perfis de interceptação de requisições no contexto do navegador.
+# "nenhum" não instala rota (apenas mede); "essencial" descarta tipos de
+# recurso que o scraping nunca lê e qualquer domínio de terceiros.
+PERFIS_BLOQUEIO = {
+    "nenhum": {"tipos": set(), "bloquear_terceiros": False},
+    "essencial": {
+        "tipos": {"image", "stylesheet", "font", "media"},
+        "bloquear_terceiros": True,
+    },
+}
+DOMINIOS_PROPRIOS = ("sistema.musicdelivery.com.br",)
+
+# Trechos de URL que nunca são bloqueados (ex.: algo de que o login dependa)
+RECURSOS_PERMITIDOS = [
+    item.strip()
+    for item in os.getenv("RECURSOS_PERMITIDOS", "").split(",")
+    if item.strip()
+]
+
+
+def configurar_bloqueio_recursos(context, perfil, estatisticas=None):
+    """
+    Instala no contexto o perfil de bloqueio de recursos e os contadores de
+    requisições evitadas e bytes recebidos (gravados em estatisticas).
+    """
+    if perfil not in PERFIS_BLOQUEIO:
+        logging.warning(f"Perfil de bloqueio desconhecido: {perfil}. Usando 'nenhum'")
+        perfil = "nenhum"
+    config = PERFIS_BLOQUEIO[perfil]
+
+    contadores = {
+        "perfil": perfil,
+        "requisicoes_permitidas": 0,
+        "requisicoes_bloqueadas": 0,
+        "bloqueadas_por_tipo": {},
+        "bytes_recebidos": 0,
+    }
+    if estatisticas is not None:
+        estatisticas["bloqueio_recursos"] = contadores
+
+    def deve_bloquear(request):
+        url = request.url
+        if any(trecho in url for trecho in RECURSOS_PERMITIDOS):
+            return False
+        if request.resource_type in config["tipos"]:
+            return True
+        if config["bloquear_terceiros"]:
+            host = urlparse(url).hostname or ""
+            return not any(
+                host == dominio or host.endswith(f".{dominio}")
+                for dominio in DOMINIOS_PROPRIOS
+            )
+        return False
+
+    def interceptar(route, request):
+        if deve_bloquear(request):
+            contadores["requisicoes_bloqueadas"] += 1
+            por_tipo = contadores["bloqueadas_por_tipo"]
+            por_tipo[request.resource_type] = por_tipo.get(request.resource_type, 0) + 1
+            route.abort()
+        else:
+            contadores["requisicoes_permitidas"] += 1
+            route.continue_()
+
+    def contar_bytes(response):
+        tamanho = response.headers.get("content-length")
+        if tamanho and tamanho.isdigit():
+            contadores["bytes_recebidos"] += int(tamanho)
+
+    if config["tipos"] or config["bloquear_terceiros"]:
+        context.route("**/*", interceptar)
+    context.on("response", contar_bytes)
+    return contadores
+
+
+def realizar_login(page, email, senha):
+    """
+    Realiza login no sistema Music Delivery.
+    Lança exceções tipadas para cada tipo de falha:
+      - LoginCredenciaisInvalidas: e-mail/senha incorretos
+      - LoginSiteIndisponivel: site fora do ar ou timeout
+      - LoginEstruturaAlterada: elementos HTML não encontrados (site atualizado)
+    """
+    logging.info(f"Iniciando processo de login para: {email}")
+
+    # ── Etapa 1: Acessar a página de login ──────────────────────────────────
+    try:
+        page.goto(
+            "http://sistema.musicdelivery.com.br/login?login_error",
+            wait_until="domcontentloaded",
+            timeout=TIMEOUTS_MS["login_pagina"],
+        )
+    except Exception as e:
+        raise LoginSiteIndisponivel(
+            f"Não foi possível carregar a página de login (timeout ou site fora do ar): {e}"
+        )
+
+    # ── Etapa 2: Preencher e submeter formulário ─────────────────────────────
+    try:
+        page.wait_for_selector("#login-username", timeout=TIMEOUTS_MS["login_pagina"])
+        page.select_option("select[name='tipo']", "client")
+        page.fill("#login-username", email)
+        page.fill("#login-password", senha)
+        with page.expect_navigation(
+            wait_until="domcontentloaded", timeout=TIMEOUTS_MS["login_submit"]
+        ):
+            page.locator('button[type="submit"]').click()
+    except Exception as e:
+        raise LoginEstruturaAlterada(
+            f"Formulário de login não encontrado ou estrutura do site alterada: {e}"
+        )
+
+    # ── Etapa 3: Verificar resultado do login ────────────────────────────────
+    if "login_error" in page.url:
+        logging.error(f"Credenciais inválidas para {email} — URL retornou login_error")
+        raise LoginCredenciaisInvalidas(f"E-mail ou senha incorretos para {email}")
+
+    # ── Etapa 4: Navegar ao painel do cliente ────────────────────────────────
+    try:
+        page.goto(
+            "http://sistema.musicdelivery.com.br/cliente/",
+            wait_until="domcontentloaded",
+            timeout=TIMEOUTS_MS["painel"],
+        )
+    except Exception as e:
+        raise LoginSiteIndisponivel(
+            f"Login efetuado, mas falha ao carregar o painel do cliente: {e}"
+        )
+
+    # ── Etapa 5: Obter nome do cliente ───────────────────────────────────────
+    try:
+        cliente_nome = (
+            page.locator("div.col-sm-7 h2")
+            .text_content(timeout=TIMEOUTS_MS["nome_cliente"])
+            .strip()
+        )
+    except Exception:
+        cliente_nome = "Cliente não identificado"
+        logging.warning(
+            "Nome do cliente não encontrado após login — prosseguindo assim mesmo"
+        )
+
+    logging.info(f"✅ Login realizado com sucesso para o cliente: {cliente_nome}")
+    return cliente_nome
+
+
+# =====================================
+# 🔐 Cache de sessão (storage_state) por cliente
+# =====================================
+
+# Chave Fernet (base64) para cifrar as sessões em disco; sem chave o cache fica desligado
+SESSAO_CACHE_CHAVE = os.getenv("SESSAO_CACHE_CHAVE")
+SESSAO_CACHE_DIR = os.getenv("SESSAO_CACHE_DIR", ".sessoes")
+
+
+def _cifra_sessao():
+    """Devolve o Fernet do cache de sessão, ou None se o cache estiver desligado"""
+    if not SESSAO_CACHE_CHAVE:
+        return None
+    try:
+        return Fernet(SESSAO_CACHE_CHAVE.encode())
+    except Exception as e:
+        logging.warning(f"SESSAO_CACHE_CHAVE inválida, cache de sessão desligado: {e}")
+        return None
+
+
+def _arquivo_sessao(email, senha):
+    """Caminho do cache do cliente; a senha entra na chave para invalidar ao trocá-la"""
+    chave = hashlib.sha256(f"{email}\0{senha}".encode("utf-8")).hexdigest()
+    return os.path.join(SESSAO_CACHE_DIR, f"{chave}.sessao")
+
+
+def carregar_sessao_cache(email, senha):
+    """Lê o storage_state cifrado do cliente; None se ausente ou ilegível"""
+    cifra = _cifra_sessao()
+    arquivo = _arquivo_sessao(email, senha)
+    if not cifra or not os.path.exists(arquivo):
+        return None
+
+    try:
+        with open(arquivo, "rb") as f:
+            return json.loads(cifra.decrypt(f.read()))
+    except (InvalidToken, ValueError) as e:
+        logging.warning(f"Sessão em cache ilegível para {email}, descartando: {e}")
+        remover_sessao_cache(email, senha)
+        return None
+
+
+def salvar_sessao_cache(email, senha, storage_state):
+    """Grava o storage_state cifrado (escrita atômica, permissão só do dono)"""
+    cifra = _cifra_sessao()
+    if not cifra:
+        return
+
+    try:
+        os.makedirs(SESSAO_CACHE_DIR, exist_ok=True)
+        arquivo = _arquivo_sessao(email, senha)
+        temporario = f"{arquivo}.tmp"
+        descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descritor, "wb") as f:
+            f.write(cifra.encrypt(json.dumps(storage_state).encode("utf-8")))
+        os.replace(temporario, arquivo)
+    except Exception as e:
+        logging.warning(f"Não foi possível salvar a sessão em cache de {email}: {e}")
+
+
+def remover_sessao_cache(email, senha):
+    """Apaga a sessão em cache do cliente"""
+    try:
+        os.remove(_arquivo_sessao(email, senha))
+    except FileNotFoundError:
+        pass
+
+
+def validar_sessao_cache(page):
+    """
+    Abre o painel com a sessão restaurada. Devolve o nome do cliente se a
+    sessão ainda for válida, ou None se o site pedir login novamente.
+    """
+    try:
+        page.goto(
+            "http://sistema.musicdelivery.com.br/cliente/",
+            wait_until="domcontentloaded",
+            timeout=TIMEOUTS_MS["painel"],
+        )
+    except Exception as e:
+        logging.info(f"Falha ao validar sessão em cache: {e}")
+        return None
+
+    if "login" in page.url or page.locator("#login-username").count() > 0:
+        return None
+
+    try:
+        return (
+            page.locator("div.col-sm-7 h2")
+            .text_content(timeout=TIMEOUTS_MS["nome_cliente"])
+            .strip()
+        )
+    except Exception:
+        return "Cliente não identificado"
+
+
+def login_com_cache(page, email, senha, sessao_restaurada, estatisticas=None):
+    """
+    Reaproveita a sessão em cache quando válida; caso contrário faz o login
+    completo (realizar_login, com as mesmas exceções tipadas) e atualiza o cache.
+    """
+    if sessao_restaurada:
+        cliente_nome = validar_sessao_cache(page)
+        if cliente_nome:
+            logging.info(
+                f"♻️ Sessão em cache reutilizada para o cliente: {cliente_nome}"
+            )
+            if estatisticas is not None:
+                estatisticas["sessao"] = "cache"
+            return cliente_nome
+
+        logging.info(f"Sessão em cache expirada para {email}, refazendo login")
+        page.context.clear_cookies()
+        remover_sessao_cache(email, senha)
+
+    cliente_nome = realizar_login(page, email, senha)
+    if estatisticas is not None:
+        estatisticas["sessao"] = (
+            "login_cache_expirado" if sessao_restaurada else "login"
+        )
+    salvar_sessao_cache(email, senha, page.context.storage_state())
+    return cliente_nome
+
+
+def criar_contexto_cliente(browser, cliente_info, estatisticas=None):
+    """
+    Cria o contexto do navegador para o cliente, restaurando a sessão em cache
+    quando existir. Devolve (context, sessao_restaurada).
+    """
+    storage_state = carregar_sessao_cache(
+        cliente_info.get("email"), cliente_info.get("senha")
+    )
+    if storage_state:
+        context = browser.new_context(storage_state=storage_state)
+    else:
+        context = browser.new_context()
+
+    configurar_bloqueio_recursos(
+        context,
+        cliente_info.get("perfil_bloqueio") or os.getenv("PERFIL_BLOQUEIO", "nenhum"),
+        estatisticas,
+    )
+    return context, storage_state is not None
+
+
+LOGS_BASE_URL = "http://sistema.musicdelivery.com.br/logs"
+LINHAS_POR_PAGINA = 30
+# Teto de segurança; se o site tiver mais páginas, a extração é marcada como truncada
+MAX_PAGES_TO_CHECK = int(os.getenv("MAX_PAGINAS_LOGS", "100"))
+
+# Total de registros exibido pelo site (ex.: "Mostrando 1 a 30 de 3.250 registros")
+REGEX_TOTAL_REGISTROS = re.compile(
+    r"\bde\s+(\d{1,3}(?:\.\d{3})+|\d+)\s+(?:registros|resultados|lojas|itens|entradas)\b",
+    re.IGNORECASE,
+)
+# Links da paginação (/logs/<offset>); o maior offset é o da última página
+REGEX_LINK_OFFSET = re.compile(r"href=[\"'][^\"']*/logs/(\d+)/?(?=[\"'?#])")
+
+
+def config_cliente_int(cliente_info, chave, env_var, padrao):
+    """Lê uma configuração inteira do cadastro do cliente (fallback: variável de ambiente)"""
+    valor = (cliente_info or {}).get(chave)
+    if valor in (None, ""):
+        valor = os.getenv(env_var, padrao)
+    try:
+        return max(1, int(valor))
+    except (TypeError, ValueError):
+        logging.warning(f"Valor inválido para {chave}: {valor!r}. Usando {padrao}")
+        return int(padrao)
+
+
+def url_pagina_logs(offset):
+    """Monta a URL da página de logs para um offset"""
+    return f"{LOGS_BASE_URL}/{offset}" if offset > 0 else LOGS_BASE_URL
+
+
+def descobrir_total_paginas(html):
+    """
+    Descobre quantas páginas de logs existem a partir do HTML da primeira página.
+    Devolve (total_paginas, exato): `exato` é True quando vem do contador de
+    registros; pelos links de paginação o total é só um piso (a paginação pode
+    exibir apenas uma janela de páginas). None se não houver indicação.
+    """
+    contagem = REGEX_TOTAL_REGISTROS.search(html or "")
+    if contagem:
+        total_registros = int(contagem.group(1).replace(".", ""))
+        return max(1, math.ceil(total_registros / LINHAS_POR_PAGINA)), True
+
+    offsets = [int(offset) for offset in REGEX_LINK_OFFSET.findall(html or "")]
+    if offsets:
+        return max(offsets) // LINHAS_POR_PAGINA + 1, False
+
+    return None
+
+
+# Pronta quando o DOM já foi lido e a quantidade de linhas da tabela se
+# repete em duas verificações seguidas. Página sem tabela ou com tbody
+# vazio resolve com 0 linhas (fim da paginação) sem esperar timeout.
+JS_TABELA_PRONTA = """
+() => {
+    if (document.readyState === "loading") {
+        return false;
+    }
+    const linhas = document.querySelectorAll("table.table-striped tbody tr").length;
+    const anterior = window.__linhasTabelaLogs;
+    window.__linhasTabelaLogs = linhas;
+    return anterior === linhas ? { linhas } : false;
+}
+"""
+
+
+def aguardar_tabela_pronta(page, numero, inicio_pagina, estatisticas=None):
+    """
+    Aguarda a tabela de logs ficar estável e registra o tempo de espera da página.
+    Devolve a quantidade de linhas encontradas.
+    """
+    inicio_espera = time_module.time()
+    resultado = page.wait_for_function(
+        JS_TABELA_PRONTA, polling=100, timeout=TIMEOUTS_MS["logs_tabela"]
+    ).json_value()
+    fim = time_module.time()
+
+    if estatisticas is not None:
+        estatisticas.setdefault("esperas_paginas", []).append(
+            {
+                "pagina": numero,
+                "navegacao_ms": round((inicio_espera - inicio_pagina) * 1000),
+                "tabela_ms": round((fim - inicio_espera) * 1000),
+            }
+        )
+    return resultado["linhas"]
+
+
+def linhas_para_registros(linhas, page_count):
+    """Converte as linhas da tabela (listas de textos das células) em registros de lojas"""
+    current_page_data = []
+    for cols in linhas:
+        if len(cols) >= 4:
+            current_page_data.append(
+                {
+                    "Loja": cols[1].strip(),
+                    "Identificador": cols[2].strip(),
+                    "Atualizado em": cols[3].strip(),
+                }
+            )
+        else:
+            logging.warning(f"Linha com menos colunas na página {page_count}. Pulando.")
+
+    return current_page_data
+
+
+# Lê a página em uma única chamada ao navegador: impressão digital (hash do
+# texto do tbody) e as 4 primeiras células de cada linha. Se a impressão for
+# igual à da execução anterior, as linhas nem são transferidas. Na primeira
+# página também devolve o HTML do body para descobrir o total de páginas.
+JS_LER_PAGINA_LOGS = """
+({ impressaoAnterior, incluirHtml }) => {
+    const cyrb53 = (texto) => {
+        let h1 = 0xdeadbeef;
+        let h2 = 0x41c6ce57;
+        for (let i = 0; i < texto.length; i++) {
+            const ch = texto.charCodeAt(i);
+            h1 = Math.imul(h1 ^ ch, 2654435761);
+            h2 = Math.imul(h2 ^ ch, 1597334677);
+        }
+        h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507);
+        h1 ^= Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+        h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507);
+        h2 ^= Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+        return 4294967296 * (2097151 & h2) + (h1 >>> 0);
+    };
+
+    const tabela = document.querySelector("table.table-striped") !== null;
+    const tbody = document.querySelector("table.table-striped tbody");
+    const texto = tbody ? tbody.textContent : "";
+    const impressao = `${texto.length}-${cyrb53(texto)}`;
+    const html = incluirHtml && document.body ? document.body.innerHTML : null;
+    if (tabela && impressaoAnterior && impressao === impressaoAnterior) {
+        return { tabela, impressao, html, linhas: null };
+    }
+
+    const linhas = Array.from(
+        document.querySelectorAll("table.table-striped tbody tr"),
+        (tr) => Array.prototype.slice
+            .call(tr.querySelectorAll("td"), 0, 4)
+            .map((td) => td.innerText)
+    );
+    return { tabela, impressao, html, linhas };
+}
+"""
+
+
+def ler_pagina_logs(page, impressao_anterior=None, descobrir_total=False):
+    """
+    Lê a tabela de logs já carregada na aba (um único round trip).
+    Devolve (linhas, impressao, total_paginas); `linhas` é None se a página
+    não mudou e `total_paginas` só é preenchido com `descobrir_total`.
+    Lança EstruturaTabelaInesperada se a aba caiu no login ou não tem a tabela
+    (uma página vazia tem a tabela, só sem linhas).
+    """
+    if "login" in page.url:
+        raise EstruturaTabelaInesperada(
+            f"Sessão não reconhecida pelo site — redirecionado para {page.url}"
+        )
+    resultado = page.evaluate(
+        JS_LER_PAGINA_LOGS,
+        {"impressaoAnterior": impressao_anterior, "incluirHtml": descobrir_total},
+    )
+    if not resultado["tabela"]:
+        raise EstruturaTabelaInesperada(f"Tabela de logs não encontrada em {page.url}")
+    total_paginas = (
+        descobrir_total_paginas(resultado["html"]) if descobrir_total else None
+    )
+    return resultado["linhas"], resultado["impressao"], total_paginas
+
+
+def registrar_throughput(estatisticas, motor, inicio, paginas, lojas):
+    """Registra duração e vazão da extração para comparar os motores"""
+    duracao = time_module.time() - inicio
+    if estatisticas is not None:
+        estatisticas.update(
+            {
+                "motor": motor,
+                "paginas": paginas,
+                "lojas": lojas,
+                "duracao_extracao_s": round(duracao, 2),
+                "lojas_por_segundo": round(lojas / duracao, 1) if duracao else 0,
+            }
+        )
+        esperas = estatisticas.get("esperas_paginas")
+        if esperas:
+            estatisticas["espera_total_s"] = round(
+                sum(e["navegacao_ms"] + e["tabela_ms"] for e in esperas) / 1000, 2
+            )
+    logging.info(
+        f"📈 Motor {motor}: {lojas} lojas em {paginas} páginas, {duracao:.1f}s"
+    )
+
+
+# =====================================
+# 🧩 Cache de páginas (impressões digitais entre execuções)
+# =====================================
+
+CACHE_PAGINAS_ATIVO = os.getenv("CACHE_PAGINAS", "true").lower() == "true"
+CACHE_PAGINAS_DIR = os.getenv("CACHE_PAGINAS_DIR", ".cache_paginas")
+# Para a paginação na primeira página inalterada quando a listagem está em
+# ordem decrescente de "Atualizado em" (conferida numa execução que leu todas
+# as páginas e gravada no cache)
+PARADA_ANTECIPADA = os.getenv("PARADA_ANTECIPADA", "false").lower() == "true"
+FORMATOS_DATA_LOGS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
+
+
+def _data_logs(texto):
+    """Converte o texto de "Atualizado em" em datetime (None se não reconhecido)"""
+    for formato in FORMATOS_DATA_LOGS:
+        try:
+            return datetime.strptime(texto, formato)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class CachePaginasCliente:
+    """
+    Impressões digitais e registros de cada página de logs de um cliente,
+    persistidos entre execuções. Páginas com a mesma impressão reutilizam os
+    registros anteriores. Se a listagem estiver em ordem decrescente de
+    atualização, uma página inalterada indica que as seguintes também estão
+    (uma loja atualizada sobe para o topo e deslocaria todas as páginas), mas
+    lojas removidas ou incluídas abaixo dela também deslocam as seguintes:
+    as páginas restantes só vêm do cache se o contador de registros do site
+    der o mesmo total de páginas da execução anterior e a última página
+    continuar inalterada (ver paginar_logs).
+    A ordem só é conferida de verdade numa execução que leu todas as páginas:
+    o resultado fica no arquivo (`ordenada_completa`) e sem ele, ou com ele
+    falso, a paginação nunca para antes do fim.
+    """
+
+    def __init__(self, cliente_info, motor):
+        self.motor = motor
+        self.ativo = CACHE_PAGINAS_ATIVO and bool(cliente_info)
+        self.anteriores = {}
+        self.atuais = {}
+        self.ordenada = True
+        self.reaproveitadas = 0
+        self.puladas = 0
+        self._ultima_data = None
+        self.arquivo = None
+        self.total_paginas_anterior = None
+        self.total_paginas = None
+        # Ordem conferida na última execução que leu todas as páginas
+        self.ordenada_completa = None
+
+        if self.ativo:
+            chave = hashlib.sha256(
+                f"{cliente_info.get('id')}|{cliente_info.get('email')}".encode("utf-8")
+            ).hexdigest()
+            self.arquivo = os.path.join(CACHE_PAGINAS_DIR, f"{chave}.json")
+            self.anteriores = self._carregar()
+
+    def _carregar(self):
+        try:
+            with open(self.arquivo, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cache de páginas ilegível, ignorando: {e}")
+            return {}
+
+        # Impressões do Playwright e do HTTP são calculadas de formas diferentes
+        if dados.get("motor") != self.motor:
+            return {}
+        self.total_paginas_anterior = dados.get("total_paginas")
+        self.ordenada_completa = dados.get("ordenada_completa")
+        return {int(offset): pagina for offset, pagina in dados["paginas"].items()}
+
+    def impressao_anterior(self, offset):
+        pagina = self.anteriores.get(offset)
+        return pagina["impressao"] if pagina else None
+
+    def registros_anteriores(self, offset):
+        self.reaproveitadas += 1
+        return self.anteriores[offset]["registros"]
+
+    def registrar(self, offset, impressao, registros):
+        """Guarda a página desta execução e confere a ordem decrescente das datas"""
+        self.atuais[offset] = {"impressao": impressao, "registros": registros}
+        for registro in registros:
+            data = _data_logs(registro["Atualizado em"])
+            if data is None or (self._ultima_data and data > self._ultima_data):
+                self.ordenada = False
+                break
+            self._ultima_data = data
+
+    def registrar_total(self, total_paginas, exato):
+        """Total de páginas do site nesta execução (só o exato serve para comparar)"""
+        self.total_paginas = total_paginas if exato else None
+
+    def pode_parar(self, numero):
+        """
+        Se as páginas depois de `numero` (inalterada) podem vir do cache, desde
+        que a última página confira: listagem ordenada (na última leitura
+        completa e nas páginas lidas agora), total exato igual ao da execução
+        anterior e todas as páginas seguintes no cache.
+        """
+        if not (self.ativo and PARADA_ANTECIPADA and self.ordenada):
+            return False
+        if self.ordenada_completa is not True:
+            return False
+        total = self.total_paginas
+        if not total or total != self.total_paginas_anterior:
+            return False
+        if numero >= total or total > MAX_PAGES_TO_CHECK:
+            return False
+        return all(
+            offset_pagina(n) in self.anteriores for n in range(numero + 1, total + 1)
+        )
+
+    def pular_restantes(self, offset):
+        """Registros das páginas seguintes, vindos do cache, sem visitá-las"""
+        restantes = sorted(o for o in self.anteriores if o > offset)
+        for o in restantes:
+            self.atuais[o] = self.anteriores[o]
+        self.puladas += len(restantes)
+        return [self.anteriores[o]["registros"] for o in restantes]
+
+    def salvar(self, completa):
+        """
+        Grava as páginas desta execução. Com `completa` (todas as páginas do
+        site lidas, nenhuma copiada do cache sem visita), a ordem conferida
+        passa a valer para as próximas; senão fica a da última leitura completa.
+        """
+        if not self.ativo:
+            return
+        if completa:
+            self.ordenada_completa = self.ordenada
+        try:
+            os.makedirs(CACHE_PAGINAS_DIR, exist_ok=True)
+            temporario = f"{self.arquivo}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "motor": self.motor,
+                        "total_paginas": self.total_paginas,
+                        "ordenada_completa": self.ordenada_completa,
+                        "paginas": self.atuais,
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(temporario, self.arquivo)
+        except OSError as e:
+            logging.warning(f"Não foi possível salvar o cache de páginas: {e}")
+
+    def registrar_estatisticas(self, estatisticas):
+        if estatisticas is not None and self.ativo:
+            estatisticas["paginas_reaproveitadas"] = self.reaproveitadas
+            estatisticas["paginas_puladas"] = self.puladas
+
+
+# =====================================
+# 📄 Paginação da tabela de logs
+# =====================================
+
+
+def offset_pagina(numero):
+    """Offset da página de logs (numeração a partir de 1)"""
+    return (numero - 1) * LINHAS_POR_PAGINA
+
+
+def extracao_incompleta(estatisticas, numero, lojas_lidas, erro):
+    """Marca a extração interrompida na página `numero` e devolve a exceção a lançar"""
+    logging.error(
+        f"Erro ao visitar {url_pagina_logs(offset_pagina(numero))}: {erro}. "
+        f"Extração interrompida com {lojas_lidas} lojas lidas."
+    )
+    if estatisticas is not None:
+        estatisticas["extracao_incompleta"] = {
+            "pagina": numero,
+            "lojas_lidas": lojas_lidas,
+            "erro": str(erro),
+        }
+    return ExtracaoIncompleta(
+        f"Extração interrompida na página {numero} ({lojas_lidas} lojas lidas): {erro}"
+    )
+
+
+def ultima_pagina_inalterada(buscar_lote, total_paginas):
+    """
+    Relê a última página com a impressão da execução anterior antes de copiar
+    as intermediárias do cache: lojas removidas ou incluídas no meio da
+    listagem deslocam as páginas seguintes até o fim.
+    Devolve (inalterada, pagina): se a página mudou, `pagina` é o resultado
+    lido (linhas, impressao, total), para a paginação não baixá-la de novo.
+    """
+    lote = buscar_lote([total_paginas])
+    try:
+        _, pagina = next(lote)
+    except Exception as e:
+        logging.warning(f"Não foi possível conferir a última página ({e})")
+        return False, None
+    finally:
+        lote.close()
+
+    if pagina[0] is not None:
+        logging.info(
+            f"Última página ({total_paginas}) mudou desde a última execução. "
+            "Seguindo a paginação."
+        )
+        return False, pagina
+    return True, None
+
+
+def buscar_com_pagina_lida(buscar_lote, pagina_lida):
+    """
+    Envolve `buscar_lote` para devolver a página já lida em `pagina_lida`
+    (numero, resultado) sem baixá-la de novo. É a última do site, então vem
+    depois das demais do lote e a ordem de offset se mantém.
+    """
+
+    def buscar(numeros):
+        if pagina_lida[0] not in numeros:
+            yield from buscar_lote(numeros)
+            return
+        restantes = [n for n in numeros if n != pagina_lida[0]]
+        if restantes:
+            yield from buscar_lote(restantes)
+        yield pagina_lida
+
+    return buscar
+
+
+def paginar_logs(
+    buscar_lote, tamanho_lote, motor, estatisticas=None, cache_paginas=None
+):
+    """
+    Loop de paginação comum aos motores. `buscar_lote(numeros)` é um gerador que
+    produz (numero, (linhas, impressao, total_paginas)) em ordem de offset.
+    A primeira página é lida sozinha para descobrir o total de páginas; com ele,
+    os lotes seguintes cobrem exatamente os offsets planejados, sem a visita
+    extra à página vazia do final. Sem o total, segue até a primeira página
+    vazia. Se o site tiver mais que MAX_PAGES_TO_CHECK páginas, a extração é
+    marcada como truncada em `estatisticas["extracao_truncada"]`.
+    Só uma página vazia encerra a listagem: uma página seguinte que falha ou
+    cai no login (sessão expirada) marca `estatisticas["extracao_incompleta"]`
+    e lança ExtracaoIncompleta, sem gravar o cache de páginas.
+    """
+    inicio = time_module.time()
+    cache_paginas = cache_paginas or CachePaginasCliente(None, motor)
+    all_data = []
+    page_count = 1
+    paginas_visitadas = 0
+    limite = MAX_PAGES_TO_CHECK
+    total_paginas = None
+    total_exato = False
+    ultima_pagina_cheia = False
+    fim = False
+    concluida = False
+    truncada = False
+    # A última página é conferida uma vez: se mudou, a paginação vai até o fim
+    # reaproveitando a leitura feita na conferência
+    ultima_conferida = False
+    buscar_pagina = buscar_lote
+
+    while not fim:
+        tamanho = 1 if page_count == 1 else tamanho_lote
+        numeros = list(range(page_count, min(page_count + tamanho, limite + 1)))
+        numero = numeros[0]
+
+        try:
+            for numero, (linhas, impressao, total) in buscar_pagina(numeros):
+                paginas_visitadas += 1
+                offset = offset_pagina(numero)
+
+                if numero == 1 and total:
+                    total_paginas, total_exato = total
+                    cache_paginas.registrar_total(total_paginas, total_exato)
+                    limite = min(total_paginas, MAX_PAGES_TO_CHECK)
+                    logging.info(
+                        f"📑 {'Total' if total_exato else 'Ao menos'} {total_paginas} "
+                        f"páginas de logs — extraindo {limite}"
+                    )
+
+                if linhas is None:
+                    current_page_data = cache_paginas.registros_anteriores(offset)
+                    logging.info(
+                        f"♻️ Página {numero} inalterada desde a última execução"
+                    )
+                else:
+                    current_page_data = linhas_para_registros(linhas, numero)
+
+                if not current_page_data:
+                    logging.info(
+                        f"Nenhum dado válido na página {numero}. Fim da extração."
+                    )
+                    fim = concluida = True
+                    break
+
+                cache_paginas.registrar(offset, impressao, current_page_data)
+                all_data.extend(current_page_data)
+                ultima_pagina_cheia = len(current_page_data) >= LINHAS_POR_PAGINA
+                progresso = f"{numero}/{total_paginas}" if total_paginas else numero
+                logging.info(
+                    f"{len(current_page_data)} lojas extraídas da página {progresso}"
+                )
+
+                pular = False
+                if (
+                    linhas is None
+                    and not ultima_conferida
+                    and cache_paginas.pode_parar(numero)
+                ):
+                    ultima_conferida = True
+                    pular, pagina_lida = ultima_pagina_inalterada(
+                        buscar_lote, total_paginas
+                    )
+                    if pagina_lida is not None:
+                        # Contada como visitada quando a paginação chegar nela
+                        buscar_pagina = buscar_com_pagina_lida(
+                            buscar_lote, (total_paginas, pagina_lida)
+                        )
+                    else:
+                        paginas_visitadas += 1
+
+                if pular:
+                    for registros in cache_paginas.pular_restantes(offset):
+                        all_data.extend(registros)
+                    logging.info(
+                        f"⏩ Listagem inalterada a partir da página {numero}: "
+                        f"{cache_paginas.puladas} páginas seguintes vindas do cache"
+                    )
+                    fim = concluida = True
+                    break
+
+                numero += 1
+        except EstruturaTabelaInesperada as e:
+            if numero == 1:
+                raise
+            raise extracao_incompleta(estatisticas, numero, len(all_data), e) from e
+        except Exception as e:
+            raise extracao_incompleta(estatisticas, numero, len(all_data), e) from e
+
+        if fim:
+            break
+
+        page_count += len(numeros)
+        if page_count <= limite:
+            continue
+
+        if page_count > MAX_PAGES_TO_CHECK:
+            # Sem o total, só dá para saber que há mais páginas se a última estava cheia
+            truncada = (total_paginas or 0) > MAX_PAGES_TO_CHECK or (
+                not total_paginas and ultima_pagina_cheia
+            )
+            fim = concluida = True
+        elif total_exato or not ultima_pagina_cheia:
+            fim = concluida = True
+        else:
+            # Os links de paginação podem mostrar só uma janela: segue sem plano
+            logging.info(
+                f"Última página planejada ({limite}) estava cheia. "
+                "Continuando até a primeira página vazia."
+            )
+            total_paginas = None
+            limite = MAX_PAGES_TO_CHECK
+
+    if truncada:
+        logging.warning(
+            f"⚠️ Extração truncada: limite de {MAX_PAGES_TO_CHECK} páginas "
+            f"({MAX_PAGES_TO_CHECK * LINHAS_POR_PAGINA} lojas) atingido"
+            + (f" de {total_paginas} páginas no site" if total_paginas else "")
+        )
+        if estatisticas is not None:
+            estatisticas["extracao_truncada"] = {
+                "paginas_lidas": MAX_PAGES_TO_CHECK,
+                "total_paginas_site": total_paginas,
+            }
+
+    # Só grava o cache de uma listagem lida até o fim
+    if concluida:
+        cache_paginas.salvar(completa=not truncada and not cache_paginas.puladas)
+    cache_paginas.registrar_estatisticas(estatisticas)
+    if estatisticas is not None and total_paginas:
+        estatisticas["total_paginas_site"] = total_paginas
+
+    df = montar_df_lojas(all_data)
+    registrar_throughput(estatisticas, motor, inicio, paginas_visitadas, len(df))
+    logging.info(f"Extração concluída. Total de {len(df)} lojas coletadas")
+    return df
+
+
+def extrair_tabela(page, paginas_paralelas=1, estatisticas=None, cache_paginas=None):
+    """
+    Extrai dados da tabela de logs com o Playwright.
+    Com `paginas_paralelas` > 1, abre abas extras no mesmo contexto (já logado)
+    e dispara as navegações de cada lote juntas (wait_until="commit") antes de
+    aguardar qualquer uma, de modo que o navegador carrega as páginas em paralelo.
+    """
+    abas = [page] + [page.context.new_page() for _ in range(paginas_paralelas - 1)]
+    wait_until = "commit" if len(abas) > 1 else "domcontentloaded"
+
+    logging.info(
+        f"Iniciando extração de dados da tabela de logs ({len(abas)} abas em paralelo)"
+    )
+
+    def buscar_lote(numeros):
+        navegacoes = []
+        for aba, numero in zip(abas, numeros):
+            url = url_pagina_logs(offset_pagina(numero))
+            logging.info(f"Navegando para URL: {url} (Página {numero})")
+            inicio_pagina = time_module.time()
+            try:
+                aba.goto(
+                    url, wait_until=wait_until, timeout=TIMEOUTS_MS["logs_navegacao"]
+                )
+                navegacoes.append((aba, numero, inicio_pagina, None))
+            except Exception as e:
+                navegacoes.append((aba, numero, inicio_pagina, e))
+
+        for aba, numero, inicio_pagina, erro in navegacoes:
+            if erro:
+                raise erro
+            aguardar_tabela_pronta(aba, numero, inicio_pagina, estatisticas)
+            impressao_anterior = cache_paginas and cache_paginas.impressao_anterior(
+                offset_pagina(numero)
+            )
+            yield numero, ler_pagina_logs(
+                aba, impressao_anterior, descobrir_total=numero == 1
+            )
+
+    try:
+        return paginar_logs(
+            buscar_lote, len(abas), "playwright", estatisticas, cache_paginas
+        )
+    finally:
+        for aba in abas[1:]:
+            try:
+                aba.close()
+            except Exception:
+                pass
+
+
+# =====================================
+# ⚡ Motor HTTP (sem navegador) para as páginas de logs
+# =====================================
+
+
+class ParserTabelaLogs(HTMLParser):
+    """Lê as linhas de `table.table-striped tbody` de uma página de logs"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tabela_encontrada = False
+        self.linhas = []
+        self._profundidade_tabela = 0
+        self._no_tbody = False
+        self._linha_atual = None
+        self._celula_atual = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._profundidade_tabela:
+                self._profundidade_tabela += 1
+            elif not self.tabela_encontrada:
+                classes = (dict(attrs).get("class") or "").split()
+                if "table-striped" in classes:
+                    self.tabela_encontrada = True
+                    self._profundidade_tabela = 1
+            return
+
+        # Só interessa a tabela principal, ignorando tabelas aninhadas
+        if self._profundidade_tabela != 1:
+            return
 
+        if tag == "tbody":
+            self._no_tbody = True
+        elif tag == "tr" and self._no_tbody:
+            self._linha_atual = []
+        elif tag in ("td", "th") and self._linha_atual is not None:
+            self._celula_atual = []
 
-def realizar_login(page, email, senha):
+    def handle_endtag(self, tag):
+        if tag == "table" and self._profundidade_tabela:
+            self._profundidade_tabela -= 1
+            return
+
+        if self._profundidade_tabela != 1:
+            return
+
+        if tag in ("td", "th") and self._celula_atual is not None:
+            if tag == "td":
+                self._linha_atual.append(" ".join("".join(self._celula_atual).split()))
+            self._celula_atual = None
+        elif tag == "tr" and self._linha_atual is not None:
+            self.linhas.append(self._linha_atual)
+            self._linha_atual = None
+        elif tag == "tbody":
+            self._no_tbody = False
+
+    def handle_data(self, data):
+        if self._celula_atual is not None:
+            self._celula_atual.append(data)
+
+
+def criar_sessao_http(page, pool_maxsize=1):
     """
-    Realiza login no sistema Music Delivery.
-    Lança exceções tipadas para cada tipo de falha:
-      - LoginCredenciaisInvalidas: e-mail/senha incorretos
-      - LoginSiteIndisponivel: site fora do ar ou timeout
-      - LoginEstruturaAlterada: elementos HTML não encontrados (site atualizado)
+    Cria uma sessão HTTP com os cookies do contexto Playwright já autenticado,
+    com pool de conexões keep-alive dimensionado para as requisições paralelas.
     """
-    logging.info(f"Iniciando processo de login para: {email}")
-
-    # ── Etapa 1: Acessar a página de login ──────────────────────────────────
-    try:
-        page.goto(
-            "http://sistema.musicdelivery.com.br/login?login_error",
-            wait_until="networkidle",
-            timeout=30000,
-        )
-    except Exception as e:
-        raise LoginSiteIndisponivel(
-            f"Não foi possível carregar a página de login (timeout ou site fora do ar): {e}"
+    sessao = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=max(1, pool_maxsize)
+    )
+    sessao.mount("http://", adapter)
+    sessao.mount("https://", adapter)
+
+    sessao.headers["User-Agent"] = page.evaluate("navigator.userAgent")
+    for cookie in page.context.cookies():
+        sessao.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
         )
+    return sessao
 
-    # ── Etapa 2: Preencher e submeter formulário ─────────────────────────────
-    try:
-        page.select_option("select[name='tipo']", "client")
-        page.fill("#login-username", email)
-        page.fill("#login-password", senha)
-        page.locator('button[type="submit"]').click()
-        page.wait_for_load_state("networkidle")
-    except Exception as e:
-        raise LoginEstruturaAlterada(
-            f"Formulário de login não encontrado ou estrutura do site alterada: {e}"
-        )
 
-    # ── Etapa 3: Verificar resultado do login ────────────────────────────────
-    if "login_error" in page.url:
-        logging.error(f"Credenciais inválidas para {email} — URL retornou login_error")
-        raise LoginCredenciaisInvalidas(f"E-mail ou senha incorretos para {email}")
+def trecho_tabela_logs(html):
+    """Recorta o HTML da tabela de logs (base da impressão digital da página)"""
+    inicio = html.find("table-striped")
+    if inicio < 0:
+        return ""
+    fim = html.find("</table>", inicio)
+    return html[inicio:fim] if fim >= 0 else html[inicio:]
 
-    # ── Etapa 4: Navegar ao painel do cliente ────────────────────────────────
-    try:
-        page.goto(
-            "http://sistema.musicdelivery.com.br/cliente/",
-            wait_until="networkidle",
-            timeout=30000,
-        )
-    except Exception as e:
-        raise LoginSiteIndisponivel(
-            f"Login efetuado, mas falha ao carregar o painel do cliente: {e}"
-        )
 
-    # ── Etapa 5: Obter nome do cliente ───────────────────────────────────────
-    try:
-        cliente_nome = (
-            page.locator("div.col-sm-7 h2").text_content(timeout=5000).strip()
-        )
-    except Exception:
-        cliente_nome = "Cliente não identificado"
-        logging.warning(
-            "Nome do cliente não encontrado após login — prosseguindo assim mesmo"
-        )
+def baixar_linhas_pagina_http(sessao, offset, impressao_anterior=None):
+    """
+    Baixa uma página de logs e devolve (linhas, impressao, total_paginas), onde
+    `linhas` são listas de textos das células, ou None se a tabela não mudou
+    desde a impressão anterior (o parse é pulado). `total_paginas` só é
+    calculado na primeira página (ver descobrir_total_paginas).
+    Lança EstruturaTabelaInesperada se a resposta não tiver o formato esperado.
+    """
+    url = url_pagina_logs(offset)
+    response = sessao.get(url, timeout=(10, 60))
+    response.raise_for_status()
 
-    logging.info(f"✅ Login realizado com sucesso para o cliente: {cliente_nome}")
-    return cliente_nome
+    if "login" in response.url:
+        raise EstruturaTabelaInesperada(
+            f"Sessão não reconhecida pelo site — redirecionado para {response.url}"
+        )
 
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = response.apparent_encoding
 
-def extrair_tabela(page):
-    """Extrai dados da tabela de logs"""
-    base_url = "http://sistema.musicdelivery.com.br/logs"
-    offset = 0
-    all_data = []
-    page_count = 1
-    MAX_PAGES_TO_CHECK = 100
+    total_paginas = descobrir_total_paginas(response.text) if offset == 0 else None
+    trecho = trecho_tabela_logs(response.text)
+    impressao = "http-" + hashlib.md5(trecho.encode("utf-8")).hexdigest()
+    if trecho and impressao == impressao_anterior:
+        return None, impressao, total_paginas
 
-    logging.info("Iniciando extração de dados da tabela de logs")
+    parser = ParserTabelaLogs()
+    parser.feed(response.text)
+    parser.close()
 
-    while True:
-        url_to_visit = f"{base_url}/{offset}" if offset > 0 else base_url
-        logging.info(f"Navegando para URL: {url_to_visit} (Página {page_count})")
+    if not parser.tabela_encontrada:
+        raise EstruturaTabelaInesperada(f"Tabela de logs não encontrada em {url}")
 
-        try:
-            page.goto(url_to_visit, wait_until="networkidle", timeout=60000)
-            time_module.sleep(2)
-            rows = page.locator("table.table-striped tbody tr").all()
+    return parser.linhas, impressao, total_paginas
 
-            if not rows:
-                logging.info(
-                    f"Nenhuma linha de dados encontrada na página {page_count}. Fim da extração."
-                )
-                break
 
-            current_page_data = []
-            for row in rows:
-                cols = row.locator("td").all()
-                if len(cols) >= 4:
-                    loja = cols[1].inner_text().strip()
-                    identificador = cols[2].inner_text().strip()
-                    atualizacao = cols[3].inner_text().strip()
-                    current_page_data.append(
-                        {
-                            "Loja": loja,
-                            "Identificador": identificador,
-                            "Atualizado em": atualizacao,
-                        }
-                    )
-                else:
-                    logging.warning(
-                        f"Linha com menos colunas na página {page_count}. Pulando."
-                    )
+def extrair_tabela_http(
+    page, paginas_paralelas=1, estatisticas=None, cache_paginas=None
+):
+    """
+    Extrai a tabela de logs por HTTP simples, reaproveitando a sessão do login.
+    Usa o mesmo loop de paginação de extrair_tabela (paginar_logs).
+    Se a primeira página não tiver a estrutura esperada, lança
+    EstruturaTabelaInesperada para que o chamador volte ao Playwright.
+    """
+    logging.info(
+        f"Iniciando extração HTTP da tabela de logs ({paginas_paralelas} requisições em paralelo)"
+    )
 
-            if not current_page_data:
-                logging.info(
-                    f"Nenhum dado válido na página {page_count}. Fim da extração."
+    def baixar(numero):
+        offset = offset_pagina(numero)
+        impressao_anterior = cache_paginas and cache_paginas.impressao_anterior(offset)
+        try:
+            return baixar_linhas_pagina_http(sessao, offset, impressao_anterior)
+        except EstruturaTabelaInesperada:
+            raise
+        except Exception as e:
+            if numero == 1:
+                raise EstruturaTabelaInesperada(
+                    f"Falha ao baixar a primeira página por HTTP: {e}"
                 )
-                break
+            raise
 
-            all_data.extend(current_page_data)
-            logging.info(
-                f"{len(current_page_data)} lojas extraídas da página {page_count}"
+    def buscar_lote(numeros):
+        futuros = [executor.submit(baixar, numero) for numero in numeros]
+        try:
+            for numero, futuro in zip(numeros, futuros):
+                yield numero, futuro.result()
+        finally:
+            # Cancela o que sobrou do lote após o fim da extração
+            for futuro in futuros:
+                futuro.cancel()
+
+    with criar_sessao_http(page, paginas_paralelas) as sessao:
+        with ThreadPoolExecutor(max_workers=paginas_paralelas) as executor:
+            return paginar_logs(
+                buscar_lote, paginas_paralelas, "http", estatisticas, cache_paginas
             )
 
-            offset += 30
-            page_count += 1
-
-            if page_count > MAX_PAGES_TO_CHECK:
-                logging.warning(
-                    f"Limite de {MAX_PAGES_TO_CHECK} páginas atingido. Parando extração."
-                )
-                break
 
-        except Exception as e:
-            logging.error(f"Erro ao visitar {url_to_visit}: {e}")
+def converter_datas_atualizacao(textos, fuso):
+    """
+    Converte a coluna "Atualizado em" em datas com fuso, por coluna.
+    Cada texto distinto é convertido uma vez (os formatos de
+    FORMATOS_DATA_LOGS, nessa ordem) e o resultado é espalhado pelas linhas.
+    Horários ambíguos do fim do horário de verão (só em dados antigos) contam
+    como a primeira ocorrência; horários inexistentes avançam para o primeiro
+    válido; textos não reconhecidos viram NaT.
+    """
+    codigos, unicos = pd.factorize(textos)
+    unicos = pd.Series(unicos, dtype=object)
+
+    formato, *alternativos = FORMATOS_DATA_LOGS
+    datas = pd.to_datetime(unicos, format=formato, errors="coerce")
+    for formato in alternativos:
+        faltantes = datas.isna()
+        if not faltantes.any():
             break
+        datas = datas.fillna(
+            pd.to_datetime(unicos.where(faltantes), format=formato, errors="coerce")
+        )
 
-    df = pd.DataFrame(all_data)
-    logging.info(f"Extração concluída. Total de {len(df)} lojas coletadas")
-    return df
+    # Mesma resolução qualquer que seja o formato (ou nenhum) reconhecido
+    datas = (
+        pd.DatetimeIndex(datas)
+        .as_unit("us")
+        .tz_localize(
+            fuso,
+            ambiguous=np.ones(len(datas), dtype=bool),
+            nonexistent="shift_forward",
+        )
+    )
+    return pd.Series(
+        datas.take(codigos, allow_fill=True, fill_value=pd.NaT), index=textos.index
+    )
 
 
-def analisar_sincronizacao(df):
-    """Analisa dados de sincronização das lojas"""
+def analisar_sincronizacao(df, agora=None):
+    """
+    Analisa dados de sincronização das lojas. O texto de "Atualizado em" é
+    substituído pelos segundos desde a época e o atraso fica em segundos
+    (formato compacto, ver montar_df_lojas); o texto original segue em
+    "Atualizado em Texto" para o relatório.
+    """
     tz_sp = ZoneInfo("America/Sao_Paulo")
-    df["Data Atualizacao"] = pd.to_datetime(
-        df["Atualizado em"], dayfirst=True
-    ).dt.tz_localize(tz_sp, ambiguous="NaT", nonexistent="shift_forward")
-
-    now = datetime.now(tz_sp)
-    dt_inicio = datetime.combine(now.date(), time.min).replace(tzinfo=tz_sp)
-    dt_fim = datetime.combine(now.date(), time.max).replace(tzinfo=tz_sp)
-
-    df["Sincronizada"] = df["Data Atualizacao"].between(dt_inicio, dt_fim)
-    df["Tempo Atraso"] = df.apply(
-        lambda row: (
-            dt_inicio - row["Data Atualizacao"]
-            if not row["Sincronizada"]
-            else timedelta(0)
-        ),
-        axis=1,
+    datas = converter_datas_atualizacao(df["Atualizado em"], tz_sp)
+
+    now = agora or datetime.now(tz_sp)
+    dt_inicio = pd.Timestamp(datetime.combine(now.date(), time.min), tz=tz_sp)
+    dt_fim = pd.Timestamp(datetime.combine(now.date(), time.max), tz=tz_sp)
+
+    sincronizada = (datas >= dt_inicio) & (datas <= dt_fim)
+    # Atraso até o início do dia; zero para as sincronizadas, nulo sem data
+    atraso = (dt_inicio - datas).mask(sincronizada, pd.Timedelta(0))
+
+    nulas = datas.isna().to_numpy()
+    df["Atualizado em Texto"] = df["Atualizado em"].astype("category")
+    df["Atualizado em"] = inteiros_com_nulos(
+        datas.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[s]"),
+        nulas,
+        np.int64,
+    )
+    df["Sincronizada"] = sincronizada.to_numpy(dtype=bool)
+    df["Tempo Atraso"] = inteiros_com_nulos(
+        atraso.to_numpy("timedelta64[s]"), nulas, np.int32
     )
 
     total_lojas = int(len(df))
@@ -657,23 +2267,32 @@ def salvar_excel_relatorio(df, resumo, cliente_nome):
         cell.font = Font(bold=True)
         cell.alignment = Alignment(horizontal="center", vertical="center")
 
-    def format_timedelta(td):
-        if td == timedelta(0):
+    def format_atraso(total_seconds):
+        if total_seconds is None or total_seconds == 0:
             return ""
-        total_seconds = int(td.total_seconds())
         dias = total_seconds // 86400
         horas = (total_seconds % 86400) // 3600
         minutos = (total_seconds % 3600) // 60
         return f"{dias}d {horas}h {minutos}m"
 
-    for _, row in df.iterrows():
+    # Texto como veio do site (datas não reconhecidas e sem segundos inclusive)
+    for loja, identificador, atualizado, sincronizada, atraso in zip(
+        df["Loja"].tolist(),
+        df["Identificador"].tolist(),
+        df["Atualizado em Texto"].tolist(),
+        df["Sincronizada"].tolist(),
+        df["Tempo Atraso"]
+        .astype(object)
+        .where(df["Tempo Atraso"].notna(), None)
+        .tolist(),
+    ):
         ws.append(
             [
-                row["Loja"],
-                row["Identificador"],
-                row["Atualizado em"],
-                "Sim" if row["Sincronizada"] else "Não",
-                format_timedelta(row["Tempo Atraso"]),
+                loja,
+                identificador,
+                atualizado,
+                "Sim" if sincronizada else "Não",
+                format_atraso(atraso),
             ]
         )
 
@@ -710,14 +2329,16 @@ def salvar_excel_relatorio(df, resumo, cliente_nome):
         sizes = [resumo["sincronizadas"], resumo["atrasadas"]]
         colors = ["#4CAF50", "#F44336"]
 
-        plt.figure(figsize=(4, 4))
-        plt.pie(sizes, labels=labels, autopct="%1.1f%%", colors=colors, startangle=140)
-        plt.title("Proporção de Lojas Sincronizadas x Atrasadas")
-        plt.tight_layout()
-
         img_bytes = io.BytesIO()
-        plt.savefig(img_bytes, format="png")
-        plt.close()
+        with _matplotlib_lock:
+            plt.figure(figsize=(4, 4))
+            plt.pie(
+                sizes, labels=labels, autopct="%1.1f%%", colors=colors, startangle=140
+            )
+            plt.title("Proporção de Lojas Sincronizadas x Atrasadas")
+            plt.tight_layout()
+            plt.savefig(img_bytes, format="png")
+            plt.close()
         img_bytes.seek(0)
 
         img = Img(img_bytes)
@@ -836,10 +2457,38 @@ def enviar_notificacao_erro(erro_msg, chat_id_to_send, cliente_nome="Sistema"):
         logging.error(f"Erro ao enviar notificação: {e}")
 
 
-def processar_cliente(browser, cliente_info):
-    """Processa um cliente específico com integração Supabase"""
-    context = browser.new_context()
-    page = context.new_page()
+def falhar_coleta(coleta, erro):
+    """Erro inesperado em qualquer etapa: marca a execução do próprio cliente"""
+    cliente_nome = coleta["cliente_nome"]
+    erro_msg = (
+        f"💥 Erro inesperado ao processar *{cliente_nome}*\n"
+        f"Detalhe técnico: {str(erro)}"
+    )
+    logging.critical(f"Erro crítico ao processar {cliente_nome}: {erro}")
+    finalizar_execucao(
+        coleta["supabase"],
+        coleta["execucao_id"],
+        {},
+        "erro_critico",
+        str(erro),
+        estatisticas=coleta["estatisticas"],
+        spool=coleta["spool"],
+        cliente_nome=cliente_nome,
+    )
+    log_execucao(cliente_nome, "erro_critico", str(erro), spool=coleta["spool"])
+    enviar_notificacao_erro(erro_msg, coleta["chat_id"], cliente_nome)
+
+
+def coletar_cliente(browser, cliente_info, manual=False):
+    """
+    Etapa 1 (navegador): login e extração da tabela de logs.
+    Devolve a coleta (dict com o DataFrame bruto e o contexto da execução) para
+    as etapas seguintes, ou False se o cliente falhou aqui (falha já registrada
+    e notificada). O contexto do navegador é fechado ao final da etapa.
+    """
+    manual = manual or execucao_manual()
+    # Métricas de desempenho da coleta, gravadas na execução
+    estatisticas = {}
 
     cliente_nome = cliente_info.get("nome", "Cliente não identificado")
     email = cliente_info.get("email")
@@ -854,16 +2503,37 @@ def processar_cliente(browser, cliente_info):
         logging.error("Falha ao conectar com Supabase - processo abortado")
         return False
 
-    # Criar registro de execução
-    execucao_id = criar_execucao(supabase, cliente_info)
+    # Criar registro de execução (no spool local se o Supabase não responder)
+    spool = obter_spool()
+    execucao_id = criar_execucao(supabase, cliente_info, spool)
     if not execucao_id:
         logging.error(f"Falha ao criar execução para {cliente_nome}")
         return False
 
+    coleta = {
+        "cliente_info": cliente_info,
+        "cliente_nome": cliente_nome,
+        "chat_id": chat_id,
+        "manual": manual,
+        "supabase": supabase,
+        "spool": spool,
+        "execucao_id": execucao_id,
+        "estatisticas": estatisticas,
+    }
+
+    # Contexto criado só depois das verificações acima, dentro do try que o fecha
+    context = None
     try:
+        context, sessao_restaurada = criar_contexto_cliente(
+            browser, cliente_info, estatisticas
+        )
+        page = context.new_page()
+
         # ── Login ─────────────────────────────────────────────────────────────
         try:
-            nome_logado = realizar_login(page, email, senha)
+            nome_logado = login_com_cache(
+                page, email, senha, sessao_restaurada, estatisticas
+            )
         except LoginCredenciaisInvalidas as e:
             erro_msg = (
                 f"🔑 Credenciais inválidas para *{cliente_nome}*\n"
@@ -871,8 +2541,16 @@ def processar_cliente(browser, cliente_info):
                 f"Por favor, verifique os dados de acesso no painel de clientes."
             )
             logging.error(f"Credenciais inválidas: {e}")
-            finalizar_execucao(supabase, execucao_id, {}, "erro_credenciais", str(e))
-            log_execucao(cliente_nome, "erro_credenciais", str(e))
+            finalizar_execucao(
+                supabase,
+                execucao_id,
+                {},
+                "erro_credenciais",
+                str(e),
+                spool=spool,
+                cliente_nome=cliente_nome,
+            )
+            log_execucao(cliente_nome, "erro_credenciais", str(e), spool=spool)
             enviar_notificacao_erro(erro_msg, chat_id, cliente_nome)
             return False
         except LoginSiteIndisponivel as e:
@@ -883,9 +2561,15 @@ def processar_cliente(browser, cliente_info):
             )
             logging.warning(f"Site indisponível: {e}")
             finalizar_execucao(
-                supabase, execucao_id, {}, "erro_site_indisponivel", str(e)
+                supabase,
+                execucao_id,
+                {},
+                "erro_site_indisponivel",
+                str(e),
+                spool=spool,
+                cliente_nome=cliente_nome,
             )
-            log_execucao(cliente_nome, "erro_site_indisponivel", str(e))
+            log_execucao(cliente_nome, "erro_site_indisponivel", str(e), spool=spool)
             enviar_notificacao_erro(erro_msg, chat_id, cliente_nome)
             return False
         except LoginEstruturaAlterada as e:
@@ -895,14 +2579,92 @@ def processar_cliente(browser, cliente_info):
                 f"Intervenção manual necessária — contate o suporte técnico."
             )
             logging.error(f"Estrutura do site alterada: {e}")
-            finalizar_execucao(supabase, execucao_id, {}, "erro_estrutura_site", str(e))
-            log_execucao(cliente_nome, "erro_estrutura_site", str(e))
+            finalizar_execucao(
+                supabase,
+                execucao_id,
+                {},
+                "erro_estrutura_site",
+                str(e),
+                spool=spool,
+                cliente_nome=cliente_nome,
+            )
+            log_execucao(cliente_nome, "erro_estrutura_site", str(e), spool=spool)
             enviar_notificacao_erro(erro_msg, chat_id, cliente_nome)
             return False
 
         # ── Extrair dados ─────────────────────────────────────────────────────
-        df = extrair_tabela(page)
+        paginas_paralelas = config_cliente_int(
+            cliente_info, "paginas_paralelas", "PAGINAS_PARALELAS", 1
+        )
+        motor = (
+            cliente_info.get("motor_extracao")
+            or os.getenv("MOTOR_EXTRACAO", "playwright")
+        ).lower()
+        df = None
+        if motor == "http":
+            try:
+                df = extrair_tabela_http(
+                    page,
+                    paginas_paralelas,
+                    estatisticas,
+                    CachePaginasCliente(cliente_info, "http"),
+                )
+            except EstruturaTabelaInesperada as e:
+                logging.warning(
+                    f"Motor HTTP indisponível para {cliente_nome}: {e}. Usando Playwright."
+                )
+                estatisticas["fallback_playwright"] = str(e)
+        if df is None:
+            df = extrair_tabela(
+                page,
+                paginas_paralelas,
+                estatisticas,
+                CachePaginasCliente(cliente_info, "playwright"),
+            )
+
+        bloqueio = estatisticas["bloqueio_recursos"]
+        logging.info(
+            f"🚫 Perfil '{bloqueio['perfil']}': {bloqueio['requisicoes_bloqueadas']} "
+            f"requisições evitadas, {bloqueio['bytes_recebidos'] / 1024:.0f} KB recebidos"
+        )
+
+        truncada = estatisticas.get("extracao_truncada")
+        if truncada:
+            total_site = truncada["total_paginas_site"]
+            aviso = (
+                f"⚠️ Extração truncada em {truncada['paginas_lidas']} páginas "
+                f"({truncada['paginas_lidas'] * LINHAS_POR_PAGINA} lojas)"
+                + (f" de {total_site} páginas no site" if total_site else "")
+                + ". Aumente MAX_PAGINAS_LOGS para coletar todas as lojas."
+            )
+            enviar_notificacao_erro(aviso, chat_id, cliente_nome)
+
+        coleta["df"] = df
+        coleta["truncada"] = truncada
+        return coleta
+
+    except Exception as e:
+        falhar_coleta(coleta, e)
+        return False
+    finally:
+        if context:
+            context.close()
 
+
+def persistir_coleta(coleta):
+    """
+    Etapa 2: análise de sincronização e gravação no Supabase (ou no spool).
+    Devolve True se a coleta segue para a etapa de relatórios.
+    """
+    cliente_info = coleta["cliente_info"]
+    cliente_nome = coleta["cliente_nome"]
+    supabase = coleta["supabase"]
+    spool = coleta["spool"]
+    execucao_id = coleta["execucao_id"]
+    estatisticas = coleta["estatisticas"]
+    df = coleta["df"]
+
+    try:
         if df.empty:
             logging.info(f"Nenhuma loja encontrada para {cliente_nome}")
             resumo = {
@@ -918,11 +2680,106 @@ def processar_cliente(browser, cliente_info):
                 resumo,
                 "sem_dados",
                 "Nenhuma loja encontrada na tabela de logs",
+                estatisticas=estatisticas,
+                spool=spool,
+                cliente_nome=cliente_nome,
+            )
+            log_execucao(
+                cliente_nome,
+                "sem_dados",
+                "Nenhuma loja encontrada na tabela de logs",
+                spool=spool,
+            )
+            coleta["resumo"] = None
+            return True
+
+        # Análise de sincronização
+        df, resumo = analisar_sincronizacao(df)
+        atrasos = calcular_atrasos(df)
+        registrar_memoria(estatisticas, df)
+        detalhes_log = f"Dados salvos no Supabase - {resumo['total']} lojas" + (
+            " (extração truncada)" if coleta["truncada"] else ""
+        )
+        coleta["df"] = df
+        coleta["resumo"] = resumo
+
+        # Salvar dados no Supabase: uma transação (RPC) ou, como alternativa,
+        # lojas em lotes + finalização + métricas em chamadas separadas
+        ingerido = ingerir_execucao(
+            supabase,
+            execucao_id,
+            df,
+            resumo,
+            cliente_info,
+            estatisticas,
+            detalhes_log,
+            atrasos,
+            spool,
+        )
+        if not ingerido:
+            sucesso_lojas, lojas_com_falha = salvar_dados_lojas_supabase(
+                supabase, execucao_id, df, cliente_info, estatisticas, spool=spool
             )
+            status, erro_detalhes = "sucesso", ""
+            if not sucesso_lojas:
+                # Execução sem todas as lojas gravadas não pode constar como sucesso
+                status = "erro_gravacao_lojas"
+                erro_detalhes = (
+                    f"{len(lojas_com_falha)} de {resumo['total']} lojas não gravadas"
+                    if lojas_com_falha
+                    else "Falha ao gravar as lojas"
+                )
+                detalhes_log = erro_detalhes
+                logging.error(
+                    f"Falha ao salvar dados das lojas para {cliente_nome}: "
+                    f"{erro_detalhes}"
+                )
+
+            # Finalizar execução
+            finalizar_execucao(
+                supabase,
+                execucao_id,
+                resumo,
+                status,
+                erro_detalhes,
+                estatisticas=estatisticas,
+                spool=spool,
+                cliente_nome=cliente_nome,
+            )
+
+            # Atualizar métricas periódicas
+            atualizar_metricas_periodicas(
+                supabase,
+                cliente_info,
+                resumo,
+                atrasos,
+                spool=spool,
+                execucao_id=execucao_id,
+            )
+
+            # Log da execução (já gravado pela ingestão em uma chamada)
             log_execucao(
-                cliente_nome, "sem_dados", "Nenhuma loja encontrada na tabela de logs"
+                cliente_nome, status, detalhes_log, resumo["total"], spool=spool
             )
+        return True
+
+    except Exception as e:
+        falhar_coleta(coleta, e)
+        return False
+
+
+def enviar_relatorios_coleta(coleta):
+    """
+    Etapa 3: relatório Excel e notificações do Telegram.
+    Os dados já estão gravados; uma falha aqui só é registrada e notificada.
+    """
+    cliente_nome = coleta["cliente_nome"]
+    chat_id = coleta["chat_id"]
+    manual = coleta["manual"]
+    resumo = coleta["resumo"]
 
+    try:
+        if resumo is None:
             hora_sp = datetime.now(ZoneInfo("America/Sao_Paulo"))
             mensagem = (
                 f"📭 *Sem dados disponíveis — {cliente_nome}*\n"
@@ -941,53 +2798,29 @@ def processar_cliente(browser, cliente_info):
                 )
             return True
 
-        # Análise de sincronização
-        df, resumo = analisar_sincronizacao(df)
-
-        # Salvar dados no Supabase
-        sucesso_lojas = salvar_dados_lojas_supabase(
-            supabase, execucao_id, df, cliente_info
-        )
-        if not sucesso_lojas:
-            logging.error(f"Falha ao salvar dados das lojas para {cliente_nome}")
-
-        # Finalizar execução
-        finalizar_execucao(supabase, execucao_id, resumo, "sucesso")
-
-        # Atualizar métricas periódicas
-        atualizar_metricas_periodicas(supabase, cliente_info, resumo)
-
         # Gerar relatório Excel (opcional, para compatibilidade)
         arquivo_excel = None
         if os.getenv("GERAR_EXCEL", "true").lower() == "true":
             arquivo_excel, total_lojas = salvar_excel_relatorio(
-                df, resumo, cliente_nome
+                coleta["df"], resumo, cliente_nome
             )
         else:
             total_lojas = resumo["total"]
 
-        # Log de sucesso
-        log_execucao(
-            cliente_nome,
-            "sucesso",
-            f"Dados salvos no Supabase - {total_lojas} lojas",
-            total_lojas,
-        )
-
         # Enviar notificação via Telegram (somente 23h ou manual)
-        if deve_enviar_telegram() or execucao_manual():
+        if deve_enviar_telegram() or manual:
             if arquivo_excel:
                 enviar_arquivo_telegram(
                     arquivo_excel, cliente_nome, total_lojas, chat_id, True
                 )
                 logging.info(
-                    f"🕐 Relatório em Excel enviado ao Telegram ({'execução manual' if execucao_manual() else 'envio diário às 23h'})"
+                    f"🕐 Relatório em Excel enviado ao Telegram ({'execução manual' if manual else 'envio diário às 23h'})"
                 )
             else:
                 # Enviar apenas notificação de sucesso sem arquivo
                 enviar_notificacao_sucesso_supabase(cliente_nome, resumo, chat_id)
                 logging.info(
-                    f"🕐 Notificação de sucesso enviada ao Telegram ({'execução manual' if execucao_manual() else 'envio diário às 23h'})"
+                    f"🕐 Notificação de sucesso enviada ao Telegram ({'execução manual' if manual else 'envio diário às 23h'})"
                 )
 
             # Remover arquivo após envio (no GitHub Actions)
@@ -1008,18 +2841,28 @@ def processar_cliente(browser, cliente_info):
         return True
 
     except Exception as e:
-        erro_msg = (
-            f"💥 Erro inesperado ao processar *{cliente_nome}*\n"
-            f"Detalhe técnico: {str(e)}"
+        logging.error(f"Erro ao gerar/enviar relatórios de {cliente_nome}: {e}")
+        enviar_notificacao_erro(
+            f"⚠️ Dados de *{cliente_nome}* gravados, mas o relatório falhou\n"
+            f"Detalhe técnico: {str(e)}",
+            chat_id,
+            cliente_nome,
         )
-        logging.critical(f"Erro crítico ao processar {cliente_nome}: {e}")
-        finalizar_execucao(supabase, execucao_id, {}, "erro_critico", str(e))
-        log_execucao(cliente_nome, "erro_critico", str(e))
-        enviar_notificacao_erro(erro_msg, chat_id, cliente_nome)
         return False
-    finally:
-        if context:
-            context.close()
+
+
+def processar_cliente(browser, cliente_info, manual=False):
+    """
+    Processa um cliente específico com integração Supabase, executando em
+    sequência as etapas de coleta, gravação e relatórios.
+    `manual` marca pedidos sob demanda (ex.: daemon), que enviam o relatório na hora.
+    """
+    coleta = coletar_cliente(browser, cliente_info, manual)
+    if not coleta:
+        return False
+    if not persistir_coleta(coleta):
+        return False
+    return enviar_relatorios_coleta(coleta)
 
 
 def enviar_notificacao_sucesso_supabase(cliente_nome, resumo, chat_id):
@@ -1057,7 +2900,31 @@ def enviar_notificacao_sucesso_supabase(cliente_nome, resumo, chat_id):
 
 
 def obter_estatisticas_supabase(cliente_nome=None, dias=30):
-    """Função para obter estatísticas dos dados no Supabase (para uso em dashboards)"""
+    """
+    Função para obter estatísticas dos dados no Supabase (para uso em dashboards).
+    O resultado fica em cache (cache_estatisticas) até expirar ou até uma
+    execução do cliente ser finalizada.
+    """
+    cache = obter_cache_estatisticas()
+    chave = (cliente_nome, dias)
+    if cache is not None:
+        estatisticas = cache.obter(chave)
+        if estatisticas is not None:
+            return estatisticas
+
+    inicio = time_module.time()
+    estatisticas = consultar_estatisticas_supabase(cliente_nome, dias)
+    if cache is not None and estatisticas is not None:
+        cache.guardar(chave, estatisticas, calculado_em=inicio)
+    return estatisticas
+
+
+def consultar_estatisticas_supabase(cliente_nome=None, dias=30):
+    """
+    Estatísticas diárias de sincronização, sem cache.
+    Os agregados por dia (São Paulo) vêm prontos da função sincronizacao_diaria;
+    sem ela no banco, baixa as execuções do período e agrupa aqui.
+    """
     try:
         supabase = init_supabase()
         if not supabase:
@@ -1066,10 +2933,43 @@ def obter_estatisticas_supabase(cliente_nome=None, dias=30):
         # Data de referência
         data_limite = datetime.now(ZoneInfo("America/Sao_Paulo")) - timedelta(days=dias)
 
+        try:
+            response = supabase.rpc(
+                "sincronizacao_diaria",
+                {
+                    "p_desde": data_limite.isoformat(),
+                    "p_cliente_nome": cliente_nome,
+                    "p_por_cliente": False,
+                },
+            ).execute()
+            return [
+                {
+                    "executado_em": date.fromisoformat(dia["dia"]),
+                    "total_lojas": dia["total_lojas"],
+                    "lojas_sincronizadas": dia["lojas_sincronizadas"],
+                    "lojas_atrasadas": dia["lojas_atrasadas"],
+                    "percentual_sincronizadas": (
+                        float(dia["percentual_sincronizadas"])
+                        if dia["percentual_sincronizadas"] is not None
+                        else None
+                    ),
+                }
+                for dia in response.data
+            ]
+        except Exception as e:
+            if getattr(e, "code", None) != "PGRST202":
+                raise
+            logging.warning(
+                f"Função sincronizacao_diaria ausente no banco ({e}). "
+                "Agrupando as execuções no cliente."
+            )
+
         # Query base
         query = (
             supabase.table("execucoes")
-            .select("*")
+            .select(
+                "executado_em,total_lojas,lojas_sincronizadas,lojas_atrasadas,percentual_sincronizadas"
+            )
             .gte("executado_em", data_limite.isoformat())
         )
 
@@ -1082,7 +2982,9 @@ def obter_estatisticas_supabase(cliente_nome=None, dias=30):
             df = pd.DataFrame(response.data)
 
             # Processar dados para o dashboard
-            df["executado_em"] = pd.to_datetime(df["executado_em"])
+            df["executado_em"] = pd.to_datetime(
+                df["executado_em"], format="ISO8601"
+            ).dt.tz_convert("America/Sao_Paulo")
             df_agrupado = (
                 df.groupby(df["executado_em"].dt.date)
                 .agg(
@@ -1103,12 +3005,244 @@ def obter_estatisticas_supabase(cliente_nome=None, dias=30):
         return None
 
 
+def worker_clientes(fila_clientes, resultados, headless):
+    """
+    Worker do pool de processamento: mantém um navegador próprio e consome
+    clientes da fila até esvaziá-la. Falhas de um cliente não afetam os demais.
+    """
+    with sync_playwright() as playwright:
+        browser = None
+        try:
+            while True:
+                try:
+                    cliente = fila_clientes.get_nowait()
+                except queue.Empty:
+                    break
+
+                cliente_nome = cliente.get("nome", "Cliente não identificado")
+                sucesso = False
+                try:
+                    # Relança o navegador caso tenha caído no cliente anterior
+                    if browser is None or not browser.is_connected():
+                        browser = setup_browser(
+                            headless=headless, playwright=playwright
+                        )
+                    if browser:
+                        sucesso = processar_cliente(browser, cliente)
+                    else:
+                        logging.error(
+                            f"Navegador indisponível — cliente {cliente_nome} não processado"
+                        )
+                except Exception as e:
+                    logging.critical(
+                        f"Erro não tratado no worker para {cliente_nome}: {e}"
+                    )
+                finally:
+                    resultados.append((cliente_nome, sucesso))
+                    fila_clientes.task_done()
+        finally:
+            if browser:
+                browser.close()
+                logging.info("Navegador do worker fechado")
+
+
+def processar_clientes_em_paralelo(clientes, max_paralelos, headless):
+    """Processa os clientes com um pool limitado de workers, cada um com seu navegador"""
+    fila_clientes = queue.Queue()
+    for cliente in clientes:
+        fila_clientes.put(cliente)
+
+    resultados = []
+    total_workers = min(max_paralelos, len(clientes))
+    logging.info(
+        f"Processando {len(clientes)} clientes com {total_workers} workers em paralelo"
+    )
+
+    workers = [
+        threading.Thread(
+            target=worker_clientes,
+            args=(fila_clientes, resultados, headless),
+            name=f"worker-{i + 1}",
+        )
+        for i in range(total_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return resultados
+
+
+class PipelineClientes:
+    """
+    Processa os clientes em três etapas encadeadas por filas limitadas:
+    coleta (um navegador por worker) → análise e gravação → relatórios e
+    Telegram. Cada etapa tem seus próprios workers, então o tempo total tende
+    ao da etapa mais lenta em vez da soma das etapas. Com uma fila cheia, a
+    etapa anterior espera (backpressure). Cada coleta leva o próprio cliente
+    e execução, e as falhas ficam registradas no cliente em que ocorreram.
+    """
+
+    def __init__(
+        self,
+        clientes,
+        coletores,
+        headless,
+        gravadores=PIPELINE_GRAVADORES,
+        relatores=PIPELINE_RELATORIOS,
+        tamanho_fila=PIPELINE_FILA,
+    ):
+        self.headless = headless
+        self.total_coletores = min(coletores, len(clientes))
+        self.total_gravadores = gravadores
+        self.total_relatores = relatores
+        self.fila_clientes = queue.Queue()
+        for cliente in clientes:
+            self.fila_clientes.put(cliente)
+        self.fila_gravacao = queue.Queue(maxsize=tamanho_fila)
+        self.fila_relatorios = queue.Queue(maxsize=tamanho_fila)
+        self.resultados = []
+        self.tempos = {"coleta": 0.0, "gravacao": 0.0, "relatorios": 0.0}
+        self._lock = threading.Lock()
+
+    def _executar_etapa(self, etapa, cliente_nome, funcao, *args):
+        """Executa uma etapa medindo o tempo; erros não tratados falham só o cliente"""
+        inicio = time_module.time()
+        try:
+            return funcao(*args)
+        except Exception as e:
+            logging.critical(
+                f"Erro não tratado na etapa de {etapa} para {cliente_nome}: {e}"
+            )
+            return False
+        finally:
+            with self._lock:
+                self.tempos[etapa] += time_module.time() - inicio
+
+    def _registrar(self, cliente_nome, sucesso):
+        with self._lock:
+            self.resultados.append((cliente_nome, sucesso))
+
+    # ── Etapas ───────────────────────────────────────────────────────────────
+
+    def _coletor(self):
+        """Mantém um navegador próprio e coleta clientes até a fila esvaziar"""
+        with sync_playwright() as playwright:
+            browser = None
+            try:
+                while True:
+                    try:
+                        cliente = self.fila_clientes.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    cliente_nome = cliente.get("nome", "Cliente não identificado")
+                    coleta = False
+                    # Relança o navegador caso tenha caído no cliente anterior
+                    if browser is None or not browser.is_connected():
+                        browser = setup_browser(
+                            headless=self.headless, playwright=playwright
+                        )
+                    if browser:
+                        coleta = self._executar_etapa(
+                            "coleta", cliente_nome, coletar_cliente, browser, cliente
+                        )
+                    else:
+                        logging.error(
+                            f"Navegador indisponível — cliente {cliente_nome} não processado"
+                        )
+
+                    if coleta:
+                        # Bloqueia enquanto a gravação estiver atrasada
+                        self.fila_gravacao.put(coleta)
+                    else:
+                        self._registrar(cliente_nome, False)
+            finally:
+                if browser:
+                    browser.close()
+                    logging.info("Navegador do worker fechado")
+
+    def _gravador(self):
+        while True:
+            coleta = self.fila_gravacao.get()
+            if coleta is None:
+                break
+            if self._executar_etapa(
+                "gravacao", coleta["cliente_nome"], persistir_coleta, coleta
+            ):
+                self.fila_relatorios.put(coleta)
+            else:
+                self._registrar(coleta["cliente_nome"], False)
+
+    def _relator(self):
+        while True:
+            coleta = self.fila_relatorios.get()
+            if coleta is None:
+                break
+            cliente_nome = coleta["cliente_nome"]
+            sucesso = self._executar_etapa(
+                "relatorios", cliente_nome, enviar_relatorios_coleta, coleta
+            )
+            self._registrar(cliente_nome, bool(sucesso))
+            # Libera o DataFrame assim que o cliente termina
+            coleta.clear()
+
+    # ── Execução ─────────────────────────────────────────────────────────────
+
+    def _iniciar(self, alvo, total, nome):
+        threads = [
+            threading.Thread(target=alvo, name=f"{nome}-{i + 1}") for i in range(total)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def executar(self):
+        """Roda as três etapas até todos os clientes terminarem; devolve [(cliente, sucesso)]"""
+        inicio = time_module.time()
+        logging.info(
+            f"Processando {self.fila_clientes.qsize()} clientes em pipeline: "
+            f"{self.total_coletores} navegadores, {self.total_gravadores} gravadores, "
+            f"{self.total_relatores} geradores de relatório"
+        )
+
+        coletores = self._iniciar(self._coletor, self.total_coletores, "coleta")
+        gravadores = self._iniciar(self._gravador, self.total_gravadores, "gravacao")
+        relatores = self._iniciar(self._relator, self.total_relatores, "relatorio")
+
+        # Encerramento em cascata: cada etapa termina depois da anterior
+        for thread in coletores:
+            thread.join()
+        for _ in gravadores:
+            self.fila_gravacao.put(None)
+        for thread in gravadores:
+            thread.join()
+        for _ in relatores:
+            self.fila_relatorios.put(None)
+        for thread in relatores:
+            thread.join()
+
+        duracao = time_module.time() - inicio
+        soma = sum(self.tempos.values())
+        logging.info(
+            f"⏱️ Pipeline: {duracao:.1f}s no total; tempo somado por etapa — "
+            f"coleta {self.tempos['coleta']:.1f}s, gravação {self.tempos['gravacao']:.1f}s, "
+            f"relatórios {self.tempos['relatorios']:.1f}s "
+            f"({soma:.1f}s se executadas em sequência)"
+        )
+        return self.resultados
+
+
 def main():
     """Função principal"""
     logging.info("Iniciando monitoramento de clientes")
     browser = None
     total_processados = 0
     total_sucessos = 0
+    inicio = time_module.time()
+    # Gravações que ficaram no spool local em execuções anteriores
+    reprocessamento = iniciar_reprocessamento_spool()
 
     try:
         clientes = carregar_base_clientes()
@@ -1116,15 +3250,30 @@ def main():
             logging.error("Não há clientes para processar. Encerrando.")
             return
 
-        browser = setup_browser(headless=os.getenv("GITHUB_ACTIONS") is not None)
-        if not browser:
-            logging.critical("Falha ao iniciar o navegador. Encerrando.")
-            return
+        headless = os.getenv("GITHUB_ACTIONS") is not None
+
+        if PIPELINE_ETAPAS and len(clientes) > 1:
+            resultados = PipelineClientes(
+                clientes, MAX_CLIENTES_PARALELOS, headless
+            ).executar()
+            total_processados = len(resultados)
+            total_sucessos = sum(1 for _, sucesso in resultados if sucesso)
+        elif MAX_CLIENTES_PARALELOS > 1 and len(clientes) > 1:
+            resultados = processar_clientes_em_paralelo(
+                clientes, MAX_CLIENTES_PARALELOS, headless
+            )
+            total_processados = len(resultados)
+            total_sucessos = sum(1 for _, sucesso in resultados if sucesso)
+        else:
+            browser = setup_browser(headless=headless)
+            if not browser:
+                logging.critical("Falha ao iniciar o navegador. Encerrando.")
+                return
 
-        for cliente in clientes:
-            total_processados += 1
-            if processar_cliente(browser, cliente):
-                total_sucessos += 1
+            for cliente in clientes:
+                total_processados += 1
+                if processar_cliente(browser, cliente):
+                    total_sucessos += 1
 
     except Exception as e:
         logging.critical(f"Erro crítico na execução principal: {e}")
@@ -1135,8 +3284,23 @@ def main():
             logging.info("Navegador fechado")
 
     logging.info(
-        f"🎯 Processamento finalizado: {total_sucessos} sucessos, {total_processados - total_sucessos} falhas"
+        f"🎯 Processamento finalizado: {total_sucessos} sucessos, {total_processados - total_sucessos} falhas "
+        f"em {time_module.time() - inicio:.1f}s"
     )
+    reprocessamento.join()
+    # Reenvia também o que esta execução deixou no spool, se o Supabase voltou
+    reprocessar_spool()
+    spool = obter_spool()
+    if spool is not None:
+        profundidade = spool.profundidade()
+        if profundidade["pendencias"] or profundidade["descartadas"]:
+            logging.warning(
+                f"💾 Spool local: {profundidade['pendencias']} pendências "
+                f"({profundidade['linhas']} linhas) aguardando reenvio, "
+                f"{profundidade['descartadas']} descartadas"
+            )
+    registrar_estatisticas_conexoes()
+    registrar_estatisticas_cache()
     if total_sucessos == 0 and total_processados > 0:
         enviar_notificacao_erro(
             "Nenhum cliente foi processado com sucesso.", ADMIN_CHAT_ID, "Sistema"
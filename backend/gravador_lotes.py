@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Gravação de linhas no Supabase em lotes adaptativos
+Lotes dimensionados pelo tamanho do payload (bytes) e ajustados pela latência
+observada, vários lotes em voo ao mesmo tempo e novas tentativas com backoff
+para erros transitórios. Linhas que falharem em definitivo são devolvidas ao
+chamador em vez de perdidas.
+
+Uso:
+    gravador = GravadorLotes(supabase, "lojas_dados")
+    inseridas, falhas = gravador.gravar(linhas)
+
+    # Reenvio idempotente de linhas com id próprio
+    GravadorLotes(supabase, "lojas_dados", conflito="id").gravar(linhas)
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from supabase_compartilhado import erro_transitorio
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+LOTE_BYTES_ALVO = int(os.getenv("LOTE_BYTES_ALVO", str(256 * 1024)))
+LOTE_MIN_LINHAS = int(os.getenv("LOTE_MIN_LINHAS", "10"))
+LOTE_MAX_LINHAS = int(os.getenv("LOTE_MAX_LINHAS", "2000"))
+LOTES_EM_VOO = max(1, int(os.getenv("LOTES_EM_VOO", "3")))
+LOTE_TENTATIVAS = max(1, int(os.getenv("LOTE_TENTATIVAS", "4")))
+# Latência desejada por lote: abaixo da metade o lote cresce, acima ele encolhe
+LOTE_LATENCIA_ALVO_S = float(os.getenv("LOTE_LATENCIA_ALVO_S", "1.5"))
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 15
+
+
+class GravadorLotes:
+    """
+    Insere linhas em uma tabela com lotes adaptativos e paralelos.
+    Uma instância pode ser reutilizada: o tamanho de lote aprendido é mantido
+    entre chamadas de gravar().
+
+    Obs.: uma nova tentativa após timeout de leitura pode duplicar o lote se o
+    servidor chegou a gravá-lo; erros de conexão, 429 e statement_timeout não
+    têm esse risco. Com `conflito` (coluna única presente nas linhas) os lotes
+    são gravados com upsert ignorando duplicadas, e repetir é seguro.
+    """
+
+    def __init__(
+        self,
+        supabase,
+        tabela,
+        bytes_alvo=LOTE_BYTES_ALVO,
+        em_voo=LOTES_EM_VOO,
+        tentativas=LOTE_TENTATIVAS,
+        latencia_alvo_s=LOTE_LATENCIA_ALVO_S,
+        conflito=None,
+    ):
+        self.supabase = supabase
+        self.tabela = tabela
+        self.bytes_alvo = bytes_alvo
+        self.em_voo = em_voo
+        self.tentativas = tentativas
+        self.latencia_alvo_s = latencia_alvo_s
+        self.conflito = conflito
+        self.tamanho_lote = None
+        self.estatisticas = {
+            "linhas_inseridas": 0,
+            "linhas_com_falha": 0,
+            "lotes": 0,
+            "novas_tentativas": 0,
+            "duracao_s": 0.0,
+            "linhas_por_segundo": 0.0,
+        }
+
+    # ── Dimensionamento ──────────────────────────────────────────────────────
+
+    def _tamanho_inicial(self, linhas):
+        """Linhas por lote para atingir bytes_alvo, estimado por uma amostra"""
+        amostra = linhas[:20]
+        bytes_por_linha = len(json.dumps(amostra, default=str).encode("utf-8")) / len(
+            amostra
+        )
+        return self._limitar(int(self.bytes_alvo / max(bytes_por_linha, 1)))
+
+    def _limitar(self, tamanho):
+        return max(LOTE_MIN_LINHAS, min(LOTE_MAX_LINHAS, tamanho))
+
+    def _ajustar(self, latencia):
+        """Aumento gradual enquanto rápido, corte pela metade quando lento"""
+        if latencia > self.latencia_alvo_s:
+            self.tamanho_lote = self._limitar(self.tamanho_lote // 2)
+        elif latencia < self.latencia_alvo_s / 2:
+            self.tamanho_lote = self._limitar(int(self.tamanho_lote * 1.25) + 1)
+
+    # ── Envio ────────────────────────────────────────────────────────────────
+
+    def _enviar(self, lote):
+        """Insere um lote com novas tentativas; devolve (inseridas, latência, tentativas extras)"""
+        for tentativa in range(self.tentativas):
+            inicio = time.time()
+            try:
+                tabela = self.supabase.table(self.tabela)
+                if self.conflito:
+                    consulta = tabela.upsert(
+                        lote, on_conflict=self.conflito, ignore_duplicates=True
+                    )
+                else:
+                    consulta = tabela.insert(lote)
+                response = consulta.execute()
+                return len(response.data or lote), time.time() - inicio, tentativa
+            except Exception as e:
+                if not erro_transitorio(e) or tentativa == self.tentativas - 1:
+                    raise
+                # Backoff exponencial com jitter completo
+                espera = random.uniform(
+                    0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2**tentativa)
+                )
+                logging.warning(
+                    f"⚠️ Erro transitório em lote de {len(lote)} linhas de {self.tabela} "
+                    f"(tentativa {tentativa + 1}/{self.tentativas}): {e}. "
+                    f"Nova tentativa em {espera:.1f}s"
+                )
+                time.sleep(espera)
+
+    def gravar(self, linhas):
+        """
+        Insere todas as linhas. Devolve (total_inseridas, linhas_com_falha),
+        onde linhas_com_falha são as linhas dos lotes que falharam em definitivo.
+        """
+        if not linhas:
+            return 0, []
+
+        if self.tamanho_lote is None:
+            self.tamanho_lote = self._tamanho_inicial(linhas)
+
+        inicio = time.time()
+        inseridas = 0
+        falhas = []
+        posicao = 0
+        em_andamento = {}
+
+        with ThreadPoolExecutor(
+            max_workers=self.em_voo, thread_name_prefix=f"lotes-{self.tabela}"
+        ) as executor:
+            while posicao < len(linhas) or em_andamento:
+                # Mantém até `em_voo` lotes em andamento, cada um com o tamanho atual
+                while posicao < len(linhas) and len(em_andamento) < self.em_voo:
+                    lote = linhas[posicao : posicao + self.tamanho_lote]
+                    posicao += len(lote)
+                    em_andamento[executor.submit(self._enviar, lote)] = lote
+
+                concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    lote = em_andamento.pop(futuro)
+                    self.estatisticas["lotes"] += 1
+                    try:
+                        total, latencia, extras = futuro.result()
+                    except Exception as e:
+                        logging.error(
+                            f"❌ Lote de {len(lote)} linhas de {self.tabela} falhou: {e}"
+                        )
+                        falhas.extend(lote)
+                        continue
+
+                    inseridas += total
+                    self.estatisticas["novas_tentativas"] += extras
+                    self._ajustar(latencia)
+
+        duracao = time.time() - inicio
+        self.estatisticas["linhas_inseridas"] += inseridas
+        self.estatisticas["linhas_com_falha"] += len(falhas)
+        self.estatisticas["duracao_s"] = round(
+            self.estatisticas["duracao_s"] + duracao, 2
+        )
+        self.estatisticas["linhas_por_segundo"] = round(
+            inseridas / duracao if duracao else 0, 1
+        )
+        self.estatisticas["tamanho_lote"] = self.tamanho_lote
+
+        logging.info(
+            f"📦 {inseridas} linhas gravadas em {self.tabela} em {duracao:.1f}s "
+            f"({self.estatisticas['linhas_por_segundo']} linhas/s, lote final de "
+            f"{self.tamanho_lote} linhas)"
+            + (f" — {len(falhas)} linhas com falha" if falhas else "")
+        )
+        return inseridas, falhas
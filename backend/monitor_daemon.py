@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Daemon de Monitoramento de Clientes
+Mantém navegadores Chromium aquecidos, agenda cada cliente no seu intervalo
+e aceita execuções sob demanda por uma fila local (HTTP), para que pedidos
+manuais como o /mdonline terminem em segundos em vez de minutos.
+
+Endpoints:
+    POST /executar   {"cliente": "Nome"}  (sem corpo = todos os clientes)
+    GET  /status
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from playwright.sync_api import sync_playwright
+
+from cache_estatisticas import obter_cache_estatisticas
+from client_monitor_supabase import (
+    carregar_base_clientes,
+    iniciar_reprocessamento_spool,
+    processar_cliente,
+    setup_browser,
+)
+from spool_gravacoes import obter_spool
+from supabase_compartilhado import estatisticas_conexoes
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+DAEMON_WORKERS = max(1, int(os.getenv("DAEMON_WORKERS", "2")))
+# Fora de localhost (ex.: 0.0.0.0 para o bot em outro serviço) o DAEMON_TOKEN
+# é obrigatório; o bot usa o mesmo token e DAEMON_URL apontando para cá
+DAEMON_HOST = os.getenv("DAEMON_HOST", "127.0.0.1")
+DAEMON_PORTA = int(os.getenv("DAEMON_PORTA", "8765"))
+DAEMON_TOKEN = os.getenv("DAEMON_TOKEN")
+HOSTS_LOCAIS = ("127.0.0.1", "localhost", "::1")
+
+# Reciclagem dos navegadores: após N jobs ou se a memória do worker (driver do
+# Playwright + navegador) passar da sua parte do limite total
+RECICLAR_APOS_JOBS = int(os.getenv("RECICLAR_APOS_JOBS", "50"))
+RECICLAR_MEMORIA_MB = int(os.getenv("RECICLAR_MEMORIA_MB", "1500"))
+
+INTERVALO_PADRAO_HORAS = float(os.getenv("INTERVALO_PADRAO_HORAS", "3"))
+RECARREGAR_CLIENTES_MINUTOS = 60
+# Reenvio periódico das gravações guardadas no spool local
+REENVIAR_SPOOL_MINUTOS = float(os.getenv("REENVIAR_SPOOL_MINUTOS", "5"))
+
+PRIORIDADE_SOB_DEMANDA = 0
+PRIORIDADE_AGENDADA = 1
+
+
+# ======================================
+# 🔌 FUNÇÕES AUXILIARES
+# ======================================
+
+
+def _rss_kb(pid):
+    """RSS de um processo em KB (0 se o processo já terminou)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _processos_filhos():
+    """Mapa pid -> pids filhos de todos os processos; vazio fora do Linux"""
+    filhos = {}
+    if not os.path.isdir("/proc"):
+        return filhos
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        filhos.setdefault(ppid, []).append(int(pid))
+    return filhos
+
+
+def memoria_rss_mb(raizes=None):
+    """
+    RSS total (MB) dos processos `raizes` e de seus descendentes (por padrão
+    este processo, com todos os navegadores); 0 fora do Linux
+    """
+    filhos = _processos_filhos()
+    if not filhos:
+        return 0
+
+    total_kb = 0
+    pendentes = list(raizes) if raizes is not None else [os.getpid()]
+    while pendentes:
+        pid = pendentes.pop()
+        total_kb += _rss_kb(pid)
+        pendentes.extend(filhos.get(pid, []))
+    return total_kb / 1024
+
+
+def intervalo_cliente_segundos(cliente_info):
+    """Intervalo de coleta do cliente (coluna intervalo_horas ou o padrão)"""
+    try:
+        horas = float(cliente_info.get("intervalo_horas") or INTERVALO_PADRAO_HORAS)
+    except (TypeError, ValueError):
+        horas = INTERVALO_PADRAO_HORAS
+    return max(horas, 0.25) * 3600
+
+
+# ======================================
+# 🧠 DAEMON
+# ======================================
+
+
+class MonitorDaemon:
+    """Pool de navegadores aquecidos + agenda interna + fila de jobs sob demanda"""
+
+    def __init__(self, total_workers=DAEMON_WORKERS):
+        self.total_workers = total_workers
+        self.fila = queue.PriorityQueue()
+        self.parar = threading.Event()
+        self.clientes = {}
+        self._sequencia = itertools.count()
+        self._lock = threading.Lock()
+        # Serializa o início dos drivers para cada worker identificar o seu
+        self._lock_inicio_driver = threading.Lock()
+        self._pendentes = {}  # cliente -> jobs na fila ou em execução
+        self.estatisticas = {
+            "jobs_concluidos": 0,
+            "jobs_com_falha": 0,
+            "navegadores_reciclados": 0,
+            "iniciado_em": time.time(),
+        }
+
+    # ── Fila ─────────────────────────────────────────────────────────────────
+
+    def enfileirar(self, cliente_info, manual=False):
+        """Coloca um job na fila; jobs agendados não duplicam um cliente já pendente"""
+        nome = cliente_info.get("nome")
+        with self._lock:
+            if not manual and self._pendentes.get(nome):
+                logging.info(f"⏭️ {nome} já está na fila — agendamento ignorado")
+                return False
+            self._pendentes[nome] = self._pendentes.get(nome, 0) + 1
+
+        prioridade = PRIORIDADE_SOB_DEMANDA if manual else PRIORIDADE_AGENDADA
+        job = {"cliente": cliente_info, "manual": manual, "enfileirado_em": time.time()}
+        self.fila.put((prioridade, next(self._sequencia), job))
+        return True
+
+    def _concluir(self, job, sucesso):
+        nome = job["cliente"].get("nome")
+        with self._lock:
+            self._pendentes[nome] -= 1
+            if not self._pendentes[nome]:
+                del self._pendentes[nome]
+            self.estatisticas["jobs_concluidos"] += 1
+            if not sucesso:
+                self.estatisticas["jobs_com_falha"] += 1
+
+    def enfileirar_sob_demanda(self, cliente_nome=None):
+        """Enfileira um cliente (ou todos) com prioridade; devolve os nomes aceitos"""
+        with self._lock:
+            clientes = dict(self.clientes)
+        if cliente_nome:
+            selecionados = [clientes[cliente_nome]] if cliente_nome in clientes else []
+        else:
+            selecionados = list(clientes.values())
+
+        for cliente in selecionados:
+            self.enfileirar(cliente, manual=True)
+        return [cliente.get("nome") for cliente in selecionados]
+
+    def status(self):
+        """Resumo do estado do daemon para o endpoint /status"""
+        spool = obter_spool()
+        cache = obter_cache_estatisticas()
+        with self._lock:
+            return {
+                **self.estatisticas,
+                "workers": self.total_workers,
+                "fila": self.fila.qsize(),
+                "pendentes": dict(self._pendentes),
+                "clientes": len(self.clientes),
+                "memoria_mb": round(memoria_rss_mb(), 1),
+                "supabase": estatisticas_conexoes(),
+                "spool": spool.profundidade() if spool else None,
+                "cache_estatisticas": cache.estatisticas() if cache else None,
+            }
+
+    # ── Workers ──────────────────────────────────────────────────────────────
+
+    def _worker(self):
+        """Mantém um navegador aquecido e processa jobs até o daemon parar"""
+        # Cada worker tem seu próprio driver do Playwright, filho deste processo,
+        # com o navegador abaixo dele: a memória do worker é a dessa subárvore
+        with self._lock_inicio_driver:
+            antes = set(_processos_filhos().get(os.getpid(), []))
+            playwright = sync_playwright().start()
+            processos_worker = (
+                set(_processos_filhos().get(os.getpid(), [])) - antes or None
+            )
+        limite_memoria_mb = RECICLAR_MEMORIA_MB / max(self.total_workers, 1)
+
+        browser = self._abrir_navegador(playwright)
+        jobs_no_navegador = 0
+
+        try:
+            while not self.parar.is_set():
+                try:
+                    _, _, job = self.fila.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+                cliente_nome = job["cliente"].get("nome", "Cliente não identificado")
+                espera = time.time() - job["enfileirado_em"]
+                logging.info(
+                    f"▶️ Job {'sob demanda' if job['manual'] else 'agendado'} "
+                    f"para {cliente_nome} (aguardou {espera:.1f}s na fila)"
+                )
+
+                sucesso = False
+                try:
+                    if browser is None or not browser.is_connected():
+                        self._fechar_navegador(browser)
+                        browser = self._abrir_navegador(playwright)
+                        jobs_no_navegador = 0
+                    if browser:
+                        sucesso = processar_cliente(
+                            browser, job["cliente"], manual=job["manual"]
+                        )
+                except Exception as e:
+                    logging.critical(f"Erro não tratado no job de {cliente_nome}: {e}")
+                finally:
+                    self._concluir(job, sucesso)
+                    jobs_no_navegador += 1
+
+                # Sem o driver identificado: média do processo por worker
+                if processos_worker:
+                    memoria = memoria_rss_mb(processos_worker)
+                else:
+                    memoria = memoria_rss_mb() / max(self.total_workers, 1)
+                if browser and (
+                    jobs_no_navegador >= RECICLAR_APOS_JOBS
+                    or memoria > limite_memoria_mb
+                ):
+                    logging.info(
+                        f"♻️ Reciclando navegador após {jobs_no_navegador} jobs "
+                        f"({memoria:.0f} MB em uso pelo worker)"
+                    )
+                    self._fechar_navegador(browser)
+                    browser = self._abrir_navegador(playwright)
+                    jobs_no_navegador = 0
+                    with self._lock:
+                        self.estatisticas["navegadores_reciclados"] += 1
+        finally:
+            self._fechar_navegador(browser)
+            try:
+                playwright.stop()
+            except Exception as e:
+                logging.warning(f"Erro ao encerrar o Playwright do worker: {e}")
+
+    def _abrir_navegador(self, playwright):
+        """Novo navegador do worker; None em caso de erro (nova tentativa no próximo job)"""
+        try:
+            return setup_browser(headless=True, playwright=playwright)
+        except Exception as e:
+            logging.error(f"Erro ao iniciar o navegador do worker: {e}")
+            return None
+
+    def _fechar_navegador(self, browser):
+        """Fecha o navegador ignorando erros (processo já encerrado, conexão perdida)"""
+        if browser is None:
+            return
+        try:
+            browser.close()
+        except Exception as e:
+            logging.warning(f"Erro ao fechar o navegador do worker: {e}")
+
+    # ── Agenda ───────────────────────────────────────────────────────────────
+
+    def _agendador(self):
+        """Recarrega a base de clientes periodicamente e enfileira os que vencerem"""
+        proximas = {}
+        ultimo_recarregamento = 0
+        ultimo_reenvio = 0
+
+        while not self.parar.is_set():
+            agora = time.time()
+
+            if agora - ultimo_recarregamento >= RECARREGAR_CLIENTES_MINUTOS * 60:
+                lista = carregar_base_clientes()
+                if lista:
+                    with self._lock:
+                        self.clientes = {c.get("nome"): c for c in lista}
+                    for nome in list(proximas):
+                        if nome not in self.clientes:
+                            del proximas[nome]
+                    for nome in self.clientes:
+                        proximas.setdefault(nome, agora)
+                ultimo_recarregamento = agora
+
+            if agora - ultimo_reenvio >= REENVIAR_SPOOL_MINUTOS * 60:
+                iniciar_reprocessamento_spool()
+                ultimo_reenvio = agora
+
+            for nome, quando in list(proximas.items()):
+                if quando <= agora:
+                    cliente = self.clientes[nome]
+                    self.enfileirar(cliente)
+                    proximas[nome] = agora + intervalo_cliente_segundos(cliente)
+
+            self.parar.wait(30)
+
+    # ── Fila local (HTTP) ────────────────────────────────────────────────────
+
+    def _criar_servidor(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self, codigo, corpo):
+                dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _autorizado(self):
+                if not DAEMON_TOKEN:
+                    return True
+                return self.headers.get("Authorization") == f"Bearer {DAEMON_TOKEN}"
+
+            def do_GET(self):
+                if not self._autorizado():
+                    return self._responder(401, {"erro": "não autorizado"})
+                if self.path != "/status":
+                    return self._responder(404, {"erro": "rota não encontrada"})
+                self._responder(200, daemon.status())
+
+            def do_POST(self):
+                if not self._autorizado():
+                    return self._responder(401, {"erro": "não autorizado"})
+                if self.path != "/executar":
+                    return self._responder(404, {"erro": "rota não encontrada"})
+
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                try:
+                    corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                except ValueError:
+                    return self._responder(400, {"erro": "JSON inválido"})
+
+                aceitos = daemon.enfileirar_sob_demanda(corpo.get("cliente"))
+                if not aceitos:
+                    return self._responder(404, {"erro": "cliente não encontrado"})
+                self._responder(202, {"enfileirados": aceitos})
+
+            def log_message(self, format, *args):
+                logging.info(f"🌐 {self.address_string()} {format % args}")
+
+        return ThreadingHTTPServer((DAEMON_HOST, DAEMON_PORTA), Handler)
+
+    # ── Ciclo de vida ────────────────────────────────────────────────────────
+
+    def executar(self):
+        """Sobe workers, agenda e servidor; bloqueia até SIGTERM/SIGINT"""
+        if DAEMON_HOST not in HOSTS_LOCAIS and not DAEMON_TOKEN:
+            logging.critical(
+                f"❌ DAEMON_HOST={DAEMON_HOST} expõe a fila fora desta máquina: "
+                "defina DAEMON_TOKEN (o mesmo no bot) ou use 127.0.0.1"
+            )
+            sys.exit(1)
+
+        threads = [
+            threading.Thread(target=self._worker, name=f"worker-{i + 1}")
+            for i in range(self.total_workers)
+        ]
+        threads.append(threading.Thread(target=self._agendador, name="agendador"))
+        for thread in threads:
+            thread.start()
+
+        servidor = self._criar_servidor()
+        threading.Thread(
+            target=servidor.serve_forever, name="fila-http", daemon=True
+        ).start()
+        logging.info(
+            f"🚀 Daemon iniciado: {self.total_workers} navegadores, "
+            f"fila em http://{DAEMON_HOST}:{DAEMON_PORTA}"
+        )
+
+        def encerrar(signum, frame):
+            logging.info("🛑 Sinal de parada recebido, encerrando daemon...")
+            self.parar.set()
+
+        signal.signal(signal.SIGTERM, encerrar)
+        signal.signal(signal.SIGINT, encerrar)
+
+        while not self.parar.is_set():
+            self.parar.wait(1)
+
+        servidor.shutdown()
+        for thread in threads:
+            thread.join()
+        logging.info("Daemon encerrado")
+
+
+def main():
+    MonitorDaemon().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Spool local de gravações (write-ahead) para quando o Supabase está lento ou fora do ar
+As gravações que falham (criação/finalização de execuções, lojas, métricas e
+logs) ficam num arquivo SQLite e são regravadas depois, na ordem em que
+entraram, por client_monitor_supabase.reprocessar_spool. Uma queda do Supabase
+atrasa os dados, mas não descarta a coleta já feita.
+
+Uso:
+    spool = obter_spool()
+    spool.guardar("log", linha_log)
+    for pendencia in spool.pendentes():
+        ...
+        spool.concluir(pendencia["id"])
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+SPOOL_GRAVACOES = os.getenv("SPOOL_GRAVACOES", "true").lower() == "true"
+SPOOL_ARQUIVO = os.getenv("SPOOL_ARQUIVO", os.path.join(".spool", "gravacoes.sqlite3"))
+# Pendências que falham mais vezes que isso (com o Supabase acessível) deixam de
+# ser reenviadas; continuam no arquivo e aparecem como descartadas na profundidade
+SPOOL_MAX_TENTATIVAS = int(os.getenv("SPOOL_MAX_TENTATIVAS", "5"))
+
+_lock = threading.Lock()
+_spool = None
+
+
+class SpoolGravacoes:
+    """
+    Fila durável de gravações pendentes, segura para uso entre threads.
+    Cada pendência tem um tipo (execucao, ingestao, lojas, finalizacao,
+    metrica, log), o id da execução a que pertence (quando houver) e o payload
+    em JSON.
+    """
+
+    def __init__(self, arquivo=SPOOL_ARQUIVO):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        diretorio = os.path.dirname(arquivo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._conexao = sqlite3.connect(
+            arquivo, check_same_thread=False, isolation_level=None
+        )
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        # Cada pendência confirmada precisa sobreviver a uma queda do processo
+        self._conexao.execute("PRAGMA synchronous=FULL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS pendencias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                execucao_id TEXT,
+                payload TEXT NOT NULL,
+                linhas INTEGER NOT NULL DEFAULT 1,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                ultimo_erro TEXT
+            )
+            """)
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pendencias_execucao "
+            "ON pendencias(execucao_id)"
+        )
+
+    def guardar(self, tipo, payload, execucao_id=None):
+        """
+        Grava uma pendência no spool. Devolve True se ela ficou guardada
+        (o chamador pode considerar a gravação feita).
+        """
+        linhas = len(payload) if isinstance(payload, list) else 1
+        if tipo == "ingestao":
+            linhas = len(payload.get("lojas") or [])
+        try:
+            conteudo = json.dumps(payload, default=str, ensure_ascii=False)
+            with self._lock:
+                self._conexao.execute(
+                    "INSERT INTO pendencias (tipo, execucao_id, payload, linhas, criado_em) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (tipo, execucao_id, conteudo, linhas, time.time()),
+                )
+        except Exception as e:
+            logging.error(f"Erro ao guardar {tipo} no spool local: {e}")
+            return False
+
+        logging.warning(
+            f"💾 Gravação de {tipo}"
+            + (f" da execução {execucao_id}" if execucao_id else "")
+            + " guardada no spool local para reenvio"
+        )
+        return True
+
+    def tem_pendencias(self, execucao_id):
+        """
+        Indica se a execução tem gravações no spool. Enquanto tiver, as
+        gravações seguintes dela também vão para o spool, para manter a ordem.
+        """
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT 1 FROM pendencias WHERE execucao_id = ? AND tentativas < ? LIMIT 1",
+                (execucao_id, SPOOL_MAX_TENTATIVAS),
+            ).fetchone()
+        return linha is not None
+
+    def pendentes(self, limite=100, depois_de=0):
+        """Próximas pendências a reenviar, na ordem em que foram guardadas"""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT id, tipo, execucao_id, payload, linhas, tentativas "
+                "FROM pendencias WHERE id > ? AND tentativas < ? ORDER BY id LIMIT ?",
+                (depois_de, SPOOL_MAX_TENTATIVAS, limite),
+            ).fetchall()
+        return [
+            {
+                "id": id_,
+                "tipo": tipo,
+                "execucao_id": execucao_id,
+                "payload": json.loads(payload),
+                "linhas": total_linhas,
+                "tentativas": tentativas,
+            }
+            for id_, tipo, execucao_id, payload, total_linhas, tentativas in linhas
+        ]
+
+    def concluir(self, id_pendencia):
+        """Remove uma pendência já gravada no Supabase"""
+        with self._lock:
+            self._conexao.execute(
+                "DELETE FROM pendencias WHERE id = ?", (id_pendencia,)
+            )
+
+    def registrar_falha(self, id_pendencia, erro):
+        """Conta uma tentativa de reenvio que falhou com o Supabase acessível"""
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE pendencias SET tentativas = tentativas + 1, ultimo_erro = ? "
+                "WHERE id = ?",
+                (str(erro)[:1000], id_pendencia),
+            )
+
+    def profundidade(self):
+        """Pendências, linhas e bytes no spool, e idade da pendência mais antiga"""
+        with self._lock:
+            pendentes, linhas, tamanho, mais_antiga = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(linhas), 0), "
+                "COALESCE(SUM(LENGTH(payload)), 0), MIN(criado_em) "
+                "FROM pendencias WHERE tentativas < ?",
+                (SPOOL_MAX_TENTATIVAS,),
+            ).fetchone()
+            (descartadas,) = self._conexao.execute(
+                "SELECT COUNT(*) FROM pendencias WHERE tentativas >= ?",
+                (SPOOL_MAX_TENTATIVAS,),
+            ).fetchone()
+        return {
+            "pendencias": pendentes,
+            "linhas": linhas,
+            "bytes": tamanho,
+            "idade_s": round(time.time() - mais_antiga, 1) if mais_antiga else 0,
+            "descartadas": descartadas,
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+def obter_spool():
+    """
+    Spool do processo, aberto na primeira chamada.
+    Devolve None se o spool estiver desativado (SPOOL_GRAVACOES=false) ou se
+    o arquivo não puder ser aberto; as gravações seguem sem ele.
+    """
+    global _spool
+
+    if not SPOOL_GRAVACOES:
+        return None
+    if _spool is not None:
+        return _spool
+
+    with _lock:
+        if _spool is None:
+            try:
+                _spool = SpoolGravacoes()
+            except Exception as e:
+                logging.error(f"Erro ao abrir o spool local {SPOOL_ARQUIVO}: {e}")
+                return None
+    return _spool
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Cliente Supabase compartilhado pelo processo
+Um único cliente (e um único pool de conexões HTTP keep-alive, com HTTP/2
+quando o pacote `h2` está instalado) para todos os scripts e threads, em vez
+de um create_client — e novas conexões TLS — a cada chamada.
+
+Uso:
+    from supabase_compartilhado import obter_supabase, estatisticas_conexoes
+"""
+
+import logging
+import os
+import threading
+
+import httpx
+from supabase import Client, ClientOptions, create_client
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+# ======================================
+# 🔧 CONFIGURAÇÕES
+# ======================================
+
+SUPABASE_POOL_CONEXOES = int(os.getenv("SUPABASE_POOL_CONEXOES", "20"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+SUPABASE_TIMEOUT = httpx.Timeout(120, connect=10)
+
+_lock = threading.Lock()
+_local = threading.local()  # status HTTP da última resposta de cada thread
+_cliente = None
+_cliente_http = None
+
+_estatisticas = {
+    "requisicoes": 0,
+    "conexoes_abertas": 0,
+    "handshakes_tls": 0,
+    "requisicoes_http2": 0,
+}
+
+
+# ======================================
+# 📊 ESTATÍSTICAS DE CONEXÃO
+# ======================================
+
+
+def _rastrear(evento, info):
+    """Trace do httpcore: conta conexões novas, handshakes TLS e requisições HTTP/2"""
+    if evento == "connection.connect_tcp.complete":
+        chave = "conexoes_abertas"
+    elif evento == "connection.start_tls.complete":
+        chave = "handshakes_tls"
+    elif evento == "http2.send_request_headers.complete":
+        chave = "requisicoes_http2"
+    else:
+        return
+    with _lock:
+        _estatisticas[chave] += 1
+
+
+def _instalar_trace(request):
+    request.extensions["trace"] = _rastrear
+    _local.ultimo_status = None
+
+
+def _contar_resposta(response):
+    _local.ultimo_status = response.status_code
+    with _lock:
+        _estatisticas["requisicoes"] += 1
+
+
+def estatisticas_conexoes():
+    """Requisições respondidas e quantas reaproveitaram uma conexão já aberta"""
+    with _lock:
+        estatisticas = dict(_estatisticas)
+    estatisticas["conexoes_reaproveitadas"] = max(
+        0, estatisticas["requisicoes"] - estatisticas["conexoes_abertas"]
+    )
+    estatisticas["http2"] = HTTP2_DISPONIVEL and SUPABASE_HTTP2
+    return estatisticas
+
+
+def registrar_estatisticas_conexoes():
+    """Loga o reaproveitamento de conexões (chamado no fim dos scripts)"""
+    estatisticas = estatisticas_conexoes()
+    logging.info(
+        f"🔌 Supabase: {estatisticas['requisicoes']} requisições, "
+        f"{estatisticas['conexoes_abertas']} conexões abertas, "
+        f"{estatisticas['conexoes_reaproveitadas']} reaproveitadas"
+        + (" (HTTP/2)" if estatisticas["http2"] else "")
+    )
+    return estatisticas
+
+
+def ultimo_status_http():
+    """
+    Status HTTP da última resposta recebida nesta thread pelo cliente síncrono
+    (o APIError do postgrest não guarda o status quando o corpo é JSON).
+    """
+    return getattr(_local, "ultimo_status", None)
+
+
+# Respostas/erros que podem dar certo numa nova tentativa
+STATUS_TRANSITORIOS = {408, 429, 500, 502, 503, 504, 520, 522, 524}
+# statement_timeout, serialization_failure, deadlock_detected
+CODIGOS_PG_TRANSITORIOS = {"57014", "40001", "40P01"}
+
+
+def erro_transitorio(erro):
+    """Indica se vale repetir a chamada que lançou `erro` (rede, 5xx, 429, timeouts)"""
+    if isinstance(erro, (httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    if isinstance(erro, httpx.RemoteProtocolError):
+        return True
+    if ultimo_status_http() in STATUS_TRANSITORIOS:
+        return True
+    codigo = str(getattr(erro, "code", "") or "")
+    return codigo in CODIGOS_PG_TRANSITORIOS or codigo in {
+        str(status) for status in STATUS_TRANSITORIOS
+    }
+
+
+# ======================================
+# 🔌 CLIENTES
+# ======================================
+
+
+def _limites():
+    return httpx.Limits(
+        max_connections=SUPABASE_POOL_CONEXOES,
+        max_keepalive_connections=SUPABASE_POOL_CONEXOES,
+        keepalive_expiry=60,
+    )
+
+
+def obter_supabase():
+    """
+    Cliente Supabase do processo, criado na primeira chamada.
+    Seguro para uso concorrente entre threads (o httpx.Client é thread-safe
+    e cada chamada .table()/.rpc() monta sua própria requisição).
+    Devolve None se as credenciais não estiverem configuradas.
+    """
+    global _cliente, _cliente_http
+
+    if _cliente is not None:
+        return _cliente
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        logging.error("Variáveis SUPABASE_URL e SUPABASE_KEY não configuradas.")
+        return None
+
+    with _lock:
+        if _cliente is not None:
+            return _cliente
+        try:
+            _cliente_http = httpx.Client(
+                http2=HTTP2_DISPONIVEL and SUPABASE_HTTP2,
+                limits=_limites(),
+                timeout=SUPABASE_TIMEOUT,
+                follow_redirects=True,
+                event_hooks={
+                    "request": [_instalar_trace],
+                    "response": [_contar_resposta],
+                },
+            )
+            cliente: Client = create_client(
+                url, key, options=ClientOptions(httpx_client=_cliente_http)
+            )
+            # Cria o cliente PostgREST agora, sob o lock, e não na primeira
+            # chamada concorrente de .table()
+            cliente.postgrest
+            _cliente = cliente
+            logging.info(
+                "Cliente Supabase compartilhado inicializado "
+                f"(pool de {SUPABASE_POOL_CONEXOES} conexões"
+                f"{', HTTP/2' if HTTP2_DISPONIVEL and SUPABASE_HTTP2 else ''})"
+            )
+        except Exception as e:
+            logging.error(f"Erro ao inicializar cliente Supabase: {e}")
+            if _cliente_http is not None:
+                _cliente_http.close()
+                _cliente_http = None
+            return None
+
+    return _cliente
@@ -72,70 +72,63 @@ export function useDashboardData(clienteId: string | null = null) {
 
         if (clientesError) throw clientesError;
 
+        const clienteSelecionado = clienteId
+          ? clientesData?.find(c => c.id.toString() === clienteId)
+          : undefined;
+        const clienteNome = clienteSelecionado?.nome ?? null;
+
         // Buscar logs de execução
         let logsQuery = supabase
           .from('logs_execucao')
           .select('*');
 
         // Filtrar por cliente se selecionado
-        if (clienteId) {
-          const clienteSelecionado = clientesData?.find(c => c.id.toString() === clienteId);
-          if (clienteSelecionado) {
-            logsQuery = logsQuery.eq('cliente_nome', clienteSelecionado.nome);
-          }
+        if (clienteNome) {
+          logsQuery = logsQuery.eq('cliente_nome', clienteNome);
         }
 
         // Aplicar ordenação e limite no final
         logsQuery = logsQuery.order('executado_em', { ascending: false }).limit(3);
 
-        const { data: logsData, error: logsError } = await logsQuery;
+        // Situação de cada cliente (última execução com sucesso) e os totais
+        // dos cards vêm agregados do banco (situacao_clientes / resumo_dashboard)
+        const [
+          { data: logsData, error: logsError },
+          { data: situacaoData, error: situacaoError },
+          { data: resumoData, error: resumoError }
+        ] = await Promise.all([
+          logsQuery,
+          supabase.rpc('situacao_clientes'),
+          supabase.rpc('resumo_dashboard', { p_cliente_nome: clienteNome })
+        ]);
 
         if (logsError) throw logsError;
+        if (situacaoError) throw situacaoError;
+        if (resumoError) throw resumoError;
+
+        // Buscar dados das lojas (apenas os da última execução de cada cliente).
+        // O backend pode gravar só as lojas alteradas em cada execução (modo delta);
+        // snapshot_lojas remonta a lista completa de cada execução pedida.
+        const executionIds = (situacaoData || [])
+          .filter(s => s.execucao_id && (!clienteNome || s.cliente_nome === clienteNome))
+          .map(s => s.execucao_id as string);
 
-        // Buscar dados das lojas (apenas os mais recentes de cada cliente)
         let lojasQuery = supabase
           .from('lojas_dados')
           .select('*')
           .order('data_coleta', { ascending: false });
 
-        // Filtrar por cliente se selecionado
-        if (clienteId) {
-          const clienteSelecionado = clientesData?.find(c => c.id.toString() === clienteId);
-          if (clienteSelecionado) {
-            // Buscar apenas os dados mais recentes para este cliente
-            const { data: execucoesData } = await supabase
-              .from('execucoes')
-              .select('id')
-              .eq('cliente_nome', clienteSelecionado.nome)
-              .order('executado_em', { ascending: false })
-              .limit(1);
-
-            if (execucoesData && execucoesData.length > 0) {
-              lojasQuery = lojasQuery.eq('execucao_id', execucoesData[0].id);
-            } else {
-              lojasQuery = lojasQuery.eq('cliente_nome', clienteSelecionado.nome);
-            }
-          }
-        } else {
-          // Para todos os clientes, buscar os dados da última execução de cada um
-          const { data: latestExecutions, error: execError } = await supabase
-            .from('execucoes')
-            .select('id')
-            .order('executado_em', { ascending: false })
-            .limit(clientesData?.length || 1); // Limita ao número de clientes
-
-          if (execError) throw execError;
-
-          const executionIds = latestExecutions?.map(e => e.id) || [];
-
-          if (executionIds.length > 0) {
-            lojasQuery = lojasQuery.in('execucao_id', executionIds);
-          } else {
-            lojasQuery = lojasQuery.limit(0); // Nenhum dado se não houver execuções
-          }
+        if (clienteNome) {
+          lojasQuery = lojasQuery.eq('cliente_nome', clienteNome);
+        } else if (executionIds.length === 0) {
+          lojasQuery = lojasQuery.limit(0); // Nenhum dado se não houver execuções
         }
 
-        const { data: lojasData, error: lojasError } = await lojasQuery;
+        const { data: lojasData, error: lojasError } = executionIds.length > 0
+          ? await supabase
+              .rpc('snapshot_lojas', { p_execucao_ids: executionIds })
+              .order('data_coleta', { ascending: false })
+          : await lojasQuery;
 
         if (lojasError) throw lojasError;
 
@@ -172,33 +165,26 @@ export function useDashboardData(clienteId: string | null = null) {
         setLogs(logsFormatados);
         setLojas(lojasFormatadas);
 
-        // Calcular estatísticas reais com base nos dados das lojas
-        const totalLojas = lojasFormatadas.length;
-        const sincronizadas = lojasFormatadas.filter(loja => loja.sincronizada).length;
-        const atrasadas = totalLojas - sincronizadas;
-
-        const sucessos = logsData ? logsData.filter(log => log.status === 'sucesso').length : 0;
-        const erros = logsData ? logsData.filter(log => log.status === 'erro').length : 0;
-
-        const hoje = new Date().toDateString();
-        const executacoesHoje = logsData ? logsData.filter(log =>
-          new Date(log.executado_em).toDateString() === hoje
-        ).length : 0;
+        // Estatísticas calculadas no banco sobre todas as execuções, não só
+        // sobre os logs carregados acima
+        const resumo = resumoData?.[0];
+        const totalLojas = resumo?.total_lojas ?? 0;
+        const sincronizadas = resumo?.lojas_sincronizadas ?? 0;
 
-        const ultimaExecucao = logsData && logsData.length > 0
-          ? new Date(logsData[0].executado_em)
+        const ultimaExecucao = resumo?.ultima_execucao
+          ? new Date(resumo.ultima_execucao)
           : new Date();
 
         setStats({
           totalLojas,
           totalSincronizadas: sincronizadas,
-          totalAtrasadas: atrasadas,
+          totalAtrasadas: resumo?.lojas_atrasadas ?? 0,
           percentualSincronizacao: totalLojas > 0 ? (sincronizadas / totalLojas) * 100 : 0,
           ultimaExecucao: ultimaExecucao.toLocaleString('pt-BR'),
-          totalClientes: clienteId ? 1 : (clientesData?.length || 0),
-          executacoesHoje,
-          sucessos,
-          erros
+          totalClientes: resumo?.total_clientes ?? 0,
+          executacoesHoje: resumo?.execucoes_hoje ?? 0,
+          sucessos: resumo?.sucessos_hoje ?? 0,
+          erros: resumo?.erros_hoje ?? 0
         });
 
       } catch (error) {
@@ -21,7 +21,11 @@ export type Database = {
           created_at: string | null
           email: string
           id: number
+          intervalo_horas: number | null
+          motor_extracao: string | null
           nome: string
+          paginas_paralelas: number | null
+          perfil_bloqueio: string | null
           senha: string
           updated_at: string | null
         }
@@ -31,7 +35,11 @@ export type Database = {
           created_at?: string | null
           email: string
           id?: number
+          intervalo_horas?: number | null
+          motor_extracao?: string | null
           nome: string
+          paginas_paralelas?: number | null
+          perfil_bloqueio?: string | null
           senha: string
           updated_at?: string | null
         }
@@ -41,7 +49,11 @@ export type Database = {
           created_at?: string | null
           email?: string
           id?: number
+          intervalo_horas?: number | null
+          motor_extracao?: string | null
           nome?: string
+          paginas_paralelas?: number | null
+          perfil_bloqueio?: string | null
           senha?: string
           updated_at?: string | null
         }
@@ -116,6 +128,7 @@ export type Database = {
           tempo_atraso_dias: number | null
           hash_loja: string | null
           data_coleta: string | null
+          removida: boolean
           created_at: string | null
         }
         Insert: {
@@ -131,6 +144,7 @@ export type Database = {
           tempo_atraso_dias?: number | null
           hash_loja?: string | null
           data_coleta?: string | null
+          removida?: boolean
           created_at?: string | null
         }
         Update: {
@@ -146,6 +160,7 @@ export type Database = {
           tempo_atraso_dias?: number | null
           hash_loja?: string | null
           data_coleta?: string | null
+          removida?: boolean
           created_at?: string | null
         }
         Relationships: [
@@ -170,6 +185,7 @@ export type Database = {
           detalhes: string | null
           executado_em: string
           id: number
+          id_envio: string | null
           origem: string | null
           status: string
           total_lojas: number | null
@@ -180,6 +196,7 @@ export type Database = {
           detalhes?: string | null
           executado_em: string
           id?: number
+          id_envio?: string | null
           origem?: string | null
           status: string
           total_lojas?: number | null
@@ -190,6 +207,7 @@ export type Database = {
           detalhes?: string | null
           executado_em?: string
           id?: number
+          id_envio?: string | null
           origem?: string | null
           status?: string
           total_lojas?: number | null
@@ -201,7 +219,53 @@ export type Database = {
       [_ in never]: never
     }
     Functions: {
-      [_ in never]: never
+      snapshot_lojas: {
+        Args: { p_execucao_ids: string[] }
+        Returns: {
+          id: string
+          execucao_id: string | null
+          cliente_id: number | null
+          cliente_nome: string
+          loja_nome: string
+          identificador: string
+          atualizado_em: string | null
+          sincronizada: boolean | null
+          tempo_atraso_horas: number | null
+          tempo_atraso_dias: number | null
+          hash_loja: string | null
+          data_coleta: string | null
+          removida: boolean
+          created_at: string | null
+        }[]
+      }
+      situacao_clientes: {
+        Args: { p_limite_desatualizado?: string }
+        Returns: {
+          cliente_nome: string
+          ultima_execucao: string | null
+          ultimo_status: string | null
+          execucao_id: string | null
+          ultima_execucao_sucesso: string | null
+          total_lojas: number | null
+          lojas_sincronizadas: number | null
+          lojas_atrasadas: number | null
+          ultima_coleta: string | null
+          desatualizado: boolean
+        }[]
+      }
+      resumo_dashboard: {
+        Args: { p_cliente_nome?: string | null }
+        Returns: {
+          total_lojas: number
+          lojas_sincronizadas: number
+          lojas_atrasadas: number
+          ultima_execucao: string | null
+          execucoes_hoje: number
+          sucessos_hoje: number
+          erros_hoje: number
+          total_clientes: number
+        }[]
+      }
     }
     Enums: {
       [_ in never]: never
@@ -0,0 +1,21 @@
+-- ============================================================
+-- Migration: Performance statistics per execution
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   Adds `execucoes.estatisticas` (JSONB), filled by
+--   client_monitor_supabase.py with the scraping engine used
+--   (playwright / http), pages visited, stores per second and
+--   whether the HTTP engine fell back to Playwright.
+--
+--   Example — compare engine throughput over the last 7 days:
+--     SELECT estatisticas->>'motor' AS motor,
+--            AVG((estatisticas->>'lojas_por_segundo')::numeric) AS lojas_por_segundo
+--     FROM execucoes
+--     WHERE executado_em > NOW() - INTERVAL '7 days'
+--       AND estatisticas IS NOT NULL
+--     GROUP BY 1;
+-- ============================================================
+
+ALTER TABLE execucoes
+  ADD COLUMN IF NOT EXISTS estatisticas JSONB;
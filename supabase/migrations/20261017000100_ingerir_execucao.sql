@@ -0,0 +1,106 @@
+-- ============================================================
+-- Migration: One-call transactional ingest of an execution
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   Creates `ingerir_execucao(payload jsonb)`, called by
+--   client_monitor_supabase.py (ingerir_execucao) once per client
+--   instead of N/50 `lojas_dados` batches + finalize + select and
+--   update/insert of the daily metric + log. Everything runs in the
+--   function's transaction: either the whole execution is written
+--   or nothing is (the Python side then falls back to the old
+--   multi-call path).
+--
+--   Payload:
+--     {
+--       "execucao_id": "<uuid of the 'processando' row>",
+--       "execucao":    { total_lojas, lojas_sincronizadas, ..., status,
+--                        erro_detalhes, estatisticas },
+--       "lojas":       [ { cliente_id, cliente_nome, loja_nome, ... } ],
+--       "metrica":     { cliente_nome, data_referencia, periodo, ... },
+--       "log":         { cliente_nome, status, detalhes, ... }
+--     }
+--
+-- SECURITY:
+--   Only the backend (service_role) may execute it.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION ingerir_execucao(payload jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_execucao_id uuid := (payload->>'execucao_id')::uuid;
+  v_lojas_inseridas integer := 0;
+BEGIN
+  -- 1. Finaliza a execução criada no início da coleta
+  UPDATE execucoes e
+  SET total_lojas              = r.total_lojas,
+      lojas_sincronizadas      = r.lojas_sincronizadas,
+      lojas_atrasadas          = r.lojas_atrasadas,
+      percentual_sincronizadas = r.percentual_sincronizadas,
+      percentual_atrasadas     = r.percentual_atrasadas,
+      status                   = r.status,
+      erro_detalhes            = r.erro_detalhes,
+      estatisticas             = COALESCE(r.estatisticas, e.estatisticas)
+  FROM jsonb_populate_record(NULL::execucoes, payload->'execucao') r
+  WHERE e.id = v_execucao_id;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Execução % não encontrada', v_execucao_id;
+  END IF;
+
+  -- 2. Lojas da execução
+  INSERT INTO lojas_dados (
+    execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+    atualizado_em, sincronizada, tempo_atraso_horas, tempo_atraso_dias,
+    hash_loja, data_coleta
+  )
+  SELECT v_execucao_id, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, COALESCE(l.data_coleta, NOW())
+  FROM jsonb_populate_recordset(NULL::lojas_dados, COALESCE(payload->'lojas', '[]')) l;
+
+  GET DIAGNOSTICS v_lojas_inseridas = ROW_COUNT;
+
+  -- 3. Métrica diária (contador de execuções incrementado no servidor)
+  IF payload ? 'metrica' THEN
+    INSERT INTO metricas_periodicas (
+      cliente_id, cliente_nome, data_referencia, periodo, total_lojas,
+      lojas_sincronizadas, lojas_atrasadas, percentual_sincronizadas,
+      tempo_medio_atraso_horas, maior_atraso_horas, execucoes_periodo, updated_at
+    )
+    SELECT m.cliente_id, m.cliente_nome, m.data_referencia, m.periodo, m.total_lojas,
+           m.lojas_sincronizadas, m.lojas_atrasadas, m.percentual_sincronizadas,
+           m.tempo_medio_atraso_horas, m.maior_atraso_horas, 1, COALESCE(m.updated_at, NOW())
+    FROM jsonb_populate_record(NULL::metricas_periodicas, payload->'metrica') m
+    ON CONFLICT (cliente_nome, data_referencia, periodo) DO UPDATE
+    SET cliente_id               = EXCLUDED.cliente_id,
+        total_lojas              = EXCLUDED.total_lojas,
+        lojas_sincronizadas      = EXCLUDED.lojas_sincronizadas,
+        lojas_atrasadas          = EXCLUDED.lojas_atrasadas,
+        percentual_sincronizadas = EXCLUDED.percentual_sincronizadas,
+        tempo_medio_atraso_horas = EXCLUDED.tempo_medio_atraso_horas,
+        maior_atraso_horas       = EXCLUDED.maior_atraso_horas,
+        execucoes_periodo        = metricas_periodicas.execucoes_periodo + 1,
+        updated_at               = EXCLUDED.updated_at;
+  END IF;
+
+  -- 4. Log de compatibilidade
+  IF payload ? 'log' THEN
+    INSERT INTO logs_execucao (cliente_nome, status, detalhes, total_lojas, executado_em, origem)
+    SELECT g.cliente_nome, g.status, g.detalhes, g.total_lojas,
+           COALESCE(g.executado_em, NOW()), g.origem
+    FROM jsonb_populate_record(NULL::logs_execucao, payload->'log') g;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'execucao_id', v_execucao_id,
+    'lojas_inseridas', v_lojas_inseridas
+  );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION ingerir_execucao(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ingerir_execucao(jsonb) TO service_role;
@@ -0,0 +1,110 @@
+-- ============================================================
+-- Migration: Atomic upsert of the periodic metric
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   1. Creates `upsert_metrica_periodica(metrica jsonb)`: one
+--      INSERT ... ON CONFLICT (cliente_nome, data_referencia, periodo)
+--      that overwrites the totals and increments `execucoes_periodo`
+--      on the server. Replaces the racy select + update/insert pair
+--      in client_monitor_supabase.py (atualizar_metricas_periodicas).
+--   2. Re-creates `ingerir_execucao` to reuse it, so both write
+--      paths update the metric the same way.
+--
+--   `tempo_medio_atraso_horas` / `maior_atraso_horas` are now filled
+--   by the scraper (mean and max delay of the late stores).
+--
+-- SECURITY:
+--   Only the backend (service_role) may execute the functions.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION upsert_metrica_periodica(metrica jsonb)
+RETURNS metricas_periodicas
+LANGUAGE sql
+SET search_path = public
+AS $$
+  INSERT INTO metricas_periodicas (
+    cliente_id, cliente_nome, data_referencia, periodo, total_lojas,
+    lojas_sincronizadas, lojas_atrasadas, percentual_sincronizadas,
+    tempo_medio_atraso_horas, maior_atraso_horas, execucoes_periodo, updated_at
+  )
+  SELECT m.cliente_id, m.cliente_nome, m.data_referencia, m.periodo, m.total_lojas,
+         m.lojas_sincronizadas, m.lojas_atrasadas, m.percentual_sincronizadas,
+         COALESCE(m.tempo_medio_atraso_horas, 0), COALESCE(m.maior_atraso_horas, 0),
+         1, COALESCE(m.updated_at, NOW())
+  FROM jsonb_populate_record(NULL::metricas_periodicas, metrica) m
+  ON CONFLICT (cliente_nome, data_referencia, periodo) DO UPDATE
+  SET cliente_id               = EXCLUDED.cliente_id,
+      total_lojas              = EXCLUDED.total_lojas,
+      lojas_sincronizadas      = EXCLUDED.lojas_sincronizadas,
+      lojas_atrasadas          = EXCLUDED.lojas_atrasadas,
+      percentual_sincronizadas = EXCLUDED.percentual_sincronizadas,
+      tempo_medio_atraso_horas = EXCLUDED.tempo_medio_atraso_horas,
+      maior_atraso_horas       = EXCLUDED.maior_atraso_horas,
+      execucoes_periodo        = metricas_periodicas.execucoes_periodo + 1,
+      updated_at               = EXCLUDED.updated_at
+  RETURNING *;
+$$;
+
+REVOKE ALL ON FUNCTION upsert_metrica_periodica(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION upsert_metrica_periodica(jsonb) TO service_role;
+
+
+CREATE OR REPLACE FUNCTION ingerir_execucao(payload jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_execucao_id uuid := (payload->>'execucao_id')::uuid;
+  v_lojas_inseridas integer := 0;
+BEGIN
+  -- 1. Finaliza a execução criada no início da coleta
+  UPDATE execucoes e
+  SET total_lojas              = r.total_lojas,
+      lojas_sincronizadas      = r.lojas_sincronizadas,
+      lojas_atrasadas          = r.lojas_atrasadas,
+      percentual_sincronizadas = r.percentual_sincronizadas,
+      percentual_atrasadas     = r.percentual_atrasadas,
+      status                   = r.status,
+      erro_detalhes            = r.erro_detalhes,
+      estatisticas             = COALESCE(r.estatisticas, e.estatisticas)
+  FROM jsonb_populate_record(NULL::execucoes, payload->'execucao') r
+  WHERE e.id = v_execucao_id;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Execução % não encontrada', v_execucao_id;
+  END IF;
+
+  -- 2. Lojas da execução
+  INSERT INTO lojas_dados (
+    execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+    atualizado_em, sincronizada, tempo_atraso_horas, tempo_atraso_dias,
+    hash_loja, data_coleta
+  )
+  SELECT v_execucao_id, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, COALESCE(l.data_coleta, NOW())
+  FROM jsonb_populate_recordset(NULL::lojas_dados, COALESCE(payload->'lojas', '[]')) l;
+
+  GET DIAGNOSTICS v_lojas_inseridas = ROW_COUNT;
+
+  -- 3. Métrica diária (contador de execuções incrementado no servidor)
+  IF payload ? 'metrica' THEN
+    PERFORM upsert_metrica_periodica(payload->'metrica');
+  END IF;
+
+  -- 4. Log de compatibilidade
+  IF payload ? 'log' THEN
+    INSERT INTO logs_execucao (cliente_nome, status, detalhes, total_lojas, executado_em, origem)
+    SELECT g.cliente_nome, g.status, g.detalhes, g.total_lojas,
+           COALESCE(g.executado_em, NOW()), g.origem
+    FROM jsonb_populate_record(NULL::logs_execucao, payload->'log') g;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'execucao_id', v_execucao_id,
+    'lojas_inseridas', v_lojas_inseridas
+  );
+END;
+$$;
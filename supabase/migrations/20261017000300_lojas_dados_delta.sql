@@ -0,0 +1,263 @@
+-- ============================================================
+-- Migration: Change-only (delta) storage for lojas_dados
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   1. `lojas_estado_atual`: last known state of every store
+--      (keyed by hash_loja), maintained by ingerir_execucao.
+--   2. `execucoes.modo_gravacao`: 'completo' (every store written)
+--      or 'delta' (only stores whose atualizado_em / sincronizada
+--      changed, plus a `removida = true` row for stores that left
+--      the listing). NULL = written by the per-table fallback path,
+--      which is always complete.
+--   3. `ingerir_execucao` accepts payload->>'modo_gravacao'. A delta
+--      is only written when the client's previous successful run
+--      was ingested by this function on the same day (Sao Paulo);
+--      otherwise the run is stored complete. So every day starts
+--      with a full checkpoint and `sincronizada` (which depends on
+--      the day) never changes inside a delta chain.
+--   4. `snapshot_lojas(uuid[])`: rebuilds the full store list of
+--      any execution = last complete run of that client at or
+--      before it + the deltas up to it (latest version per store,
+--      removed stores dropped). Used by the dashboard instead of
+--      filtering lojas_dados by execucao_id.
+--
+--   Retention: cleanup_database.py cuts on whole days, so a delta
+--   chain is never separated from its checkpoint.
+--
+-- SECURITY:
+--   ingerir_execucao stays service_role only. snapshot_lojas runs
+--   as the caller (RLS on lojas_dados/execucoes still applies).
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Columns and current-state table
+-- ============================================================
+
+ALTER TABLE lojas_dados
+  ADD COLUMN IF NOT EXISTS removida BOOLEAN NOT NULL DEFAULT false;
+
+ALTER TABLE execucoes
+  ADD COLUMN IF NOT EXISTS modo_gravacao TEXT; -- completo, delta
+
+CREATE TABLE IF NOT EXISTS lojas_estado_atual (
+  hash_loja      TEXT PRIMARY KEY,
+  cliente_id     INTEGER REFERENCES clientes(id),
+  cliente_nome   TEXT NOT NULL,
+  loja_nome      TEXT NOT NULL,
+  identificador  TEXT NOT NULL,
+  atualizado_em  TIMESTAMP WITH TIME ZONE,
+  sincronizada   BOOLEAN,
+  execucao_id    UUID, -- execução em que este estado foi gravado
+  updated_at     TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_lojas_estado_atual_cliente
+  ON lojas_estado_atual(cliente_nome);
+
+-- Backend only (service_role bypasses RLS; anon gets nothing)
+ALTER TABLE lojas_estado_atual ENABLE ROW LEVEL SECURITY;
+
+
+-- ============================================================
+-- STEP 2 — Ingest with complete / delta storage
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION ingerir_execucao(payload jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_execucao_id uuid := (payload->>'execucao_id')::uuid;
+  v_modo text := COALESCE(payload->>'modo_gravacao', 'completo');
+  v_cliente text;
+  v_executado_em timestamptz;
+  v_anterior record;
+  v_lojas_inseridas integer := 0;
+  v_lojas_removidas integer := 0;
+BEGIN
+  -- 1. Finaliza a execução criada no início da coleta
+  UPDATE execucoes e
+  SET total_lojas              = r.total_lojas,
+      lojas_sincronizadas      = r.lojas_sincronizadas,
+      lojas_atrasadas          = r.lojas_atrasadas,
+      percentual_sincronizadas = r.percentual_sincronizadas,
+      percentual_atrasadas     = r.percentual_atrasadas,
+      status                   = r.status,
+      erro_detalhes            = r.erro_detalhes,
+      estatisticas             = COALESCE(r.estatisticas, e.estatisticas)
+  FROM jsonb_populate_record(NULL::execucoes, payload->'execucao') r
+  WHERE e.id = v_execucao_id
+  RETURNING e.cliente_nome, e.executado_em INTO v_cliente, v_executado_em;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Execução % não encontrada', v_execucao_id;
+  END IF;
+
+  -- Uma ingestão por cliente de cada vez (o estado atual é compartilhado)
+  PERFORM pg_advisory_xact_lock(hashtext('ingerir_execucao:' || v_cliente));
+
+  -- 2. Delta só sobre uma cadeia válida: execução anterior gravada por esta
+  --    função (estado atual em dia) e no mesmo dia
+  IF v_modo = 'delta' THEN
+    SELECT e.modo_gravacao, e.executado_em INTO v_anterior
+    FROM execucoes e
+    WHERE e.cliente_nome = v_cliente
+      AND e.status = 'sucesso'
+      AND e.id <> v_execucao_id
+      AND e.executado_em <= v_executado_em
+    ORDER BY e.executado_em DESC
+    LIMIT 1;
+
+    IF v_anterior IS NULL
+       OR v_anterior.modo_gravacao IS NULL
+       OR (v_anterior.executado_em AT TIME ZONE 'America/Sao_Paulo')::date
+          <> (v_executado_em AT TIME ZONE 'America/Sao_Paulo')::date THEN
+      v_modo := 'completo';
+    END IF;
+  ELSE
+    v_modo := 'completo';
+  END IF;
+
+  UPDATE execucoes SET modo_gravacao = v_modo WHERE id = v_execucao_id;
+
+  CREATE TEMP TABLE _lojas_execucao ON COMMIT DROP AS
+  SELECT l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, COALESCE(l.data_coleta, NOW()) AS data_coleta
+  FROM jsonb_populate_recordset(NULL::lojas_dados, COALESCE(payload->'lojas', '[]')) l;
+
+  -- 3. Lojas da execução: todas (completo) ou só as que mudaram (delta)
+  INSERT INTO lojas_dados (
+    execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+    atualizado_em, sincronizada, tempo_atraso_horas, tempo_atraso_dias,
+    hash_loja, data_coleta
+  )
+  SELECT v_execucao_id, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, l.data_coleta
+  FROM _lojas_execucao l
+  WHERE v_modo = 'completo'
+     OR NOT EXISTS (
+       SELECT 1 FROM lojas_estado_atual s
+       WHERE s.hash_loja = l.hash_loja
+         AND s.atualizado_em IS NOT DISTINCT FROM l.atualizado_em
+         AND s.sincronizada IS NOT DISTINCT FROM l.sincronizada
+     );
+
+  GET DIAGNOSTICS v_lojas_inseridas = ROW_COUNT;
+
+  -- Lojas que saíram da listagem: marcador de remoção no histórico (delta)
+  IF v_modo = 'delta' THEN
+    INSERT INTO lojas_dados (
+      execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+      atualizado_em, sincronizada, hash_loja, data_coleta, removida
+    )
+    SELECT v_execucao_id, s.cliente_id, s.cliente_nome, s.loja_nome, s.identificador,
+           s.atualizado_em, s.sincronizada, s.hash_loja, NOW(), true
+    FROM lojas_estado_atual s
+    WHERE s.cliente_nome = v_cliente
+      AND NOT EXISTS (SELECT 1 FROM _lojas_execucao l WHERE l.hash_loja = s.hash_loja);
+
+    GET DIAGNOSTICS v_lojas_removidas = ROW_COUNT;
+  END IF;
+
+  -- 4. Estado atual: remove as lojas ausentes e grava só o que mudou
+  DELETE FROM lojas_estado_atual s
+  WHERE s.cliente_nome = v_cliente
+    AND NOT EXISTS (SELECT 1 FROM _lojas_execucao l WHERE l.hash_loja = s.hash_loja);
+
+  INSERT INTO lojas_estado_atual (
+    hash_loja, cliente_id, cliente_nome, loja_nome, identificador,
+    atualizado_em, sincronizada, execucao_id, updated_at
+  )
+  SELECT DISTINCT ON (l.hash_loja)
+         l.hash_loja, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, v_execucao_id, NOW()
+  FROM _lojas_execucao l
+  WHERE l.hash_loja IS NOT NULL
+  ORDER BY l.hash_loja
+  ON CONFLICT (hash_loja) DO UPDATE
+  SET atualizado_em = EXCLUDED.atualizado_em,
+      sincronizada  = EXCLUDED.sincronizada,
+      execucao_id   = EXCLUDED.execucao_id,
+      updated_at    = EXCLUDED.updated_at
+  WHERE (lojas_estado_atual.atualizado_em, lojas_estado_atual.sincronizada)
+        IS DISTINCT FROM (EXCLUDED.atualizado_em, EXCLUDED.sincronizada)
+     OR v_modo = 'completo';
+
+  -- 5. Métrica diária (contador de execuções incrementado no servidor)
+  IF payload ? 'metrica' THEN
+    PERFORM upsert_metrica_periodica(payload->'metrica');
+  END IF;
+
+  -- 6. Log de compatibilidade
+  IF payload ? 'log' THEN
+    INSERT INTO logs_execucao (cliente_nome, status, detalhes, total_lojas, executado_em, origem)
+    SELECT g.cliente_nome, g.status, g.detalhes, g.total_lojas,
+           COALESCE(g.executado_em, NOW()), g.origem
+    FROM jsonb_populate_record(NULL::logs_execucao, payload->'log') g;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'execucao_id', v_execucao_id,
+    'modo_gravacao', v_modo,
+    'lojas_inseridas', v_lojas_inseridas,
+    'lojas_removidas', v_lojas_removidas
+  );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION ingerir_execucao(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ingerir_execucao(jsonb) TO service_role;
+
+
+-- ============================================================
+-- STEP 3 — Full snapshot of any execution
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION snapshot_lojas(p_execucao_ids uuid[])
+RETURNS SETOF lojas_dados
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH alvos AS (
+    SELECT e.id, e.cliente_nome, e.executado_em
+    FROM execucoes e
+    WHERE e.id = ANY(p_execucao_ids)
+  ),
+  cadeias AS (
+    -- Execuções cujas linhas compõem cada alvo: do último checkpoint até ele
+    SELECT a.id AS alvo_id, e.id AS execucao_id, e.executado_em
+    FROM alvos a
+    CROSS JOIN LATERAL (
+      SELECT b.executado_em
+      FROM execucoes b
+      WHERE b.cliente_nome = a.cliente_nome
+        AND b.executado_em <= a.executado_em
+        AND (b.id = a.id OR b.status = 'sucesso')
+        AND b.modo_gravacao IS DISTINCT FROM 'delta'
+      ORDER BY b.executado_em DESC
+      LIMIT 1
+    ) base
+    JOIN execucoes e
+      ON e.cliente_nome = a.cliente_nome
+     AND e.executado_em BETWEEN base.executado_em AND a.executado_em
+     AND (e.id = a.id OR e.status = 'sucesso')
+  ),
+  versoes AS (
+    SELECT DISTINCT ON (c.alvo_id, COALESCE(l.hash_loja, l.id::text)) l.*
+    FROM cadeias c
+    JOIN lojas_dados l ON l.execucao_id = c.execucao_id
+    ORDER BY c.alvo_id, COALESCE(l.hash_loja, l.id::text), c.executado_em DESC
+  )
+  SELECT * FROM versoes
+  WHERE NOT removida
+  ORDER BY data_coleta DESC;
+$$;
+
+-- Leitura pelo dashboard (SECURITY INVOKER: as políticas de RLS continuam valendo)
+GRANT EXECUTE ON FUNCTION snapshot_lojas(uuid[]) TO anon, authenticated, service_role;
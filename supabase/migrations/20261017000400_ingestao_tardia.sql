@@ -0,0 +1,253 @@
+-- ============================================================
+-- Migration: Late ingestion of executions replayed from the spool
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   client_monitor_supabase.py keeps writes in a local spool
+--   (spool_gravacoes.py) while Supabase is unavailable and replays
+--   them later, so an execution can reach ingerir_execucao after a
+--   newer execution of the same client was already ingested.
+--
+--   1. `execucoes.execucao_base_id`: the complete execution a delta
+--      was computed against. snapshot_lojas follows this link
+--      instead of ordering by executado_em, so a late complete run
+--      never gets mixed into an existing delta chain.
+--   2. `ingerir_execucao`: a late execution (a newer execution of
+--      the client was already ingested) is always stored complete
+--      and leaves `lojas_estado_atual` untouched, since the state
+--      already reflects the newer run.
+--   3. `snapshot_lojas`: checkpoint + deltas linked to it.
+--
+-- SECURITY:
+--   Unchanged: ingerir_execucao is service_role only, snapshot_lojas
+--   runs as the caller.
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Delta chain link
+-- ============================================================
+
+ALTER TABLE execucoes
+  ADD COLUMN IF NOT EXISTS execucao_base_id UUID REFERENCES execucoes(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_execucoes_base
+  ON execucoes(execucao_base_id)
+  WHERE execucao_base_id IS NOT NULL;
+
+
+-- ============================================================
+-- STEP 2 — Ingest (late executions stored complete)
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION ingerir_execucao(payload jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_execucao_id uuid := (payload->>'execucao_id')::uuid;
+  v_modo text := COALESCE(payload->>'modo_gravacao', 'completo');
+  v_cliente text;
+  v_executado_em timestamptz;
+  v_anterior record;
+  v_base_id uuid;
+  v_tardia boolean;
+  v_lojas_inseridas integer := 0;
+  v_lojas_removidas integer := 0;
+BEGIN
+  -- 1. Finaliza a execução criada no início da coleta
+  UPDATE execucoes e
+  SET total_lojas              = r.total_lojas,
+      lojas_sincronizadas      = r.lojas_sincronizadas,
+      lojas_atrasadas          = r.lojas_atrasadas,
+      percentual_sincronizadas = r.percentual_sincronizadas,
+      percentual_atrasadas     = r.percentual_atrasadas,
+      status                   = r.status,
+      erro_detalhes            = r.erro_detalhes,
+      estatisticas             = COALESCE(r.estatisticas, e.estatisticas)
+  FROM jsonb_populate_record(NULL::execucoes, payload->'execucao') r
+  WHERE e.id = v_execucao_id
+  RETURNING e.cliente_nome, e.executado_em INTO v_cliente, v_executado_em;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Execução % não encontrada', v_execucao_id;
+  END IF;
+
+  -- Uma ingestão por cliente de cada vez (o estado atual é compartilhado)
+  PERFORM pg_advisory_xact_lock(hashtext('ingerir_execucao:' || v_cliente));
+
+  -- Execução reenviada depois de outra mais recente do mesmo cliente
+  v_tardia := EXISTS (
+    SELECT 1 FROM execucoes e
+    WHERE e.cliente_nome = v_cliente
+      AND e.id <> v_execucao_id
+      AND e.modo_gravacao IS NOT NULL
+      AND e.executado_em > v_executado_em
+  );
+
+  -- 2. Delta só sobre uma cadeia válida: execução anterior gravada por esta
+  --    função (estado atual em dia), no mesmo dia e ligada a um checkpoint
+  IF v_modo = 'delta' AND NOT v_tardia THEN
+    SELECT e.id, e.modo_gravacao, e.execucao_base_id, e.executado_em INTO v_anterior
+    FROM execucoes e
+    WHERE e.cliente_nome = v_cliente
+      AND e.status = 'sucesso'
+      AND e.id <> v_execucao_id
+      AND e.executado_em <= v_executado_em
+    ORDER BY e.executado_em DESC
+    LIMIT 1;
+
+    IF v_anterior IS NULL
+       OR v_anterior.modo_gravacao IS NULL
+       OR (v_anterior.modo_gravacao = 'delta' AND v_anterior.execucao_base_id IS NULL)
+       OR (v_anterior.executado_em AT TIME ZONE 'America/Sao_Paulo')::date
+          <> (v_executado_em AT TIME ZONE 'America/Sao_Paulo')::date THEN
+      v_modo := 'completo';
+    ELSE
+      v_base_id := CASE WHEN v_anterior.modo_gravacao = 'delta'
+                        THEN v_anterior.execucao_base_id
+                        ELSE v_anterior.id END;
+    END IF;
+  ELSE
+    v_modo := 'completo';
+  END IF;
+
+  UPDATE execucoes
+  SET modo_gravacao = v_modo,
+      execucao_base_id = v_base_id
+  WHERE id = v_execucao_id;
+
+  CREATE TEMP TABLE _lojas_execucao ON COMMIT DROP AS
+  SELECT l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, COALESCE(l.data_coleta, NOW()) AS data_coleta
+  FROM jsonb_populate_recordset(NULL::lojas_dados, COALESCE(payload->'lojas', '[]')) l;
+
+  -- 3. Lojas da execução: todas (completo) ou só as que mudaram (delta)
+  INSERT INTO lojas_dados (
+    execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+    atualizado_em, sincronizada, tempo_atraso_horas, tempo_atraso_dias,
+    hash_loja, data_coleta
+  )
+  SELECT v_execucao_id, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+         l.atualizado_em, l.sincronizada, l.tempo_atraso_horas, l.tempo_atraso_dias,
+         l.hash_loja, l.data_coleta
+  FROM _lojas_execucao l
+  WHERE v_modo = 'completo'
+     OR NOT EXISTS (
+       SELECT 1 FROM lojas_estado_atual s
+       WHERE s.hash_loja = l.hash_loja
+         AND s.atualizado_em IS NOT DISTINCT FROM l.atualizado_em
+         AND s.sincronizada IS NOT DISTINCT FROM l.sincronizada
+     );
+
+  GET DIAGNOSTICS v_lojas_inseridas = ROW_COUNT;
+
+  -- Lojas que saíram da listagem: marcador de remoção no histórico (delta)
+  IF v_modo = 'delta' THEN
+    INSERT INTO lojas_dados (
+      execucao_id, cliente_id, cliente_nome, loja_nome, identificador,
+      atualizado_em, sincronizada, hash_loja, data_coleta, removida
+    )
+    SELECT v_execucao_id, s.cliente_id, s.cliente_nome, s.loja_nome, s.identificador,
+           s.atualizado_em, s.sincronizada, s.hash_loja, NOW(), true
+    FROM lojas_estado_atual s
+    WHERE s.cliente_nome = v_cliente
+      AND NOT EXISTS (SELECT 1 FROM _lojas_execucao l WHERE l.hash_loja = s.hash_loja);
+
+    GET DIAGNOSTICS v_lojas_removidas = ROW_COUNT;
+  END IF;
+
+  -- 4. Estado atual (só execuções em ordem): remove as lojas ausentes e
+  --    grava só o que mudou
+  IF NOT v_tardia THEN
+    DELETE FROM lojas_estado_atual s
+    WHERE s.cliente_nome = v_cliente
+      AND NOT EXISTS (SELECT 1 FROM _lojas_execucao l WHERE l.hash_loja = s.hash_loja);
+
+    INSERT INTO lojas_estado_atual (
+      hash_loja, cliente_id, cliente_nome, loja_nome, identificador,
+      atualizado_em, sincronizada, execucao_id, updated_at
+    )
+    SELECT DISTINCT ON (l.hash_loja)
+           l.hash_loja, l.cliente_id, l.cliente_nome, l.loja_nome, l.identificador,
+           l.atualizado_em, l.sincronizada, v_execucao_id, NOW()
+    FROM _lojas_execucao l
+    WHERE l.hash_loja IS NOT NULL
+    ORDER BY l.hash_loja
+    ON CONFLICT (hash_loja) DO UPDATE
+    SET atualizado_em = EXCLUDED.atualizado_em,
+        sincronizada  = EXCLUDED.sincronizada,
+        execucao_id   = EXCLUDED.execucao_id,
+        updated_at    = EXCLUDED.updated_at
+    WHERE (lojas_estado_atual.atualizado_em, lojas_estado_atual.sincronizada)
+          IS DISTINCT FROM (EXCLUDED.atualizado_em, EXCLUDED.sincronizada)
+       OR v_modo = 'completo';
+  END IF;
+
+  -- 5. Métrica diária (contador de execuções incrementado no servidor)
+  IF payload ? 'metrica' THEN
+    PERFORM upsert_metrica_periodica(payload->'metrica');
+  END IF;
+
+  -- 6. Log de compatibilidade
+  IF payload ? 'log' THEN
+    INSERT INTO logs_execucao (cliente_nome, status, detalhes, total_lojas, executado_em, origem)
+    SELECT g.cliente_nome, g.status, g.detalhes, g.total_lojas,
+           COALESCE(g.executado_em, NOW()), g.origem
+    FROM jsonb_populate_record(NULL::logs_execucao, payload->'log') g;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'execucao_id', v_execucao_id,
+    'modo_gravacao', v_modo,
+    'tardia', v_tardia,
+    'lojas_inseridas', v_lojas_inseridas,
+    'lojas_removidas', v_lojas_removidas
+  );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION ingerir_execucao(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ingerir_execucao(jsonb) TO service_role;
+
+
+-- ============================================================
+-- STEP 3 — Snapshot through the checkpoint link
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION snapshot_lojas(p_execucao_ids uuid[])
+RETURNS SETOF lojas_dados
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH alvos AS (
+    SELECT e.id, e.executado_em,
+           CASE WHEN e.modo_gravacao = 'delta' THEN e.execucao_base_id ELSE e.id END AS base_id
+    FROM execucoes e
+    WHERE e.id = ANY(p_execucao_ids)
+  ),
+  cadeias AS (
+    -- Checkpoint de cada alvo + deltas ligados a ele até o alvo
+    SELECT a.id AS alvo_id, e.id AS execucao_id, e.executado_em
+    FROM alvos a
+    JOIN execucoes e
+      ON e.id = a.base_id
+      OR (e.execucao_base_id = a.base_id
+          AND e.modo_gravacao = 'delta'
+          AND e.executado_em <= a.executado_em)
+  ),
+  versoes AS (
+    SELECT DISTINCT ON (c.alvo_id, COALESCE(l.hash_loja, l.id::text)) l.*
+    FROM cadeias c
+    JOIN lojas_dados l ON l.execucao_id = c.execucao_id
+    ORDER BY c.alvo_id, COALESCE(l.hash_loja, l.id::text), c.executado_em DESC
+  )
+  SELECT * FROM versoes
+  WHERE NOT removida
+  ORDER BY data_coleta DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION snapshot_lojas(uuid[]) TO anon, authenticated, service_role;
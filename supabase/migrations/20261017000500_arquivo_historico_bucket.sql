@@ -0,0 +1,20 @@
+-- ============================================================
+-- Migration: Storage bucket for the Parquet history archive
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   cleanup_database.py exports lojas_dados, execucoes and
+--   metricas_periodicas rows that are about to expire to Parquet
+--   (arquivo_historico.py), partitioned as
+--   <tabela>/cliente=<nome>/mes=<YYYY-MM>/parte-*.parquet, and
+--   uploads every file to this bucket when ARQUIVO_HISTORICO_BUCKET
+--   is set. The GitHub runner is ephemeral, so the bucket is the
+--   durable copy.
+--
+-- SECURITY:
+--   Private bucket: only service_role (backend) reads and writes.
+-- ============================================================
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('arquivo-historico', 'arquivo-historico', false)
+ON CONFLICT (id) DO NOTHING;
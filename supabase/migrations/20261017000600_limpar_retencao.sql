@@ -0,0 +1,102 @@
+-- ============================================================
+-- Migration: Server-side retention deletes
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   cleanup_database.py used to select 500 ids, send them back in a
+--   DELETE ... WHERE id IN (...) and sleep 1s, one table after the
+--   other. This moves the delete to the server:
+--
+--   1. `limpar_retencao(p_tabela, p_limite, p_lote, p_segundos)`:
+--      deletes the rows of one table older than p_limite in chunks of
+--      p_lote rows, for at most ~p_segundos per call (one transaction
+--      per call). Returns {removidos, concluida}. The backend calls it
+--      until `concluida`; a failed call only rolls back its own
+--      chunks, so the next call picks up where the last commit left.
+--   2. Indexes on the retention columns (range scans instead of seq
+--      scans per chunk) and on lojas_dados.execucao_id (the
+--      ON DELETE CASCADE from execucoes).
+--
+--   Only the four retention tables are accepted; date columns
+--   (metricas_periodicas.data_referencia) are compared with the
+--   Sao Paulo day of p_limite, like the previous PostgREST filter.
+--
+-- SECURITY:
+--   service_role only.
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Indexes
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_lojas_dados_data_coleta
+  ON lojas_dados(data_coleta);
+
+CREATE INDEX IF NOT EXISTS idx_lojas_dados_execucao
+  ON lojas_dados(execucao_id);
+
+CREATE INDEX IF NOT EXISTS idx_execucoes_executado_em
+  ON execucoes(executado_em);
+
+CREATE INDEX IF NOT EXISTS idx_metricas_periodicas_data_referencia
+  ON metricas_periodicas(data_referencia);
+
+CREATE INDEX IF NOT EXISTS idx_logs_execucao_executado_em
+  ON logs_execucao(executado_em);
+
+
+-- ============================================================
+-- STEP 2 — Chunked delete by time range
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION limpar_retencao(
+  p_tabela text,
+  p_limite timestamptz,
+  p_lote integer DEFAULT 20000,
+  p_segundos numeric DEFAULT 5
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_condicao text;
+  v_inicio timestamptz := clock_timestamp();
+  v_removidos bigint := 0;
+  v_lote integer;
+BEGIN
+  v_condicao := CASE p_tabela
+    WHEN 'lojas_dados'         THEN 'data_coleta < $1'
+    WHEN 'execucoes'           THEN 'executado_em < $1'
+    WHEN 'logs_execucao'       THEN 'executado_em < $1'
+    WHEN 'metricas_periodicas' THEN
+      'data_referencia < ($1 AT TIME ZONE ''America/Sao_Paulo'')::date'
+  END;
+
+  IF v_condicao IS NULL THEN
+    RAISE EXCEPTION 'Tabela % não tem retenção configurada', p_tabela;
+  END IF;
+
+  LOOP
+    EXECUTE format(
+      'DELETE FROM %I WHERE id IN (SELECT id FROM %I WHERE %s LIMIT $2)',
+      p_tabela, p_tabela, v_condicao
+    ) USING p_limite, p_lote;
+
+    GET DIAGNOSTICS v_lote = ROW_COUNT;
+    v_removidos := v_removidos + v_lote;
+
+    EXIT WHEN v_lote < p_lote
+           OR clock_timestamp() - v_inicio >= make_interval(secs => p_segundos);
+  END LOOP;
+
+  RETURN jsonb_build_object(
+    'removidos', v_removidos,
+    'concluida', v_lote < p_lote
+  );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION limpar_retencao(text, timestamptz, integer, numeric) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION limpar_retencao(text, timestamptz, integer, numeric) TO service_role;
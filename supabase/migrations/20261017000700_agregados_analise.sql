@@ -0,0 +1,254 @@
+-- ============================================================
+-- Migration: Server-side aggregates for the analyzer and dashboard
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   analyze_supabase.py, obter_estatisticas_supabase and the
+--   dashboard (useDashboardData) used to download raw rows and
+--   aggregate them on the client. These functions return the
+--   aggregates instead (a few rows per client):
+--
+--   1. `sincronizacao_diaria(desde, cliente, por_cliente)`: daily
+--      sync rates per client (or across clients), Sao Paulo days.
+--   2. `situacao_clientes(limite_desatualizado)`: per client, the
+--      last execution, last successful execution (id + totals),
+--      last store collection and whether it is stale.
+--   3. `resumo_dashboard(cliente)`: dashboard cards (stores of the
+--      latest successful execution per client, today's executions
+--      by status, last execution, active clients).
+--   4. `resumo_lojas_dados(limite_antigos)`,
+--      `distribuicao_execucoes(limite_antigas)` and
+--      `resumo_metricas_periodicas()`: table summaries and problem
+--      counts used by analyze_supabase.py.
+--   5. Indexes matching the per-client "latest" lookups.
+--
+-- SECURITY:
+--   SECURITY INVOKER (default): RLS on the underlying tables still
+--   applies. Readable by anon/authenticated (dashboard) and
+--   service_role (backend).
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Indexes
+-- ============================================================
+
+-- Última execução / execuções por dia de cada cliente
+CREATE INDEX IF NOT EXISTS idx_execucoes_cliente_executado_em
+  ON execucoes(cliente_nome, executado_em DESC);
+
+-- Última coleta de lojas de cada cliente
+CREATE INDEX IF NOT EXISTS idx_lojas_dados_cliente_data_coleta
+  ON lojas_dados(cliente_nome, data_coleta DESC);
+
+-- Últimos logs de um cliente (dashboard)
+CREATE INDEX IF NOT EXISTS idx_logs_execucao_cliente_executado_em
+  ON logs_execucao(cliente_nome, executado_em DESC);
+
+
+-- ============================================================
+-- STEP 2 — Daily sync rates
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION sincronizacao_diaria(
+  p_desde timestamptz DEFAULT NOW() - INTERVAL '30 days',
+  p_cliente_nome text DEFAULT NULL,
+  p_por_cliente boolean DEFAULT true
+)
+RETURNS TABLE (
+  cliente_nome text,
+  dia date,
+  execucoes bigint,
+  total_lojas integer,
+  lojas_sincronizadas integer,
+  lojas_atrasadas integer,
+  percentual_sincronizadas numeric
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT CASE WHEN p_por_cliente THEN e.cliente_nome END,
+         (e.executado_em AT TIME ZONE 'America/Sao_Paulo')::date AS dia,
+         COUNT(*),
+         MAX(e.total_lojas),
+         MAX(e.lojas_sincronizadas),
+         MAX(e.lojas_atrasadas),
+         ROUND(AVG(e.percentual_sincronizadas)::numeric, 2)
+  FROM execucoes e
+  WHERE e.executado_em >= p_desde
+    AND (p_cliente_nome IS NULL OR e.cliente_nome = p_cliente_nome)
+  GROUP BY 1, 2
+  ORDER BY 2, 1;
+$$;
+
+
+-- ============================================================
+-- STEP 3 — Per-client situation (last collection, stale clients)
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION situacao_clientes(
+  p_limite_desatualizado timestamptz DEFAULT NOW() - INTERVAL '7 days'
+)
+RETURNS TABLE (
+  cliente_nome text,
+  ultima_execucao timestamptz,
+  ultimo_status text,
+  execucao_id uuid,
+  ultima_execucao_sucesso timestamptz,
+  total_lojas integer,
+  lojas_sincronizadas integer,
+  lojas_atrasadas integer,
+  ultima_coleta timestamptz,
+  desatualizado boolean
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH clientes_execucoes AS (
+    SELECT DISTINCT e.cliente_nome FROM execucoes e
+  )
+  SELECT c.cliente_nome,
+         ultima.executado_em,
+         ultima.status,
+         sucesso.id,
+         sucesso.executado_em,
+         sucesso.total_lojas,
+         sucesso.lojas_sincronizadas,
+         sucesso.lojas_atrasadas,
+         coleta.data_coleta,
+         COALESCE(coleta.data_coleta < p_limite_desatualizado, true)
+  FROM clientes_execucoes c
+  LEFT JOIN LATERAL (
+    SELECT e.executado_em, e.status FROM execucoes e
+    WHERE e.cliente_nome = c.cliente_nome
+    ORDER BY e.executado_em DESC LIMIT 1
+  ) ultima ON true
+  LEFT JOIN LATERAL (
+    SELECT e.id, e.executado_em, e.total_lojas, e.lojas_sincronizadas, e.lojas_atrasadas
+    FROM execucoes e
+    WHERE e.cliente_nome = c.cliente_nome AND e.status = 'sucesso'
+    ORDER BY e.executado_em DESC LIMIT 1
+  ) sucesso ON true
+  LEFT JOIN LATERAL (
+    SELECT l.data_coleta FROM lojas_dados l
+    WHERE l.cliente_nome = c.cliente_nome
+    ORDER BY l.data_coleta DESC LIMIT 1
+  ) coleta ON true
+  ORDER BY c.cliente_nome;
+$$;
+
+
+-- ============================================================
+-- STEP 4 — Dashboard cards
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION resumo_dashboard(p_cliente_nome text DEFAULT NULL)
+RETURNS TABLE (
+  total_lojas bigint,
+  lojas_sincronizadas bigint,
+  lojas_atrasadas bigint,
+  ultima_execucao timestamptz,
+  execucoes_hoje bigint,
+  sucessos_hoje bigint,
+  erros_hoje bigint,
+  total_clientes bigint
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH situacao AS (
+    SELECT * FROM situacao_clientes()
+    WHERE p_cliente_nome IS NULL OR cliente_nome = p_cliente_nome
+  ),
+  hoje AS (
+    SELECT e.status FROM execucoes e
+    WHERE e.executado_em >= date_trunc('day', NOW() AT TIME ZONE 'America/Sao_Paulo')
+                            AT TIME ZONE 'America/Sao_Paulo'
+      AND (p_cliente_nome IS NULL OR e.cliente_nome = p_cliente_nome)
+  )
+  SELECT COALESCE(SUM(s.total_lojas), 0),
+         COALESCE(SUM(s.lojas_sincronizadas), 0),
+         COALESCE(SUM(s.lojas_atrasadas), 0),
+         MAX(s.ultima_execucao),
+         (SELECT COUNT(*) FROM hoje),
+         (SELECT COUNT(*) FROM hoje WHERE status = 'sucesso'),
+         (SELECT COUNT(*) FROM hoje WHERE status LIKE 'erro%'),
+         CASE WHEN p_cliente_nome IS NULL
+              THEN (SELECT COUNT(*) FROM clientes WHERE ativo)
+              ELSE 1 END
+  FROM situacao s;
+$$;
+
+
+-- ============================================================
+-- STEP 5 — Table summaries for analyze_supabase.py
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION resumo_lojas_dados(
+  p_limite_antigos timestamptz DEFAULT NOW() - INTERVAL '7 days'
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT jsonb_build_object(
+    'total', COUNT(*),
+    'clientes_unicos', COUNT(DISTINCT l.cliente_nome),
+    'lojas_unicas', COUNT(DISTINCT l.loja_nome),
+    'primeira', MIN(l.data_coleta),
+    'ultima', MAX(l.data_coleta),
+    'sincronizadas', COUNT(*) FILTER (WHERE l.sincronizada),
+    'antigos', COUNT(*) FILTER (WHERE l.data_coleta < p_limite_antigos)
+  )
+  FROM lojas_dados l;
+$$;
+
+CREATE OR REPLACE FUNCTION distribuicao_execucoes(
+  p_limite_antigas timestamptz DEFAULT NOW() - INTERVAL '6 hours'
+)
+RETURNS TABLE (
+  status text,
+  origem text,
+  total bigint,
+  antigas bigint,
+  primeira timestamptz,
+  ultima timestamptz
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT e.status, e.origem, COUNT(*),
+         COUNT(*) FILTER (WHERE e.executado_em < p_limite_antigas),
+         MIN(e.executado_em), MAX(e.executado_em)
+  FROM execucoes e
+  GROUP BY e.status, e.origem;
+$$;
+
+CREATE OR REPLACE FUNCTION resumo_metricas_periodicas()
+RETURNS TABLE (
+  periodo text,
+  total bigint,
+  primeira date,
+  ultima date
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT m.periodo, COUNT(*), MIN(m.data_referencia), MAX(m.data_referencia)
+  FROM metricas_periodicas m
+  GROUP BY m.periodo;
+$$;
+
+
+GRANT EXECUTE ON FUNCTION sincronizacao_diaria(timestamptz, text, boolean) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION situacao_clientes(timestamptz) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION resumo_dashboard(text) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION resumo_lojas_dados(timestamptz) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION distribuicao_execucoes(timestamptz) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION resumo_metricas_periodicas() TO anon, authenticated, service_role;
@@ -0,0 +1,84 @@
+-- ============================================================
+-- Migration: Idempotent replay of spooled metrics and logs
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   The local spool (spool_gravacoes.py) replays metrics and logs
+--   that could not be written, possibly hours later and possibly
+--   after the original write did commit (timeout / lost response).
+--
+--   1. `upsert_metrica_periodica`: the totals only move forward in
+--      time. A metric older than the row (`updated_at`) still counts
+--      its execution but keeps the newer totals. The same metric sent
+--      twice (same `updated_at`) is only counted once.
+--   2. `logs_execucao.id_envio`: id generated by the backend for
+--      each log row, so a replayed log is an upsert that ignores
+--      the copy already written.
+--
+-- SECURITY:
+--   Unchanged: upsert_metrica_periodica is service_role only.
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Metric upsert guarded by updated_at
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION upsert_metrica_periodica(metrica jsonb)
+RETURNS metricas_periodicas
+LANGUAGE sql
+SET search_path = public
+AS $$
+  INSERT INTO metricas_periodicas (
+    cliente_id, cliente_nome, data_referencia, periodo, total_lojas,
+    lojas_sincronizadas, lojas_atrasadas, percentual_sincronizadas,
+    tempo_medio_atraso_horas, maior_atraso_horas, execucoes_periodo, updated_at
+  )
+  SELECT m.cliente_id, m.cliente_nome, m.data_referencia, m.periodo, m.total_lojas,
+         m.lojas_sincronizadas, m.lojas_atrasadas, m.percentual_sincronizadas,
+         COALESCE(m.tempo_medio_atraso_horas, 0), COALESCE(m.maior_atraso_horas, 0),
+         1, COALESCE(m.updated_at, NOW())
+  FROM jsonb_populate_record(NULL::metricas_periodicas, metrica) m
+  ON CONFLICT (cliente_nome, data_referencia, periodo) DO UPDATE
+  SET cliente_id               = EXCLUDED.cliente_id,
+      total_lojas              = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.total_lojas
+                                      ELSE metricas_periodicas.total_lojas END,
+      lojas_sincronizadas      = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.lojas_sincronizadas
+                                      ELSE metricas_periodicas.lojas_sincronizadas END,
+      lojas_atrasadas          = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.lojas_atrasadas
+                                      ELSE metricas_periodicas.lojas_atrasadas END,
+      percentual_sincronizadas = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.percentual_sincronizadas
+                                      ELSE metricas_periodicas.percentual_sincronizadas END,
+      tempo_medio_atraso_horas = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.tempo_medio_atraso_horas
+                                      ELSE metricas_periodicas.tempo_medio_atraso_horas END,
+      maior_atraso_horas       = CASE WHEN metricas_periodicas.updated_at <= EXCLUDED.updated_at
+                                      THEN EXCLUDED.maior_atraso_horas
+                                      ELSE metricas_periodicas.maior_atraso_horas END,
+      -- Mesmo updated_at: a mesma métrica reenviada, já contada
+      execucoes_periodo        = metricas_periodicas.execucoes_periodo
+                                 + CASE WHEN metricas_periodicas.updated_at = EXCLUDED.updated_at
+                                        THEN 0 ELSE 1 END,
+      updated_at               = GREATEST(metricas_periodicas.updated_at, EXCLUDED.updated_at)
+  RETURNING *;
+$$;
+
+REVOKE ALL ON FUNCTION upsert_metrica_periodica(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION upsert_metrica_periodica(jsonb) TO service_role;
+
+
+-- ============================================================
+-- STEP 2 — Client-side id for log rows
+-- ============================================================
+
+ALTER TABLE logs_execucao
+  ADD COLUMN IF NOT EXISTS id_envio UUID;
+
+-- Índice único completo (não parcial): exigido pelo on_conflict do PostgREST;
+-- linhas antigas com NULL não conflitam entre si
+CREATE UNIQUE INDEX IF NOT EXISTS idx_logs_execucao_id_envio
+  ON logs_execucao(id_envio);
@@ -0,0 +1,27 @@
+-- ============================================================
+-- Migration: Per-client extraction settings on clientes
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   client_monitor_supabase.py and monitor_daemon.py read these
+--   columns from each client row and fall back to the environment
+--   variable (or default) when the column is NULL:
+--
+--   - paginas_paralelas  -> PAGINAS_PARALELAS (log pages loaded at once)
+--   - motor_extracao     -> MOTOR_EXTRACAO ('playwright' | 'http')
+--   - perfil_bloqueio    -> PERFIL_BLOQUEIO ('nenhum' | 'essencial')
+--   - intervalo_horas    -> INTERVALO_PADRAO_HORAS (daemon schedule)
+--
+--   Unknown values are handled by the backend (logged and replaced
+--   by the default), so no CHECK on the text columns.
+--
+-- SECURITY:
+--   Unchanged: the existing RLS policies on clientes apply.
+-- ============================================================
+
+
+ALTER TABLE clientes
+  ADD COLUMN IF NOT EXISTS paginas_paralelas INTEGER,
+  ADD COLUMN IF NOT EXISTS motor_extracao TEXT,
+  ADD COLUMN IF NOT EXISTS perfil_bloqueio TEXT,
+  ADD COLUMN IF NOT EXISTS intervalo_horas NUMERIC;
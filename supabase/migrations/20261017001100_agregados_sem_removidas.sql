@@ -0,0 +1,103 @@
+-- ============================================================
+-- Migration: Aggregates ignore removed-store markers
+-- Date: 2026-10-17
+--
+-- WHAT THIS MIGRATION DOES:
+--   Delta executions write a `removida = true` row in lojas_dados
+--   for each store that left the listing (see
+--   20261017000300_lojas_dados_delta.sql). Those rows are markers,
+--   not collected stores, so:
+--
+--   1. `resumo_lojas_dados`: totals, unique stores/clients, dates
+--      and sync counts only over real store rows.
+--   2. `situacao_clientes`: the last collection of a client is the
+--      last real store row, so a run where stores only disappeared
+--      does not refresh it.
+--
+-- SECURITY:
+--   Unchanged: SECURITY INVOKER, same grants as before.
+-- ============================================================
+
+
+-- ============================================================
+-- STEP 1 — Per-client situation
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION situacao_clientes(
+  p_limite_desatualizado timestamptz DEFAULT NOW() - INTERVAL '7 days'
+)
+RETURNS TABLE (
+  cliente_nome text,
+  ultima_execucao timestamptz,
+  ultimo_status text,
+  execucao_id uuid,
+  ultima_execucao_sucesso timestamptz,
+  total_lojas integer,
+  lojas_sincronizadas integer,
+  lojas_atrasadas integer,
+  ultima_coleta timestamptz,
+  desatualizado boolean
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH clientes_execucoes AS (
+    SELECT DISTINCT e.cliente_nome FROM execucoes e
+  )
+  SELECT c.cliente_nome,
+         ultima.executado_em,
+         ultima.status,
+         sucesso.id,
+         sucesso.executado_em,
+         sucesso.total_lojas,
+         sucesso.lojas_sincronizadas,
+         sucesso.lojas_atrasadas,
+         coleta.data_coleta,
+         COALESCE(coleta.data_coleta < p_limite_desatualizado, true)
+  FROM clientes_execucoes c
+  LEFT JOIN LATERAL (
+    SELECT e.executado_em, e.status FROM execucoes e
+    WHERE e.cliente_nome = c.cliente_nome
+    ORDER BY e.executado_em DESC LIMIT 1
+  ) ultima ON true
+  LEFT JOIN LATERAL (
+    SELECT e.id, e.executado_em, e.total_lojas, e.lojas_sincronizadas, e.lojas_atrasadas
+    FROM execucoes e
+    WHERE e.cliente_nome = c.cliente_nome AND e.status = 'sucesso'
+    ORDER BY e.executado_em DESC LIMIT 1
+  ) sucesso ON true
+  LEFT JOIN LATERAL (
+    SELECT l.data_coleta FROM lojas_dados l
+    WHERE l.cliente_nome = c.cliente_nome
+      AND NOT l.removida
+    ORDER BY l.data_coleta DESC LIMIT 1
+  ) coleta ON true
+  ORDER BY c.cliente_nome;
+$$;
+
+
+-- ============================================================
+-- STEP 2 — lojas_dados summary
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION resumo_lojas_dados(
+  p_limite_antigos timestamptz DEFAULT NOW() - INTERVAL '7 days'
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT jsonb_build_object(
+    'total', COUNT(*),
+    'clientes_unicos', COUNT(DISTINCT l.cliente_nome),
+    'lojas_unicas', COUNT(DISTINCT l.loja_nome),
+    'primeira', MIN(l.data_coleta),
+    'ultima', MAX(l.data_coleta),
+    'sincronizadas', COUNT(*) FILTER (WHERE l.sincronizada),
+    'antigos', COUNT(*) FILTER (WHERE l.data_coleta < p_limite_antigos)
+  )
+  FROM lojas_dados l
+  WHERE NOT l.removida;
+$$;